@@ -4,7 +4,7 @@ from pathlib import Path
 import  numpy as np
 from src.constants import SETTINGS_PATH, CONFIG_PATH
 from src.utils import load_yaml_config, load_json_config, setup_environment
-from src.session_manager import initialize_components
+from src.session_manager import initialize_components, get_metadata_index
 
 
 class MedicalChatbotUI:
@@ -163,6 +163,31 @@ class MedicalChatbotUI:
                     st.session_state.messages.append({"role": "user", "content": ex})
                     st.session_state.messages.append({"role": "assistant", "content": "Thinking..."})
 
+            # Scope answers to selected documents; only their chunks are searched
+            metadata_index = get_metadata_index()
+            selected_documents = []
+            if metadata_index is not None and len(metadata_index):
+                st.markdown("---")
+                selected_documents = st.multiselect(
+                    "Answer from these documents only",
+                    metadata_index.values("doc_id"),
+                    key="document_filter"
+                )
+
+            chain_manager = st.session_state.get("chain_manager")
+            cache_stats = chain_manager.cache_stats() if chain_manager is not None else {}
+            if cache_stats.get("hits", 0) + cache_stats.get("misses", 0):
+                st.caption(
+                    f"Answer cache: {cache_stats['hits']} of {cache_stats['hits'] + cache_stats['misses']} "
+                    f"questions served from cache ({cache_stats['hit_rate']:.0%})"
+                )
+            context_stats = chain_manager.context_stats() if chain_manager is not None else {}
+            if "tokens_saved" in context_stats:
+                st.caption(
+                    f"Last context: {context_stats['tokens_after']} of {context_stats['tokens_before']} prompt tokens "
+                    f"({context_stats['tokens_saved']} saved, {context_stats['total_tokens_saved']} this session)"
+                )
+
         # Initialize components if not already done
         if "chain_manager" not in st.session_state or st.session_state.chain_manager is None:
             with st.spinner("Initializing components..."):
@@ -184,10 +209,16 @@ class MedicalChatbotUI:
             with st.chat_message("assistant", avatar="🧑‍⚕️"):
                 message_placeholder = st.empty()
                 try:
+                    filters = {"doc_id": selected_documents} if selected_documents else None
+                    chunks = st.session_state.chain_manager.stream_response(prompt, filters=filters)
+                    # Retrieval happens before the first token; show the spinner until then
                     with st.spinner("Analyzing your query..."):
-                        response = st.session_state.chain_manager.get_response(prompt)
-                        message_placeholder.markdown(response)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
+                        response = next(chunks, "")
+                    for chunk in chunks:
+                        message_placeholder.markdown(response + "▌")
+                        response += chunk
+                    message_placeholder.markdown(response)
+                    st.session_state.messages.append({"role": "assistant", "content": response})
                 except Exception as e:
                     st.error(f"Error generating response: {str(e)}")
 
@@ -0,0 +1,113 @@
+# benchmarks/bench_backends.py
+"""
+Compare retrieval backends on the same corpus: build time, latency, memory and recall.
+
+Every backend indexes the same clustered embeddings and answers the same
+queries one at a time, as the chat retriever does. Memory is the growth of
+the process's resident set while the backend is built, plus the backend's
+own account of its index size where it has one; recall@k is measured
+against exact float32 search. FAISS backends are skipped when faiss-cpu
+is not installed. The sharded backend's vectors live in its worker
+processes, so neither its RSS growth nor its index size counts them.
+
+Run from the repository root:
+    python -m benchmarks.bench_backends --documents 50000 -k 15
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.bench_quantization import clustered_embeddings
+from core.chroma_validator import ChromaValidator
+from core.embeddings import COLLECTION_NAME
+from core.retrievers import ChromaBackend, FaissBackend, MemoryBackend, ShardedBackend
+from core.vector_index import QuantizedVectorIndex, VectorIndex
+
+
+def resident_bytes() -> int:
+    """Resident set size of this process (Linux), 0 where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def build_chroma(documents: np.ndarray, ids, directory: str) -> ChromaBackend:
+    validator = ChromaValidator()
+    client = validator.init_client(directory)
+    collection = validator.validate_or_create_collection(client, COLLECTION_NAME)
+    validator.add_documents_to_collection(collection, documents=["" for _ in ids],
+                                          embeddings=documents.tolist(), ids=ids)
+    return ChromaBackend(collection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=15)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    documents = clustered_embeddings(args.documents, args.dimensions, args.topics, rng).astype(np.float32)
+    queries = clustered_embeddings(args.queries, args.dimensions, args.topics, rng).astype(np.float32)
+    ids = [f"{i:032x}" for i in range(args.documents)]
+    truth, _ = VectorIndex(documents).search(queries, args.k)
+    truth_ids = [[ids[i] for i in row] for row in truth.tolist()]
+
+    print(f"{args.documents} documents x {args.dimensions} dims, {args.queries} queries, k={args.k}")
+    print(f"{'backend':<20} {'build s':>8} {'ms/query':>9} {'RSS +MiB':>9} {'index MiB':>10} {'recall':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        builders = [
+            ("memory float32", lambda: MemoryBackend(VectorIndex(documents, ids=ids))),
+            ("memory int8", lambda: MemoryBackend(QuantizedVectorIndex(
+                documents, ids=ids, precision="int8", full_precision_path=str(Path(tmp) / "int8.npy")))),
+            ("chroma hnsw", lambda: build_chroma(documents, ids, str(Path(tmp) / "chroma"))),
+            ("sharded x4", lambda: ShardedBackend(VectorIndex.prepare_queries(documents), ids,
+                                                  str(Path(tmp) / "shards"), shards=4))
+        ]
+        try:
+            import faiss  # noqa: F401
+        except ImportError:
+            print("faiss-cpu is not installed, skipping the FAISS backends")
+        else:
+            for index_type in ("flat", "ivf", "hnsw"):
+                def build_faiss(index_type=index_type):
+                    backend = FaissBackend(index_type=index_type)
+                    backend.build(VectorIndex.prepare_queries(documents), ids)
+                    return backend
+                builders.append((f"faiss {index_type}", build_faiss))
+
+        for name, build in builders:
+            before = resident_bytes()
+            start = time.perf_counter()
+            backend = build()
+            build_time = time.perf_counter() - start
+            grown = resident_bytes() - before
+
+            found = []
+            start = time.perf_counter()
+            for query in queries:
+                result_ids, _ = backend.search(query.reshape(1, -1), args.k)
+                found.append(result_ids[0])
+            elapsed = (time.perf_counter() - start) / args.queries
+
+            hits = sum(len(set(a) & set(b)) for a, b in zip(truth_ids, found))
+            index_mib = f"{backend.nbytes / 2 ** 20:10.1f}" if backend.nbytes is not None else f"{'-':>10}"
+            print(f"{name:<20} {build_time:8.1f} {elapsed * 1000:9.2f} {grown / 2 ** 20:9.1f} "
+                  f"{index_mib} {hits / (len(truth_ids) * args.k):8.4f}")
+            if isinstance(backend, ShardedBackend):
+                backend.close()
+            del backend
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# benchmarks/bench_chunkers.py
+"""
+Benchmark chunking throughput of TokenChunker against RecursiveCharacterTextSplitter.
+
+Both splitters run over the same generated corpus of guideline-like pages
+(numbered and upper-case section headings, paragraphs of prose) and are
+reported in MB/s of input text, both for raw `split_text` and for
+`split_documents` (which includes building LangChain Documents), together
+with chunk counts, the largest chunk in tokens and how many chunks span a
+section heading.
+
+Run from the repository root:
+    python -m benchmarks.bench_chunkers --pages 2000
+"""
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from core.chunkers import HEADING_PATTERN, TokenChunker
+
+WORDS = (
+    "patient dose therapy treatment recommended clinical evidence trial risk mg daily "
+    "adverse events monitoring renal hepatic function contraindicated pregnancy children "
+    "first-line second-line guideline assessment diagnosis symptoms outcome follow-up"
+).split()
+
+
+def generate_pages(pages: int, seed: int = 0) -> List[Document]:
+    """Generate pages of prose split into sections by headings."""
+    rng = random.Random(seed)
+    documents = []
+    for page in range(pages):
+        lines = []
+        for section in range(rng.randint(2, 5)):
+            if rng.random() < 0.5:
+                lines.append(f"{page % 20 + 1}.{section + 1} {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}")
+            else:
+                lines.append(f"{rng.choice(WORDS).upper()} {rng.choice(WORDS).upper()}")
+            for _ in range(rng.randint(1, 4)):
+                sentences = []
+                for _ in range(rng.randint(2, 6)):
+                    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 20))]
+                    if rng.random() < 0.3:
+                        words.append(f"{rng.randint(1, 500)}")
+                    sentences.append(" ".join(words).capitalize() + ".")
+                lines.append(" ".join(sentences))
+        documents.append(Document(page_content="\n".join(lines), metadata={"source": "generated.pdf", "page": page}))
+    return documents
+
+
+def crosses_heading(text: str) -> bool:
+    """True if a heading line starts anywhere after the first line of the chunk."""
+    return any(match.start() > 0 for match in HEADING_PATTERN.finditer(text))
+
+
+def best_time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(label: str, splitter, documents: List[Document], megabytes: float, repeat: int):
+    texts = [doc.page_content for doc in documents]
+    text_time = best_time(lambda: [splitter.split_text(text) for text in texts], repeat)
+    documents_time = best_time(lambda: splitter.split_documents(documents), repeat)
+
+    chunks = splitter.split_documents(documents)
+    max_tokens = max(TokenChunker.count_tokens(chunk.page_content) for chunk in chunks)
+    crossing = sum(1 for chunk in chunks if crosses_heading(chunk.page_content))
+    print(f"{label:<36} {megabytes / text_time:10.2f} {megabytes / documents_time:10.2f} "
+          f"{len(chunks):8d} {max_tokens:10d} {crossing:9d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per splitter; the fastest is reported")
+    args = parser.parse_args()
+
+    documents = generate_pages(args.pages)
+    megabytes = sum(len(doc.page_content.encode('utf-8')) for doc in documents) / (1024 * 1024)
+    print(f"Corpus: {args.pages} pages, {megabytes:.2f} MB")
+    print(f"{'splitter':<36} {'text MB/s':>10} {'docs MB/s':>10} {'chunks':>8} {'max tokens':>10} {'crossing':>9}")
+
+    run("recursive chunk_size=300", RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50),
+        documents, megabytes, args.repeat)
+    run("recursive chunk_size=1000", RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100),
+        documents, megabytes, args.repeat)
+    run("token chunk_tokens=96", TokenChunker(chunk_tokens=96, chunk_overlap_tokens=16),
+        documents, megabytes, args.repeat)
+    run("token chunk_tokens=256", TokenChunker(chunk_tokens=256, chunk_overlap_tokens=32),
+        documents, megabytes, args.repeat)
+    run("token chunk_tokens=96, no headings",
+        TokenChunker(chunk_tokens=96, chunk_overlap_tokens=16, respect_headings=False),
+        documents, megabytes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
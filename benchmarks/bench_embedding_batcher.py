@@ -0,0 +1,82 @@
+# benchmarks/bench_embedding_batcher.py
+"""
+Benchmark query micro-batching against one embedding request per query.
+
+Client threads call `embed_query` with distinct texts, as concurrent chat
+sessions do on cache misses, against a local stub server that processes a
+limited number of requests at once. Reports throughput and per-query
+latency with and without MicroBatchEmbeddings.
+
+Run from the repository root:
+    python -m benchmarks.bench_embedding_batcher --clients 16 --queries 20
+"""
+import argparse
+import statistics
+import threading
+import time
+from typing import List
+
+from benchmarks.stub_ollama import StubOllamaServer
+from core.embedding_batcher import MicroBatchEmbeddings
+from core.ollama_http import OllamaHTTPClient, PooledOllamaEmbeddings
+
+
+def run(label: str, embeddings, clients: int, queries: int):
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def client(worker: int):
+        for i in range(queries):
+            start = time.perf_counter()
+            vector = embeddings.embed_query(f"client {worker} question {i} about hypertension treatment")
+            elapsed = time.perf_counter() - start
+            assert vector
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{label:<36} {len(latencies) / elapsed:10.1f} q/s "
+          f"{1000 * statistics.mean(latencies):9.1f} ms {1000 * p95:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16, help="Threads embedding queries at once")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per client")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Stub latency per request")
+    parser.add_argument("--per-item-ms", type=float, default=1.0, help="Stub latency per embedded text")
+    parser.add_argument("--server-parallel", type=int, default=2,
+                        help="Requests the stub processes at once, like OLLAMA_NUM_PARALLEL")
+    args = parser.parse_args()
+
+    print(f"{'path':<36} {'throughput':>14} {'mean':>12} {'p95':>12}")
+    with StubOllamaServer(latency_ms=args.latency_ms, per_item_latency_ms=args.per_item_ms,
+                          max_parallel=args.server_parallel) as server:
+        http_client = OllamaHTTPClient(pool_size=args.clients)
+        embeddings = PooledOllamaEmbeddings(model="stub", base_url=server.base_url, http_client=http_client)
+        run("one request per query", embeddings, args.clients, args.queries)
+
+        # A single client measures the latency a lone query pays for batching
+        batcher = MicroBatchEmbeddings(embeddings, batch_fn=embeddings.embed_queries)
+        run("batched, 1 client", batcher, 1, args.queries)
+
+        for max_batch_size in (8, 16):
+            batcher = MicroBatchEmbeddings(embeddings, batch_fn=embeddings.embed_queries,
+                                           max_batch_size=max_batch_size)
+            run(f"batched, max_batch_size={max_batch_size}", batcher, args.clients, args.queries)
+            stats = batcher.stats()
+            print(f"  batches={stats['batches']} mean batch size={stats['mean_batch_size']:.1f}")
+        http_client.close()
+
+
+if __name__ == "__main__":
+    main()
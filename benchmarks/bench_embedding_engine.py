@@ -0,0 +1,85 @@
+# benchmarks/bench_embedding_engine.py
+"""
+Benchmark the concurrent EmbeddingEngine against the old fixed-batch loop.
+
+Both paths embed the same generated texts against a local stub server,
+so no Ollama install is needed. The engine runs once with upstream
+`OllamaEmbeddings` (one request per text) and once with
+`PooledOllamaEmbeddings`, which sends each batch as one `/api/embed` request.
+
+Run from the repository root:
+    python -m benchmarks.bench_embedding_engine --texts 400 --latency-ms 20
+"""
+import argparse
+import time
+from typing import Callable, List
+
+from langchain_community.embeddings import OllamaEmbeddings
+
+from benchmarks.stub_ollama import StubOllamaServer
+from core.embedding_engine import EmbeddingEngine
+from core.ollama_http import OllamaHTTPClient, PooledOllamaEmbeddings
+
+
+def legacy_embed(embeddings: OllamaEmbeddings, texts: List[str]) -> List[List[float]]:
+    """The previous create_vectorstore loop: batches of 10 with a 0.5 s sleep after each."""
+    all_embeddings = []
+    for i in range(0, len(texts), 10):
+        all_embeddings.extend(embeddings.embed_documents(texts[i:i + 10]))
+        time.sleep(0.5)
+    return all_embeddings
+
+
+def timed(label: str, fn: Callable[[List[str]], List[List[float]]], texts: List[str]) -> float:
+    start = time.perf_counter()
+    vectors = fn(texts)
+    elapsed = time.perf_counter() - start
+    assert len(vectors) == len(texts)
+    print(f"{label:<40} {elapsed:8.2f}s {len(texts) / elapsed:10.1f} texts/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--server-parallel", type=int, default=8,
+                        help="Requests the stub processes at once, like OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--error-rate", type=float, default=0.05,
+                        help="Error rate for the retry/backoff run")
+    parser.add_argument("--skip-legacy", action="store_true", help="Skip the slow sleep-based baseline")
+    args = parser.parse_args()
+
+    texts = [f"Guideline chunk {i}: recommendation text about treatment option {i % 97}" for i in range(args.texts)]
+    print(f"{'path':<40} {'time':>9} {'throughput':>16}")
+
+    with StubOllamaServer(latency_ms=args.latency_ms, per_item_latency_ms=0.0,
+                          max_parallel=args.server_parallel) as server:
+        embeddings = OllamaEmbeddings(model="stub", base_url=server.base_url)
+
+        if not args.skip_legacy:
+            timed("legacy batch_size=10 + sleep(0.5)", lambda t: legacy_embed(embeddings, t), texts)
+
+        for concurrency in (1, 4, 8, 16):
+            engine = EmbeddingEngine(embeddings.embed_documents, max_concurrency=concurrency)
+            timed(f"engine concurrency={concurrency}", engine.embed, texts)
+            engine.shutdown()
+
+        pooled = PooledOllamaEmbeddings(model="stub", base_url=server.base_url, http_client=OllamaHTTPClient())
+        for concurrency in (1, 4):
+            engine = EmbeddingEngine(pooled.embed_documents, max_concurrency=concurrency)
+            timed(f"engine /api/embed concurrency={concurrency}", engine.embed, texts)
+            engine.shutdown()
+
+    with StubOllamaServer(latency_ms=args.latency_ms, per_item_latency_ms=0.0,
+                          max_parallel=args.server_parallel, error_rate=args.error_rate) as server:
+        embeddings = OllamaEmbeddings(model="stub", base_url=server.base_url)
+        engine = EmbeddingEngine(embeddings.embed_documents, max_concurrency=8, backoff_base_s=0.05)
+        timed(f"engine concurrency=8, {args.error_rate:.0%} errors", engine.embed, texts)
+        stats = engine.get_stats()
+        print(f"  errors={stats['errors']} retries={stats['retries']} final batch size={stats['batch_size']}")
+        engine.shutdown()
+
+
+if __name__ == "__main__":
+    main()
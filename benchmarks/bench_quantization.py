@@ -0,0 +1,70 @@
+# benchmarks/bench_quantization.py
+"""
+Benchmark quantized vector indexes: memory, latency and recall against exact search.
+
+Embeddings are generated around random topic centers, so neighbourhoods are
+as tight as in a real corpus. Every configuration reports resident memory,
+milliseconds per query, and recall@k of the quantized first pass and after
+exact rescoring.
+
+Run from the repository root:
+    python -m benchmarks.bench_quantization --documents 100000 -k 15
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from core.vector_index import QuantizedVectorIndex, VectorIndex
+
+
+def clustered_embeddings(count: int, dimensions: int, topics: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((topics, dimensions))
+    assignments = rng.integers(0, topics, size=count)
+    return centers[assignments] + 0.6 * rng.standard_normal((count, dimensions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=15)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    documents = clustered_embeddings(args.documents, args.dimensions, args.topics, rng)
+    queries = clustered_embeddings(args.queries, args.dimensions, args.topics, rng)
+    print(f"{args.documents} documents x {args.dimensions} dims, {args.queries} queries, k={args.k}")
+    print(f"{'index':<28} {'memory MiB':>10} {'ms/query':>9} {'recall 1st pass':>16} {'recall':>8}")
+
+    exact = VectorIndex(documents)
+    start = time.perf_counter()
+    truth, _ = exact.search(queries, args.k)
+    elapsed = (time.perf_counter() - start) / args.queries
+    print(f"{'float32 exact':<28} {exact.nbytes / 2 ** 20:10.1f} {elapsed * 1000:9.2f} {1.0:16.4f} {1.0:8.4f}")
+    print(f"{'float64 (previous)':<28} {args.documents * args.dimensions * 8 / 2 ** 20:10.1f}"
+          f" {'-':>9} {'-':>16} {'-':>8}")
+
+    def recall(found: np.ndarray) -> float:
+        return sum(len(set(a) & set(b)) for a, b in zip(truth.tolist(), found.tolist())) / truth.size
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for precision in ("float16", "int8"):
+            for factor in (1, 2, 4, 8):
+                index = QuantizedVectorIndex(documents, precision=precision, rescore_factor=factor,
+                                             full_precision_path=str(Path(tmp) / f"{precision}.npy"))
+                first_pass, _ = index.search_first_pass(queries, args.k)
+                start = time.perf_counter()
+                found, _ = index.search(queries, args.k)
+                elapsed = (time.perf_counter() - start) / args.queries
+                print(f"{f'{precision} rescore x{factor}':<28} {index.nbytes / 2 ** 20:10.1f} "
+                      f"{elapsed * 1000:9.2f} {recall(first_pass):16.4f} {recall(found):8.4f}")
+                del index
+
+
+if __name__ == "__main__":
+    main()
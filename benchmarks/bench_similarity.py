@@ -0,0 +1,73 @@
+# benchmarks/bench_similarity.py
+"""
+Benchmark batched top-k search in VectorIndex against the previous per-query search.
+
+The previous `find_similar_vectors` re-normalized the float64 document
+matrix and ran a full `np.argsort` for every query. VectorIndex normalizes
+a float32 matrix once, scores queries in blocks and selects the top k with
+`argpartition`. Both are run on random embeddings and their results are
+compared.
+
+Run from the repository root:
+    python -m benchmarks.bench_similarity --documents 100000 --queries 64
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core.vector_index import VectorIndex
+
+
+def legacy_search(query_vector: np.ndarray, document_vectors: np.ndarray, k: int) -> np.ndarray:
+    """The previous find_similar_vectors: full normalization and argsort per query."""
+    query_vector = query_vector.reshape(1, -1)
+    query_norm = np.linalg.norm(query_vector, axis=1, keepdims=True)
+    doc_norm = np.linalg.norm(document_vectors, axis=1, keepdims=True)
+    query_norm = np.where(query_norm == 0, 1e-10, query_norm)
+    doc_norm = np.where(doc_norm == 0, 1e-10, doc_norm)
+    similarities = np.dot(query_vector / query_norm, (document_vectors / doc_norm).T).flatten()
+    return np.argsort(similarities)[-k:][::-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--legacy-queries", type=int, default=8,
+                        help="Queries timed on the slow per-query path; its time is extrapolated")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    documents = rng.standard_normal((args.documents, args.dimensions))
+    queries = rng.standard_normal((args.queries, args.dimensions))
+    print(f"{args.documents} documents x {args.dimensions} dims, {args.queries} queries, k={args.k}")
+
+    legacy_count = min(args.legacy_queries, args.queries)
+    start = time.perf_counter()
+    legacy = [legacy_search(query, documents, args.k) for query in queries[:legacy_count]]
+    legacy_per_query = (time.perf_counter() - start) / legacy_count
+    print(f"{'legacy per-query argsort (float64)':<40} {legacy_per_query * 1000:9.2f} ms/query")
+
+    start = time.perf_counter()
+    index = VectorIndex(documents)
+    build = time.perf_counter() - start
+    print(f"{'index build (normalize once, float32)':<40} {build * 1000:9.2f} ms "
+          f"({documents.nbytes / 2 ** 20:.0f} MiB -> {index.nbytes / 2 ** 20:.0f} MiB)")
+
+    for block in (1, 16, 64):
+        index.query_block_size = block
+        start = time.perf_counter()
+        indices, scores = index.search(queries, args.k)
+        per_query = (time.perf_counter() - start) / args.queries
+        print(f"{f'index batched argpartition, block={block}':<40} {per_query * 1000:9.2f} ms/query "
+              f"({legacy_per_query / per_query:5.1f}x)")
+
+    matches = sum(len(set(old) & set(new)) for old, new in zip(legacy, indices[:legacy_count].tolist()))
+    print(f"top-{args.k} overlap with legacy results: {matches / (legacy_count * args.k):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# benchmarks/stub_ollama.py
+"""
+Local stub of the Ollama HTTP API for benchmarks and offline testing.
+
+Serves deterministic pseudo-embeddings and streamed generations with
+configurable latency and error rate, so embedding and chat code can be
+exercised without a running Ollama. Connections are kept alive, and the
+server counts the connections it accepted, so client pooling can be
+checked against it.
+
+Run standalone with:
+    python -m benchmarks.stub_ollama --port 11435 --latency-ms 20
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    """Deterministic unit-length pseudo-embedding of a text."""
+    seed = int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class StubOllamaServer:
+    """Threaded HTTP server answering Ollama embedding and generation endpoints."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, dimensions: int = 768,
+                 latency_ms: float = 20.0, per_item_latency_ms: float = 2.0,
+                 error_rate: float = 0.0, max_parallel: Optional[int] = None,
+                 response_text: str = "1. Stub answer. 2. Stub recommendation. 3. Stub source.",
+                 token_latency_ms: float = 5.0):
+        """
+        Initialize the stub server.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind, 0 picks a free one
+            dimensions: Embedding size
+            latency_ms: Fixed latency added to every request
+            per_item_latency_ms: Extra latency per embedded text
+            error_rate: Fraction of requests answered with HTTP 503
+            max_parallel: Requests processed at once, like OLLAMA_NUM_PARALLEL; None is unlimited
+            response_text: Answer streamed by /api/generate, one word per chunk
+            token_latency_ms: Delay between streamed chunks
+        """
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        self.per_item_latency_ms = per_item_latency_ms
+        self.error_rate = error_rate
+        self.response_text = response_text
+        self.token_latency_ms = token_latency_ms
+        self.requests = 0
+        self.connections = 0
+        self._slots = threading.BoundedSemaphore(max_parallel) if max_parallel else None
+        self._count_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def _simulate_work(self, items: int):
+        delay = (self.latency_ms + self.per_item_latency_ms * items) / 1000.0
+        if self._slots is None:
+            time.sleep(delay)
+            return
+        with self._slots:
+            time.sleep(delay)
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; like Ollama, do not let
+            # Nagle's algorithm hold the body back for the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._count_lock:
+                    stub.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream_generation(self, request: dict):
+                """Stream the answer as newline-delimited JSON chunks, as Ollama does."""
+                tokens = stub.response_text.split(" ")
+                model = request.get("model")
+                if request.get("stream") is False:
+                    stub._simulate_work(len(tokens))
+                    self._send_json(200, {"model": model, "response": stub.response_text, "done": True})
+                    return
+
+                stub._simulate_work(0)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, token in enumerate(tokens):
+                    time.sleep(stub.token_latency_ms / 1000.0)
+                    text = token if i == 0 else " " + token
+                    self._write_chunk({"model": model, "response": text, "done": False})
+                self._write_chunk({"model": model, "response": "", "done": True, "eval_count": len(tokens)})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, payload: dict):
+                line = json.dumps(payload).encode('utf-8') + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with stub._count_lock:
+                    stub.requests += 1
+
+                if stub.error_rate and random.random() < stub.error_rate:
+                    self._send_json(503, {"error": "server busy"})
+                    return
+
+                if self.path == "/api/embeddings":
+                    stub._simulate_work(1)
+                    self._send_json(200, {"embedding": fake_embedding(request.get("prompt", ""), stub.dimensions)})
+                elif self.path == "/api/embed":
+                    inputs = request.get("input", [])
+                    if isinstance(inputs, str):
+                        inputs = [inputs]
+                    stub._simulate_work(len(inputs))
+                    self._send_json(200, {
+                        "model": request.get("model"),
+                        "embeddings": [fake_embedding(text, stub.dimensions) for text in inputs]
+                    })
+                elif self.path == "/api/generate":
+                    self._stream_generation(request)
+                else:
+                    self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+        return Handler
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stub of the Ollama API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--per-item-latency-ms", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-parallel", type=int, default=None)
+    parser.add_argument("--token-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = StubOllamaServer(
+        host=args.host, port=args.port, dimensions=args.dimensions, latency_ms=args.latency_ms,
+        per_item_latency_ms=args.per_item_latency_ms, error_rate=args.error_rate,
+        max_parallel=args.max_parallel, token_latency_ms=args.token_latency_ms
+    )
+    print(f"Stub Ollama listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
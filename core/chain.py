@@ -1,45 +1,282 @@
 # chain.py
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
 import numpy as np
 from langchain.schema.runnable import RunnablePassthrough
 from langchain.schema.output_parser import StrOutputParser
 from langchain.prompts import ChatPromptTemplate
+from langchain.docstore.document import Document
 from langchain_community.llms import LlamaCpp
 from langchain_core.retrievers import BaseRetriever
 
+from core.context_builder import ContextBuilder
+from core.response_cache import SemanticResponseCache
+
+# Numbered sections of the answer and the headings they are rendered with
+SECTION_HEADINGS = {
+    "1.": "**1. Clinical Summary**\n",
+    "2.": "\n**2. Key Recommendations**\n- ",
+    "3.": "\n**3. Sources**\n- "
+}
+
 
 class ChainManager:
-    def __init__(self, retriever: BaseRetriever, llm: LlamaCpp, prompt_template: str):
-        """Initialize chain manager with components."""
+    def __init__(self, retriever: BaseRetriever, llm: LlamaCpp, prompt_template: str,
+                 response_cache: Optional[SemanticResponseCache] = None,
+                 embed_query: Optional[Callable[[str], np.ndarray]] = None,
+                 index_version: str = "", context_builder: Optional[ContextBuilder] = None):
+        """
+        Initialize chain manager with components.
+
+        Args:
+            retriever: Retriever supplying the context chunks
+            llm: Language model generating the answer
+            prompt_template: Prompt with {context} and {query} placeholders
+            response_cache: Optional semantic cache of answers, shared between sessions
+            embed_query: Query embedding function, required with a response cache
+            index_version: Version of the index answers are produced against; cached
+                answers of other versions are never served
+            context_builder: Optional post-retrieval stage merging, diversifying and
+                budgeting the retrieved chunks; without it every chunk is passed as is
+        """
+        if response_cache is not None and embed_query is None:
+            raise ValueError("A response cache needs an embed_query function")
+
         self.retriever = retriever
         self.llm = llm
         self.prompt = ChatPromptTemplate.from_template(prompt_template)
+        self.response_cache = response_cache
+        self.embed_query = embed_query
+        self.index_version = index_version
+        self.context_builder = context_builder
+        self.last_context_report: Dict[str, int] = {}
+        self.tokens_saved = 0
         self._chain = None
+        # Prompt to answer, fed with a context retrieved separately; used by the async path
+        self.generator = self.prompt | self.llm | StrOutputParser()
+
+    def _make_context(self, query: str, docs: List[Document]) -> str:
+        """Turn retrieved chunks into the prompt context, through the context builder when there is one."""
+        if self.context_builder is None:
+            return "\n\n".join(doc.page_content for doc in docs)
+        context, report = self.context_builder.build(query, docs)
+        self.last_context_report = report
+        self.tokens_saved += report["tokens_saved"]
+        return context
+
+    def _build_chain(self, retriever: BaseRetriever):
+        return (
+                {
+                    "context": lambda query: self._make_context(query, retriever.get_relevant_documents(query)),
+                    "query": RunnablePassthrough()
+                }
+                | self.prompt
+                | self.llm
+                | StrOutputParser()
+        )
 
     @property
     def chain(self):
         """Lazy load the RAG chain."""
         if self._chain is None:
-            # Define how to format context
-            def format_docs(docs):
-                return "\n\n".join(doc.page_content for doc in docs)
-
-            self._chain = (
-                    {
-                        "context": lambda x: format_docs(self.retriever.get_relevant_documents(x)),
-                        "query": RunnablePassthrough()
-                    }
-                    | self.prompt
-                    | self.llm
-                    | StrOutputParser()
-            )
+            self._chain = self._build_chain(self.retriever)
         return self._chain
 
-    def get_response(self, query: str) -> str:
+    def scoped_chain(self, filters: Optional[Dict[str, Any]] = None):
+        """
+        Return the RAG chain retrieving only chunks that match metadata filters.
+
+        Args:
+            filters: Metadata filters, e.g. {"doc_id": "ada_standards", "pub_date": {"gte": "2022"}};
+                None or empty uses the unscoped chain
+
+        Returns:
+            Runnable chain from query to answer
+        """
+        if not filters:
+            return self.chain
+        return self._build_chain(self.scoped_retriever(filters))
+
+    def scoped_retriever(self, filters: Optional[Dict[str, Any]] = None) -> BaseRetriever:
+        """Return the retriever, restricted to chunks matching metadata filters when given."""
+        if not filters:
+            return self.retriever
+        if not hasattr(self.retriever, "with_filters"):
+            raise ValueError("The retriever does not support metadata filters")
+        return self.retriever.with_filters(filters)
+
+    def _cache_version(self, filters: Optional[Dict[str, Any]]) -> str:
+        """Response cache version of an answer: answers are only shared between queries with the same scope."""
+        if not filters:
+            return self.index_version
+        return f"{self.index_version}:{json.dumps(filters, sort_keys=True, default=str)}"
+
+    def generate(self, query: str, filters: Optional[Dict[str, Any]] = None) -> str:
+        """Return the raw answer to a query, from the response cache when a similar query was answered."""
+        chain = self.scoped_chain(filters)
+        if self.response_cache is None:
+            return chain.invoke(query)
+
+        version = self._cache_version(filters)
+        # Embedding the query here is free for the retriever, which hits the query embedding cache
+        query_vector = self.embed_query(query)
+        response = self.response_cache.get(query_vector, version, query)
+        if response is None:
+            response = chain.invoke(query)
+            self.response_cache.put(query_vector, response, version, query)
+        return response
+
+    def stream(self, query: str, filters: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Yield the raw answer to a query as the model generates it.
+
+        A cached answer is yielded in one piece; a generated one is stored
+        in the response cache once the stream completes.
+        """
+        chain = self.scoped_chain(filters)
+        if self.response_cache is None:
+            yield from chain.stream(query)
+            return
+
+        version = self._cache_version(filters)
+        query_vector = self.embed_query(query)
+        response = self.response_cache.get(query_vector, version, query)
+        if response is not None:
+            yield response
+            return
+
+        parts = []
+        for token in chain.stream(query):
+            parts.append(token)
+            yield token
+        self.response_cache.put(query_vector, "".join(parts), version, query)
+
+    @staticmethod
+    def format_response(response: str) -> str:
+        """Render the numbered sections of an answer as headings."""
+        for marker, heading in SECTION_HEADINGS.items():
+            response = response.replace(marker, heading)
+        return response
+
+    @classmethod
+    def _format_ready(cls, pending: str) -> Tuple[str, str]:
+        """
+        Split buffered stream text into formatted text that is safe to emit and the rest.
+
+        A trailing digit is held back until the next token shows whether it
+        starts a section marker, so markers split across tokens are still
+        rendered and the result equals formatting the whole answer.
+        """
+        cut = len(pending) - 1 if pending[-1:].isdigit() else len(pending)
+        return cls.format_response(pending[:cut]) if cut else "", pending[cut:]
+
+    @classmethod
+    def format_stream(cls, tokens: Iterable[str]) -> Iterator[str]:
+        """Apply `format_response` to a token stream."""
+        pending = ""
+        for token in tokens:
+            ready, pending = cls._format_ready(pending + token)
+            if ready:
+                yield ready
+        if pending:
+            yield cls.format_response(pending)
+
+    @classmethod
+    async def aformat_stream(cls, tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Apply `format_response` to an async token stream."""
+        pending = ""
+        async for token in tokens:
+            ready, pending = cls._format_ready(pending + token)
+            if ready:
+                yield ready
+        if pending:
+            yield cls.format_response(pending)
+
+    @staticmethod
+    def confidence_footer() -> str:
+        return f"\n\n🔍 *Confidence: {np.random.randint(70, 95)}%*"
+
+    def stream_response(self, query: str, filters: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Yield the formatted answer to a query token by token, for incremental rendering.
+
+        Joined, the chunks equal what `get_response` returns for the same answer.
+        """
+        yield from self.format_stream(self.stream(query, filters))
+        yield self.confidence_footer()
+
+    def get_response(self, query: str, filters: Optional[Dict[str, Any]] = None) -> str:
         # Add post-processing for medical formatting
-        response = self.chain.invoke(query)
+        response = self.generate(query, filters)
+        return f"{self.format_response(response)}{self.confidence_footer()}"
+
+    async def _aretrieve_context(self, retriever: BaseRetriever, query: str,
+                                 embedding: Optional[asyncio.Future] = None) -> str:
+        """Retrieve and build the context without blocking the event loop."""
+        if embedding is not None:
+            # The retriever then finds the query vector in the query embedding cache
+            await embedding
+        docs = await retriever.ainvoke(query)
+        return await asyncio.get_running_loop().run_in_executor(None, self._make_context, query, docs)
+
+    async def astream(self, query: str, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Async version of `stream`, for serving many chats from one event loop.
+
+        Retrieval runs alongside the response cache lookup and is abandoned
+        on a hit; the answer is streamed from the model's async API.
+        Blocking work (embedding, vector search, context building) runs in
+        the default executor.
+        """
+        retriever = self.scoped_retriever(filters)
+        if self.response_cache is None:
+            context = await self._aretrieve_context(retriever, query)
+            async for token in self.generator.astream({"context": context, "query": query}):
+                yield token
+            return
+
+        loop = asyncio.get_running_loop()
+        version = self._cache_version(filters)
+        embedding = loop.run_in_executor(None, self.embed_query, query)
+        retrieval = asyncio.ensure_future(self._aretrieve_context(retriever, query, embedding))
+        try:
+            query_vector = await embedding
+            response = self.response_cache.get(query_vector, version, query)
+            if response is not None:
+                yield response
+                return
+            context = await retrieval
+        finally:
+            if not retrieval.done():
+                retrieval.cancel()
+
+        parts = []
+        async for token in self.generator.astream({"context": context, "query": query}):
+            parts.append(token)
+            yield token
+        self.response_cache.put(query_vector, "".join(parts), version, query)
+
+    async def agenerate(self, query: str, filters: Optional[Dict[str, Any]] = None) -> str:
+        """Async version of `generate`."""
+        return "".join([token async for token in self.astream(query, filters)])
+
+    async def astream_response(self, query: str, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Async version of `stream_response`."""
+        async for chunk in self.aformat_stream(self.astream(query, filters)):
+            yield chunk
+        yield self.confidence_footer()
+
+    async def aget_response(self, query: str, filters: Optional[Dict[str, Any]] = None) -> str:
+        """Async version of `get_response`."""
+        response = await self.agenerate(query, filters)
+        return f"{self.format_response(response)}{self.confidence_footer()}"
+
+    def context_stats(self) -> dict:
+        """Return the context report of the last generated answer and the prompt tokens saved so far."""
+        return {**self.last_context_report, "total_tokens_saved": self.tokens_saved}
 
-        # Structure response
-        formatted = response.replace("1.", "**1. Clinical Summary**\n") \
-            .replace("2.", "\n**2. Key Recommendations**\n- ") \
-            .replace("3.", "\n**3. Sources**\n- ")
-        return f"{formatted}\n\n🔍 *Confidence: {np.random.randint(70, 95)}%*"
\ No newline at end of file
+    def cache_stats(self) -> dict:
+        """Return response cache hit/miss counters, or an empty dict when caching is disabled."""
+        return self.response_cache.stats() if self.response_cache is not None else {}
@@ -3,12 +3,17 @@ import logging
 import chromadb
 from chromadb.config import Settings
 import numpy as np
-from typing import List, Dict, Any, Optional
-import time
+from typing import List, Dict, Any, Optional, Set
+from langchain.docstore.document import Document
+from core.ingestion_manifest import assign_chunk_ids
+
+# Used until a client reports its own limit
+DEFAULT_MAX_BATCH_SIZE = 5000
 
 
 class ChromaValidator:
     def __init__(self):
+        self.max_batch_size = DEFAULT_MAX_BATCH_SIZE
         self.logger = logging.getLogger(__name__)
         logging.basicConfig(level=logging.INFO)
 
@@ -26,6 +31,12 @@ class ChromaValidator:
                 settings=settings
             )
 
+            # Write batches as large as the server accepts
+            if hasattr(client, "get_max_batch_size"):
+                self.max_batch_size = client.get_max_batch_size()
+            elif hasattr(client, "max_batch_size"):
+                self.max_batch_size = client.max_batch_size
+
             self.logger.info(f"ChromaDB client initialized with persist_dir: {persist_dir}")
             return client
 
@@ -53,25 +64,73 @@ class ChromaValidator:
             if not collection:
                 raise ValueError("Failed to create collection")
 
-            time.sleep(1)  # Allow collection to initialize
             return collection
 
         except Exception as e:
             self.logger.error(f"Error in collection validation/creation: {str(e)}")
             raise
 
+    def existing_ids(self, collection: chromadb.Collection, ids: List[str]) -> Set[str]:
+        """Return the subset of IDs already stored in the collection."""
+        existing = set()
+        batch_size = self.max_batch_size
+        for i in range(0, len(ids), batch_size):
+            result = collection.get(ids=ids[i:i + batch_size], include=[])
+            existing.update(result["ids"])
+        return existing
+
+    def stored_ids(self, collection: chromadb.Collection) -> List[str]:
+        """Return the IDs of every document in the collection, read in pages of the maximum batch size."""
+        ids = []
+        batch_size = self.max_batch_size
+        while True:
+            result = collection.get(include=[], limit=batch_size, offset=len(ids))
+            ids.extend(result["ids"])
+            if len(result["ids"]) < batch_size:
+                return ids
+
+    def remove_obsolete(self, collection: chromadb.Collection, keep_ids: Set[str]) -> List[str]:
+        """
+        Delete every stored document whose ID is not in `keep_ids`.
+
+        Without a manifest this is how chunks of deleted or rewritten files
+        leave a collection that persists between full ingests.
+
+        Returns:
+            List[str]: IDs that were deleted
+        """
+        obsolete = [chunk_id for chunk_id in self.stored_ids(collection) if chunk_id not in keep_ids]
+        self.delete_from_collection(collection, obsolete)
+        return obsolete
+
     def add_documents_to_collection(self,
                                     collection: chromadb.Collection,
                                     documents: List[str],
                                     embeddings: List[List[float]],
-                                    metadatas: Optional[List[Dict]] = None) -> bool:
-        """Add documents to collection with validation."""
+                                    metadatas: Optional[List[Dict]] = None,
+                                    ids: Optional[List[str]] = None) -> bool:
+        """
+        Upsert documents into the collection with validation.
+
+        IDs default to deterministic content-derived chunk IDs, so writing the
+        same documents again updates them in place instead of duplicating
+        them. Documents are written in batches of the client's maximum batch
+        size, with no pauses between batches.
+
+        Returns:
+            bool: True if every document is present in the collection afterwards
+        """
         try:
-            # Generate unique IDs
-            ids = [f"doc_{i}_{int(time.time())}" for i in range(len(documents))]
-
-            # Add documents in batches
-            batch_size = 50
+            # Generate deterministic IDs
+            if ids is None:
+                chunks = [
+                    Document(page_content=text, metadata=dict(metadatas[i]) if metadatas else {})
+                    for i, text in enumerate(documents)
+                ]
+                ids = assign_chunk_ids(chunks)
+
+            # Upsert documents in batches
+            batch_size = self.max_batch_size
             for i in range(0, len(documents), batch_size):
                 end_idx = min(i + batch_size, len(documents))
 
@@ -81,29 +140,64 @@ class ChromaValidator:
                 batch_ids = ids[i:end_idx]
                 batch_metadata = metadatas[i:end_idx] if metadatas else None
 
-                # Add batch
-                collection.add(
+                collection.upsert(
                     documents=batch_docs,
                     embeddings=batch_embeddings,
                     metadatas=batch_metadata,
                     ids=batch_ids
                 )
 
-                self.logger.info(f"Added batch of {len(batch_docs)} documents")
-                time.sleep(0.5)  # Prevent overwhelming the database
+                self.logger.info(f"Upserted batch of {len(batch_docs)} documents")
 
-            # Verify final count
-            time.sleep(1)  # Allow collection to settle
-            final_count = collection.count()
-            expected_count = len(documents)
+            # Verify every document landed
+            unique_ids = list(dict.fromkeys(ids))
+            stored = len(self.existing_ids(collection, unique_ids))
 
-            if final_count == expected_count:
-                self.logger.info(f"Successfully added all {final_count} documents")
+            if stored == len(unique_ids):
+                self.logger.info(f"Successfully upserted all {stored} documents")
                 return True
             else:
-                self.logger.warning(f"Document count mismatch. Expected: {expected_count}, Got: {final_count}")
+                self.logger.warning(f"Document count mismatch. Expected: {len(unique_ids)}, Got: {stored}")
                 return False
 
         except Exception as e:
             self.logger.error(f"Error adding documents to collection: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def delete_from_collection(self, collection: chromadb.Collection, ids: List[str]) -> int:
+        """Delete documents by ID, returning how many were removed."""
+        if not ids:
+            return 0
+
+        try:
+            before = collection.count()
+            batch_size = self.max_batch_size
+            for i in range(0, len(ids), batch_size):
+                collection.delete(ids=ids[i:i + batch_size])
+            removed = before - collection.count()
+            self.logger.info(f"Deleted {removed} stale documents")
+            return removed
+
+        except Exception as e:
+            self.logger.error(f"Error deleting documents from collection: {str(e)}")
+            raise
+
+    def get_metadatas(self, collection: chromadb.Collection, ids: List[str]) -> Dict[str, Dict]:
+        """Return the stored metadata of the given IDs, skipping IDs that are not stored."""
+        metadatas = {}
+        batch_size = self.max_batch_size
+        for i in range(0, len(ids), batch_size):
+            result = collection.get(ids=ids[i:i + batch_size], include=['metadatas'])
+            metadatas.update(zip(result["ids"], result["metadatas"]))
+        return metadatas
+
+    def update_metadatas(self, collection: chromadb.Collection, ids: List[str], metadatas: List[Dict]):
+        """Replace the metadata of stored documents without touching their embeddings."""
+        try:
+            batch_size = self.max_batch_size
+            for i in range(0, len(ids), batch_size):
+                collection.update(ids=ids[i:i + batch_size], metadatas=metadatas[i:i + batch_size])
+
+        except Exception as e:
+            self.logger.error(f"Error updating document metadata: {str(e)}")
+            raise
@@ -0,0 +1,337 @@
+# core/chunk_store.py
+import logging
+import mmap
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+ID_WIDTH = 32
+
+# Column files, one fixed-width value per chunk, plus the variable-length text blob
+COLUMNS = {
+    "offsets": np.dtype('<u8'),
+    "lengths": np.dtype('<u4'),
+    "pages": np.dtype('<i4'),
+    "sources": np.dtype('<u4'),
+    "ids": np.dtype(f'S{ID_WIDTH}')
+}
+
+# Deleted IDs with the row count at deletion time, so a later re-append of the ID stays visible
+TOMBSTONE_DTYPE = np.dtype([("id", f'S{ID_WIDTH}'), ("before", '<u8')])
+
+
+class ChunkStore:
+    """
+    Append-only columnar store of chunk text and location metadata.
+
+    Each column is a flat binary file of fixed-width values (text offset,
+    text length, page, dictionary-encoded source and chunk ID), with the
+    UTF-8 chunk texts concatenated in a separate blob. Columns are appended
+    during ingestion and read back through memory maps, so a chunk can be
+    fetched by ID without loading the rest of the corpus into memory.
+
+    Chunk IDs are content-derived, so appending an ID that is already
+    stored is skipped. Deleted IDs are recorded as tombstones that hide
+    only earlier rows, so a deleted chunk appended again is a new, live
+    row. Once the share of dead rows passes `compact_ratio`, deleting
+    compacts the store by rewriting its live rows, so re-ingesting changed
+    files does not grow the columns without bound.
+    """
+
+    def __init__(self, directory: str, compact_ratio: float = 0.3):
+        """
+        Open or create a chunk store.
+
+        Args:
+            directory: Directory holding the column files
+            compact_ratio: Share of dead rows above which `delete` compacts the store;
+                1.0 or more disables automatic compaction
+        """
+        self.directory = Path(directory)
+        self.compact_ratio = compact_ratio
+        self._recover_compaction()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._text_map: Optional[mmap.mmap] = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._row_by_id: Dict[str, int] = {}
+        self._rows = 0
+        self._sources: List[str] = []
+        self._source_index: Dict[str, int] = {}
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+        self._repair()
+        self.refresh()
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f"{name}.bin"
+
+    def _sibling(self, suffix: str) -> Path:
+        return self.directory.with_name(self.directory.name + suffix)
+
+    def _recover_compaction(self):
+        """Finish or roll back a compaction interrupted between its directory swaps."""
+        previous = self._sibling(".old")
+        if previous.exists():
+            if self.directory.exists():
+                shutil.rmtree(previous)
+            else:
+                previous.rename(self.directory)
+        shutil.rmtree(self._sibling(".compact"), ignore_errors=True)
+
+    def _repair(self):
+        """Truncate columns left longer than the others by an interrupted append."""
+        rows = min(
+            (self._path(name).stat().st_size // dtype.itemsize if self._path(name).exists() else 0)
+            for name, dtype in COLUMNS.items()
+        )
+        for name, dtype in COLUMNS.items():
+            path = self._path(name)
+            if path.exists() and path.stat().st_size > rows * dtype.itemsize:
+                self.logger.warning(f"Truncating incomplete rows in chunk store column {name}")
+                with open(path, 'r+b') as f:
+                    f.truncate(rows * dtype.itemsize)
+
+    def refresh(self):
+        """(Re)open the memory maps and rebuild the ID index from disk."""
+        with self._lock:
+            sources_path = self.directory / "sources.txt"
+            self._sources = sources_path.read_text(encoding='utf-8').splitlines() if sources_path.exists() else []
+            self._source_index = {source: i for i, source in enumerate(self._sources)}
+
+            rows = self._open_maps()
+            self._row_by_id = {}
+            for row, raw_id in enumerate(self._columns["ids"][:rows]):
+                self._row_by_id[raw_id.decode('ascii')] = row
+
+            deleted_path = self._path("deleted")
+            if deleted_path.exists():
+                for raw_id, before in np.fromfile(deleted_path, dtype=TOMBSTONE_DTYPE):
+                    chunk_id = raw_id.decode('ascii')
+                    # A tombstone only hides rows written before it
+                    if self._row_by_id.get(chunk_id, before) < before:
+                        del self._row_by_id[chunk_id]
+
+    def _open_maps(self) -> int:
+        """Memory-map the column files and return the number of complete rows."""
+        rows = min(
+            (self._path(name).stat().st_size // dtype.itemsize if self._path(name).exists() else 0)
+            for name, dtype in COLUMNS.items()
+        )
+        self._columns = {}
+        for name, dtype in COLUMNS.items():
+            if rows:
+                self._columns[name] = np.memmap(self._path(name), dtype=dtype, mode='r', shape=(rows,))
+            else:
+                self._columns[name] = np.zeros(0, dtype=dtype)
+
+        if self._text_map is not None:
+            self._text_map.close()
+            self._text_map = None
+        text_path = self._path("text")
+        if text_path.exists() and text_path.stat().st_size:
+            with open(text_path, 'rb') as f:
+                self._text_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._rows = rows
+        return rows
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._row_by_id
+
+    def append(self, chunks: List[Document]) -> int:
+        """
+        Append chunks carrying `chunk_id` metadata, skipping IDs already stored.
+
+        Returns:
+            int: Number of chunks written
+        """
+        with self._lock:
+            new_chunks = [chunk for chunk in chunks if chunk.metadata["chunk_id"] not in self._row_by_id]
+            if not new_chunks:
+                return 0
+
+            new_sources = []
+            for chunk in new_chunks:
+                source = chunk.metadata.get('source', 'unknown')
+                if source not in self._source_index:
+                    self._source_index[source] = len(self._sources)
+                    self._sources.append(source)
+                    new_sources.append(source)
+
+            texts = [chunk.page_content.encode('utf-8') for chunk in new_chunks]
+            text_path = self._path("text")
+            start = text_path.stat().st_size if text_path.exists() else 0
+            lengths = np.array([len(text) for text in texts], dtype=COLUMNS["lengths"])
+            offsets = start + np.concatenate(([0], np.cumsum(lengths, dtype=np.uint64)[:-1])).astype(COLUMNS["offsets"])
+
+            columns = {
+                "offsets": offsets,
+                "lengths": lengths,
+                "pages": np.array([int(chunk.metadata.get('page', -1)) for chunk in new_chunks],
+                                  dtype=COLUMNS["pages"]),
+                "sources": np.array([self._source_index[chunk.metadata.get('source', 'unknown')]
+                                     for chunk in new_chunks], dtype=COLUMNS["sources"]),
+                "ids": np.array([chunk.metadata["chunk_id"].encode('ascii') for chunk in new_chunks],
+                                dtype=COLUMNS["ids"])
+            }
+
+            # Text and sources first, so every appended row points at data that exists
+            with open(text_path, 'ab') as f:
+                f.write(b"".join(texts))
+            if new_sources:
+                with open(self.directory / "sources.txt", 'a', encoding='utf-8') as f:
+                    f.write("".join(f"{source}\n" for source in new_sources))
+            for name, values in columns.items():
+                with open(self._path(name), 'ab') as f:
+                    values.tofile(f)
+
+            first_row = self._rows
+            self._open_maps()
+            for i, chunk in enumerate(new_chunks):
+                self._row_by_id[chunk.metadata["chunk_id"]] = first_row + i
+            return len(new_chunks)
+
+    def delete(self, chunk_ids: List[str]):
+        """Mark chunks as deleted."""
+        with self._lock:
+            present = [chunk_id for chunk_id in chunk_ids if chunk_id in self._row_by_id]
+            if not present:
+                return
+            tombstones = np.array([(chunk_id.encode('ascii'), self._rows) for chunk_id in present],
+                                  dtype=TOMBSTONE_DTYPE)
+            with open(self._path("deleted"), 'ab') as f:
+                tombstones.tofile(f)
+            for chunk_id in present:
+                self._row_by_id.pop(chunk_id, None)
+            if self._rows and self.dead_ratio > self.compact_ratio:
+                self.compact()
+
+    @property
+    def dead_ratio(self) -> float:
+        """Share of stored rows that are deleted or superseded."""
+        return 1.0 - len(self._row_by_id) / self._rows if self._rows else 0.0
+
+    def compact(self, block_size: int = 4096) -> int:
+        """
+        Rewrite the store with only its live rows, dropping deleted text and tombstones.
+
+        Live rows are copied block by block into a sibling directory, which then
+        replaces the store's directory; an interrupted compaction is rolled back
+        or finished when the store is next opened.
+
+        Args:
+            block_size: Rows copied per append
+
+        Returns:
+            int: Number of rows dropped
+        """
+        with self._lock:
+            live = sorted(self._row_by_id.values())
+            dropped = self._rows - len(live)
+            if not dropped:
+                return 0
+
+            target = self._sibling(".compact")
+            shutil.rmtree(target, ignore_errors=True)
+            compacted = ChunkStore(str(target), compact_ratio=1.0)
+            for start in range(0, len(live), block_size):
+                rows = [self._read_row(row) for row in live[start:start + block_size]]
+                compacted.append([
+                    Document(page_content=row["text"],
+                             metadata={"chunk_id": row["chunk_id"], "source": row["source"], "page": row["page"]})
+                    for row in rows
+                ])
+            compacted.close()
+
+            self.close()
+            previous = self._sibling(".old")
+            self.directory.rename(previous)
+            target.rename(self.directory)
+            shutil.rmtree(previous)
+            self.refresh()
+            self.logger.info(f"Compacted chunk store, dropped {dropped} dead rows")
+            return dropped
+
+    def reset(self):
+        """Forget every chunk and delete the column files."""
+        with self._lock:
+            self.close()
+            for name in list(COLUMNS) + ["text", "deleted"]:
+                self._path(name).unlink(missing_ok=True)
+            (self.directory / "sources.txt").unlink(missing_ok=True)
+            self.refresh()
+
+    def _read_row(self, row: int) -> Dict[str, object]:
+        offset = int(self._columns["offsets"][row])
+        length = int(self._columns["lengths"][row])
+        return {
+            "chunk_id": self._columns["ids"][row].decode('ascii'),
+            "text": self._text_map[offset:offset + length].decode('utf-8'),
+            "source": self._sources[int(self._columns["sources"][row])],
+            "page": int(self._columns["pages"][row])
+        }
+
+    def get(self, chunk_id: str) -> Optional[Dict[str, object]]:
+        """Return a chunk's text, source, page and ID, or None if it is not stored."""
+        with self._lock:
+            row = self._row_by_id.get(chunk_id)
+            return self._read_row(row) if row is not None else None
+
+    def get_text(self, chunk_id: str, default: Optional[str] = None) -> Optional[str]:
+        """Return a chunk's text, or `default` if it is not stored."""
+        chunk = self.get(chunk_id)
+        return chunk["text"] if chunk is not None else default
+
+    def get_many(self, chunk_ids: List[str]) -> List[Optional[Dict[str, object]]]:
+        """Fetch several chunks by ID, preserving order."""
+        with self._lock:
+            return [self._read_row(self._row_by_id[chunk_id]) if chunk_id in self._row_by_id else None
+                    for chunk_id in chunk_ids]
+
+    def get_locations(self, chunk_ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """
+        Read the source and page of several chunks without touching their texts.
+
+        Returns:
+            Tuple of (source per chunk, page per chunk); unknown IDs get source "" and page -1
+        """
+        with self._lock:
+            rows = np.array([self._row_by_id.get(chunk_id, -1) for chunk_id in chunk_ids], dtype=np.int64)
+            known = rows >= 0
+            pages = np.full(len(rows), -1, dtype=np.int32)
+            source_codes = np.zeros(len(rows), dtype=np.int64)
+            if known.any():
+                pages[known] = self._columns["pages"][rows[known]]
+                source_codes[known] = self._columns["sources"][rows[known]]
+            sources = [self._sources[code] if is_known else "" for code, is_known in
+                       zip(source_codes.tolist(), known.tolist())]
+        return sources, pages
+
+    def iter_chunks(self, block_size: int = 1024) -> Iterator[Dict[str, object]]:
+        """
+        Iterate over live chunks in insertion order.
+
+        Chunks are read by ID in blocks, each under the lock, so a compaction
+        between blocks, which renumbers rows and swaps the column files, is safe.
+        Chunks deleted during the iteration are skipped.
+        """
+        with self._lock:
+            chunk_ids = sorted(self._row_by_id, key=self._row_by_id.get)
+        for start in range(0, len(chunk_ids), block_size):
+            for chunk in self.get_many(chunk_ids[start:start + block_size]):
+                if chunk is not None:
+                    yield chunk
+
+    def close(self):
+        with self._lock:
+            if self._text_map is not None:
+                self._text_map.close()
+                self._text_map = None
+            self._columns = {}
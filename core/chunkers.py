@@ -0,0 +1,201 @@
+# core/chunkers.py
+import bisect
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Token classes per ASCII code point; every code point >= 128 maps to OTHER.
+# Letter and digit runs form one token each, every OTHER character is its own
+# token. Close to how BERT-style embedding tokenizers (e.g. nomic-embed-text)
+# count tokens for English prose.
+SPACE, LETTER, DIGIT, OTHER = 0, 1, 2, 3
+CHAR_CLASSES = np.full(129, OTHER, dtype=np.uint8)
+CHAR_CLASSES[[ord(c) for c in " \t\n\r\f\v"]] = SPACE
+CHAR_CLASSES[ord('a'):ord('z') + 1] = LETTER
+CHAR_CLASSES[ord('A'):ord('Z') + 1] = LETTER
+CHAR_CLASSES[ord('0'):ord('9') + 1] = DIGIT
+
+# Same tokenization as a regex, for counting tokens in short strings
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|[0-9]+|[^\sA-Za-z0-9]", re.ASCII)
+
+# Tokens a chunk prefers to end on
+SENTENCE_END = np.zeros(129, dtype=bool)
+SENTENCE_END[[ord(c) for c in ".!?;"]] = True
+
+# Lines that start a new section: numbered headings ("2.1 Dosage"), ALL CAPS
+# lines, or short Title Case lines without trailing punctuation
+HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"\d+(?:\.\d+)*\.?[ \t]+[A-Z][^\n]{0,80}"
+    r"|[A-Z][A-Z0-9 ,&/\-]{2,80}"
+    r"|(?:[A-Z][\w\-]*[ \t]+){1,8}[A-Z][\w\-]*"
+    r")[ \t]*$",
+    re.MULTILINE
+)
+
+
+def tokenize_offsets(text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find token boundaries in one vectorized pass.
+
+    Returns:
+        Arrays of token start offsets, token end offsets, and for each token
+        the index of the last sentence-ending token at or before it (-1 if none)
+    """
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+    classes = CHAR_CLASSES[np.minimum(codes, 128)]
+    if not len(classes):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    previous = np.empty_like(classes)
+    previous[0] = SPACE
+    previous[1:] = classes[:-1]
+    following = np.empty_like(classes)
+    following[-1] = SPACE
+    following[:-1] = classes[1:]
+
+    in_token = classes != SPACE
+    single = classes == OTHER
+    starts = np.flatnonzero(in_token & (single | (classes != previous)))
+    ends = np.flatnonzero(in_token & (single | (classes != following))) + 1
+
+    stops = SENTENCE_END[np.minimum(codes[starts], 128)]
+    last_stop = np.maximum.accumulate(np.where(stops, np.arange(len(starts)), -1)) if len(starts) else starts
+    return starts, ends, last_stop
+
+
+class TokenChunker:
+    """
+    Single-pass, token-aware chunker.
+
+    Tokenizes each page in one vectorized pass, then emits chunks of at most `chunk_tokens`
+    tokens with `chunk_overlap_tokens` of overlap. Chunks never cross a
+    section heading, and prefer to end on a sentence boundary when one falls
+    in the last quarter of the window. Chunk text is sliced straight from
+    the page, so whitespace and line breaks are preserved.
+    """
+
+    def __init__(self, chunk_tokens: int = 96, chunk_overlap_tokens: int = 16,
+                 respect_headings: bool = True):
+        """
+        Initialize the chunker.
+
+        Args:
+            chunk_tokens: Maximum tokens per chunk
+            chunk_overlap_tokens: Tokens shared by consecutive chunks of one section
+            respect_headings: Start a new chunk at every detected section heading
+        """
+        if chunk_overlap_tokens >= chunk_tokens:
+            raise ValueError("chunk_overlap_tokens must be smaller than chunk_tokens")
+
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.respect_headings = respect_headings
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        """Number of tokens in a text, as counted by the chunker."""
+        return len(TOKEN_PATTERN.findall(text))
+
+    def _section_starts(self, text: str) -> List[int]:
+        """Character offsets where sections begin."""
+        if not self.respect_headings:
+            return []
+        return [match.start() for match in HEADING_PATTERN.finditer(text)]
+
+    def split_page(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Split one page into chunks.
+
+        Returns:
+            List of dicts with the chunk `text`, its `start_index` in the page
+            and the `section` heading it belongs to (empty before the first heading)
+        """
+        starts, ends, last_stop = tokenize_offsets(text)
+        if not len(starts):
+            return []
+        starts, ends, last_stop = starts.tolist(), ends.tolist(), last_stop.tolist()
+
+        section_starts = self._section_starts(text)
+        boundaries = sorted({bisect.bisect_left(starts, offset) for offset in section_starts} | {0})
+        boundaries.append(len(starts))
+        headings = set(section_starts)
+        # Only the last quarter of a window is searched for a sentence end
+        tail_tokens = max(1, self.chunk_tokens // 4)
+
+        chunks = []
+        for section_start, section_end in zip(boundaries, boundaries[1:]):
+            if section_start >= section_end:
+                continue
+
+            section = ""
+            line_start = text.rfind("\n", 0, starts[section_start]) + 1
+            if line_start in headings:
+                line_end = text.find("\n", starts[section_start])
+                section = text[line_start:line_end if line_end != -1 else len(text)].strip()
+
+            start = section_start
+            while True:
+                end = min(start + self.chunk_tokens, section_end)
+                if end < section_end:
+                    stop = last_stop[end - 1]
+                    if stop >= max(start, end - tail_tokens):
+                        end = stop + 1
+
+                chunks.append({
+                    "text": text[starts[start]:ends[end - 1]],
+                    "start_index": starts[start],
+                    "section": section
+                })
+                if end >= section_end:
+                    break
+                start = max(end - self.chunk_overlap_tokens, start + 1)
+
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        """Split one page into chunk texts, like LangChain's `TextSplitter.split_text`."""
+        return [chunk["text"] for chunk in self.split_page(text)]
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """Split pages into chunk documents, copying page metadata onto every chunk."""
+        split_docs = []
+        for document in documents:
+            for chunk in self.split_page(document.page_content):
+                metadata = dict(document.metadata)
+                metadata["start_index"] = chunk["start_index"]
+                if chunk["section"]:
+                    metadata["section"] = chunk["section"]
+                split_docs.append(Document(page_content=chunk["text"], metadata=metadata))
+        return split_docs
+
+
+def create_text_splitter(chunking: Optional[Dict[str, Any]] = None):
+    """
+    Build the text splitter selected by the `chunking` settings.
+
+    `strategy: recursive` (default) uses LangChain's character-based
+    RecursiveCharacterTextSplitter with `chunk_size`/`chunk_overlap`;
+    `strategy: token` uses TokenChunker with `chunk_tokens`/`chunk_overlap_tokens`.
+    """
+    chunking = chunking or {}
+    strategy = chunking.get("strategy", "recursive")
+
+    if strategy == "recursive":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunking.get("chunk_size", 300),
+            chunk_overlap=chunking.get("chunk_overlap", 50)
+        )
+    if strategy == "token":
+        return TokenChunker(
+            chunk_tokens=chunking.get("chunk_tokens", 96),
+            chunk_overlap_tokens=chunking.get("chunk_overlap_tokens", 16),
+            respect_headings=chunking.get("respect_headings", True)
+        )
+    raise ValueError(f"Unknown chunking strategy: {strategy}")
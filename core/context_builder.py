@@ -0,0 +1,218 @@
+# core/context_builder.py
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from core.chunkers import TOKEN_PATTERN, TokenChunker
+from core.vector_index import VectorIndex, normalize_rows
+
+# Shortest shared text treated as chunk overlap rather than a coincidence
+MIN_OVERLAP_CHARS = 20
+
+
+def merge_overlap(first: str, second: str, max_overlap: int) -> Optional[str]:
+    """
+    Join two texts when the end of `first` repeats the start of `second`.
+
+    Returns:
+        Optional[str]: The joined text, `first` if it already contains `second`,
+        or None if the texts do not overlap
+    """
+    if second in first:
+        return first
+    for size in range(min(len(first), len(second), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+
+class ContextBuilder:
+    """
+    Post-retrieval stage turning retrieved chunks into a compact prompt context.
+
+    Chunks of the same page that overlap (neighbours split with
+    `chunk_overlap`) are merged into one passage; passages are optionally
+    reranked with a local cross-encoder, then picked by maximal marginal
+    relevance so near-identical passages do not crowd out other evidence,
+    until the token budget is spent. Every build records how many prompt
+    tokens it saved against formatting all retrieved chunks.
+    """
+
+    def __init__(self, max_tokens: int = 1200, mmr_lambda: float = 0.7, merge_overlapping: bool = True,
+                 max_overlap_chars: int = 400, vector_index: Optional[VectorIndex] = None,
+                 embed_query: Optional[Callable[[str], np.ndarray]] = None,
+                 reranker_model: Optional[str] = None):
+        """
+        Initialize the context builder.
+
+        Args:
+            max_tokens: Token budget of the context; 0 disables the budget
+            mmr_lambda: Weight of relevance against novelty in MMR; 1 ranks by relevance only
+            merge_overlapping: Merge overlapping chunks of the same page
+            max_overlap_chars: Longest overlap looked for when merging
+            vector_index: Index holding the chunk vectors, used for MMR without re-embedding
+            embed_query: Query embedding function, used for MMR relevance
+            reranker_model: Optional sentence-transformers cross-encoder, e.g.
+                "cross-encoder/ms-marco-MiniLM-L-6-v2"
+        """
+        self.max_tokens = max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.merge_overlapping = merge_overlapping
+        self.max_overlap_chars = max_overlap_chars
+        self.vector_index = vector_index
+        self.embed_query = embed_query
+        self.reranker = None
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+        if reranker_model:
+            try:
+                from sentence_transformers import CrossEncoder
+            except ImportError as e:
+                raise ImportError("Reranking needs the sentence-transformers package") from e
+            self.reranker = CrossEncoder(reranker_model)
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return TokenChunker.count_tokens(text)
+
+    @staticmethod
+    def truncate_tokens(text: str, max_tokens: int) -> str:
+        """Cut a text after its first `max_tokens` tokens."""
+        for i, match in enumerate(TOKEN_PATTERN.finditer(text)):
+            if i == max_tokens - 1:
+                return text[:match.end()]
+        return text
+
+    @staticmethod
+    def format_documents(documents: List[Document]) -> str:
+        return "\n\n".join(document.page_content for document in documents)
+
+    def merge(self, documents: List[Document]) -> List[Document]:
+        """Merge overlapping chunks of the same source page, keeping the rank of the best one."""
+        passages: List[Document] = []
+        for document in documents:
+            key = (document.metadata.get('source'), document.metadata.get('page'))
+            text = document.page_content
+            # Passages merged again when bridging already carry the IDs of all their chunks
+            chunk_ids = document.metadata.get("chunk_ids") or [document.metadata.get("chunk_id")]
+            merged_into = None
+            for passage in passages:
+                if (passage.metadata.get('source'), passage.metadata.get('page')) != key:
+                    continue
+                joined = (merge_overlap(passage.page_content, text, self.max_overlap_chars)
+                          or merge_overlap(text, passage.page_content, self.max_overlap_chars))
+                if joined is not None:
+                    passage.page_content = joined
+                    passage.metadata["chunk_ids"].extend(chunk_ids)
+                    merged_into = passage
+                    break
+
+            if merged_into is None:
+                metadata = dict(document.metadata)
+                metadata["chunk_ids"] = list(chunk_ids)
+                passages.append(Document(page_content=text, metadata=metadata))
+            elif len(passages) > 1:
+                # The grown passage may now bridge to another passage of the page
+                passages = self.merge(passages)
+        return passages
+
+    def _passage_vectors(self, passages: List[Document]) -> Optional[np.ndarray]:
+        """Mean chunk vector of every passage, read from the vector index."""
+        if self.vector_index is None or not self.vector_index.ids:
+            return None
+        vectors = np.zeros((len(passages), self.vector_index.dimensions), dtype=np.float32)
+        for i, passage in enumerate(passages):
+            found = self.vector_index.get_vectors_by_id(passage.metadata["chunk_ids"])
+            if found is None:
+                return None
+            vectors[i] = found.mean(axis=0)
+        return normalize_rows(vectors)
+
+    def rerank(self, query: str, passages: List[Document]) -> Optional[np.ndarray]:
+        """Cross-encoder relevance of every passage, scaled to [0, 1], or None without a reranker."""
+        if self.reranker is None or not passages:
+            return None
+        scores = np.asarray(self.reranker.predict([(query, passage.page_content) for passage in passages]),
+                            dtype=np.float32)
+        spread = scores.max() - scores.min()
+        return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+    def mmr_order(self, relevance: np.ndarray, vectors: np.ndarray) -> List[int]:
+        """Order passages by maximal marginal relevance."""
+        similarity = vectors @ vectors.T
+        remaining = list(range(len(relevance)))
+        order: List[int] = []
+        while remaining:
+            if order:
+                redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining), dtype=np.float32)
+            values = self.mmr_lambda * relevance[remaining] - (1.0 - self.mmr_lambda) * redundancy
+            order.append(remaining.pop(int(np.argmax(values))))
+        return order
+
+    def build(self, query: str, documents: List[Document]) -> Tuple[str, Dict[str, int]]:
+        """
+        Build the prompt context for a query from retrieved chunks.
+
+        Args:
+            query: User query
+            documents: Retrieved chunks, best first
+
+        Returns:
+            Tuple of the context text and a report with the chunk, passage and token
+            counts before and after, and the prompt tokens saved
+        """
+        tokens_before = self.count_tokens(self.format_documents(documents))
+        passages = self.merge(documents) if self.merge_overlapping else [
+            Document(page_content=d.page_content, metadata={**d.metadata, "chunk_ids": [d.metadata.get("chunk_id")]})
+            for d in documents
+        ]
+        merged_count = len(passages)
+
+        order = list(range(len(passages)))
+        relevance = self.rerank(query, passages)
+        vectors = self._passage_vectors(passages) if passages else None
+        if vectors is not None and relevance is None and self.embed_query is not None:
+            relevance = vectors @ VectorIndex.prepare_queries(self.embed_query(query))[0]
+        if relevance is not None:
+            order = [int(i) for i in np.argsort(-relevance, kind='stable')]
+            if vectors is not None and self.mmr_lambda < 1.0:
+                order = self.mmr_order(relevance, vectors)
+
+        selected, used = [], 0
+        for i in order:
+            tokens = self.count_tokens(passages[i].page_content)
+            if self.max_tokens and used + tokens > self.max_tokens:
+                continue
+            selected.append(passages[i])
+            used += tokens
+
+        truncated = False
+        if not selected and order:
+            # Every passage is over the budget; answering from a cut top passage beats answering from none
+            top = passages[order[0]]
+            selected = [Document(page_content=self.truncate_tokens(top.page_content, self.max_tokens),
+                                 metadata=top.metadata)]
+            truncated = True
+            self.logger.warning(f"Top passage exceeds the {self.max_tokens} token context budget, truncated it")
+
+        context = self.format_documents(selected)
+        tokens_after = self.count_tokens(context)
+        report = {
+            "chunks": len(documents),
+            "passages": merged_count,
+            "selected": len(selected),
+            "truncated": truncated,
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after
+        }
+        self.logger.info(
+            f"Context: {len(documents)} chunks -> {merged_count} passages -> {len(selected)} selected, "
+            f"{tokens_after} prompt tokens ({report['tokens_saved']} saved)"
+        )
+        return context, report
@@ -0,0 +1,266 @@
+# core/dedup.py
+import json
+import logging
+import os
+import re
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from core.embedding_cache import normalize_text
+
+# Parameters of the universal hash family h(x) = (a * x + b) mod p; a, b < 2^31
+# keep a * x + b below 2^64 for 32-bit shingle hashes
+MINHASH_PRIME = np.uint64(4294967311)
+MINHASH_SEED = 1
+
+WORD_PATTERN = re.compile(r"\w+")
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+class ChunkDeduplicator:
+    """
+    Near-duplicate chunk detection with MinHash signatures and an LSH band index.
+
+    Each chunk is reduced to a MinHash signature of its word shingles. The
+    signature is cut into bands and every band is hashed into a bucket, so
+    only chunks sharing a bucket are compared. A chunk whose estimated
+    Jaccard similarity to a stored canonical chunk reaches `threshold` (and
+    which mentions the same numbers, so differing doses or dates are never
+    merged) is dropped, and its source and page are recorded on the
+    canonical chunk's `duplicate_sources` metadata.
+
+    The index holds the canonical chunks stored in the vector store and can
+    be persisted next to it, so later incremental runs are deduplicated
+    against the whole corpus.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.9,
+                 num_perm: int = 64, bands: int = 16, shingle_size: int = 3,
+                 numbers_must_match: bool = True):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            path: File the index is saved to and loaded from; None keeps it in memory
+            threshold: Minimum estimated Jaccard similarity of two duplicates
+            num_perm: Number of hash functions in a signature
+            bands: Number of LSH bands; num_perm must be divisible by it
+            shingle_size: Words per shingle
+            numbers_must_match: Only merge chunks that contain the same numbers
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.numbers_must_match = numbers_must_match
+
+        rng = np.random.default_rng(MINHASH_SEED)
+        self._a = rng.integers(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 31, size=num_perm, dtype=np.uint64)
+
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._numbers: Dict[str, int] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [defaultdict(list) for _ in range(bands)]
+        # Duplicates found since the last sync: canonical ID -> [[source, page], ...]
+        self._links: Dict[str, List[list]] = defaultdict(list)
+        self.stats = {"checked": 0, "duplicates": 0}
+
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text's word shingles."""
+        words = WORD_PATTERN.findall(normalize_text(text).lower())
+        size = self.shingle_size
+        shingles = [" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))]
+        hashes = np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in shingles], dtype=np.uint64)
+        values = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % MINHASH_PRIME
+        return values.min(axis=1).astype(np.uint32)
+
+    @staticmethod
+    def numbers_key(text: str) -> int:
+        """Order-independent fingerprint of the numbers a text mentions."""
+        return zlib.crc32(" ".join(sorted(NUMBER_PATTERN.findall(text))).encode('utf-8'))
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _insert(self, chunk_id: str, signature: np.ndarray, numbers: int):
+        self._signatures[chunk_id] = signature
+        self._numbers[chunk_id] = numbers
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            band[key].append(chunk_id)
+
+    def find_canonical(self, signature: np.ndarray, numbers: int) -> Optional[str]:
+        """Return the ID of the most similar stored chunk above the threshold, if any."""
+        candidates = set()
+        for band, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(band.get(key, ()))
+
+        best_id, best_similarity = None, self.threshold
+        for candidate in candidates:
+            if self.numbers_must_match and self._numbers[candidate] != numbers:
+                continue
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best_id, best_similarity = candidate, similarity
+        return best_id
+
+    def deduplicate(self, chunks: List[Document]) -> Tuple[List[Document], List[Document]]:
+        """
+        Split chunks carrying `chunk_id` metadata into canonical chunks and duplicates.
+
+        Canonical chunks are added to the index. Duplicates get a
+        `duplicate_of` metadata entry and are queued as links for `sync_links`.
+
+        Returns:
+            Tuple of (canonical chunks, duplicate chunks), each in input order
+        """
+        unique, duplicates = [], []
+        for chunk in chunks:
+            chunk_id = chunk.metadata["chunk_id"]
+            if chunk_id in self._signatures or not chunk.page_content.strip():
+                unique.append(chunk)
+                continue
+
+            self.stats["checked"] += 1
+            signature = self.signature(chunk.page_content)
+            numbers = self.numbers_key(chunk.page_content)
+            canonical = self.find_canonical(signature, numbers)
+            if canonical is None:
+                self._insert(chunk_id, signature, numbers)
+                unique.append(chunk)
+                continue
+
+            self.stats["duplicates"] += 1
+            chunk.metadata["duplicate_of"] = canonical
+            self._links[canonical].append([chunk.metadata.get('source', 'unknown'), chunk.metadata.get('page', 0)])
+            duplicates.append(chunk)
+
+        if duplicates:
+            self.logger.info(f"Dropped {len(duplicates)} near-duplicate chunks out of {len(chunks)}")
+        return unique, duplicates
+
+    def remove(self, chunk_ids: List[str]):
+        """Drop chunks from the index, e.g. when they are deleted from the vector store."""
+        removed = set()
+        for chunk_id in chunk_ids:
+            signature = self._signatures.pop(chunk_id, None)
+            if signature is None:
+                continue
+            self._numbers.pop(chunk_id, None)
+            removed.add(chunk_id)
+            for band, key in zip(self._buckets, self._band_keys(signature)):
+                bucket = band.get(key)
+                if bucket is not None and chunk_id in bucket:
+                    bucket.remove(chunk_id)
+                    if not bucket:
+                        del band[key]
+        for chunk_id in removed:
+            self._links.pop(chunk_id, None)
+
+    def sync_links(self, collection, validator, unlinked: Optional[Dict[str, Set[str]]] = None) -> int:
+        """
+        Write queued duplicate links to the canonical chunks' metadata.
+
+        Args:
+            collection: Chroma collection holding the canonical chunks
+            validator: ChromaValidator used to read and update metadata
+            unlinked: Canonical ID -> sources whose duplicates were removed and
+                must be dropped from `duplicate_sources`
+
+        Returns:
+            int: Number of canonical chunks updated
+        """
+        unlinked = unlinked or {}
+        canonical_ids = list(dict.fromkeys(list(self._links) + list(unlinked)))
+        if not canonical_ids:
+            return 0
+
+        current = validator.get_metadatas(collection, canonical_ids)
+        ids, metadatas = [], []
+        for canonical_id in canonical_ids:
+            metadata = current.get(canonical_id)
+            if metadata is None:
+                continue
+            links = json.loads(metadata.get("duplicate_sources") or "[]")
+            removed_sources = unlinked.get(canonical_id, set())
+            links = [link for link in links if link[0] not in removed_sources]
+            links.extend(link for link in self._links.get(canonical_id, []) if link not in links)
+
+            metadata = dict(metadata)
+            metadata["duplicate_sources"] = json.dumps(links)
+            metadata["duplicate_count"] = len(links)
+            ids.append(canonical_id)
+            metadatas.append(metadata)
+
+        validator.update_metadatas(collection, ids, metadatas)
+        self._links = defaultdict(list)
+        return len(ids)
+
+    def reset(self):
+        """Forget every chunk and delete the saved index."""
+        self._signatures = {}
+        self._numbers = {}
+        self._buckets = [defaultdict(list) for _ in range(self.bands)]
+        self._links = defaultdict(list)
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+    def load(self):
+        """Load the saved index, starting empty if it is missing, unreadable or built with other parameters."""
+        if self.path is None or not self.path.exists():
+            return
+
+        try:
+            with np.load(self.path) as data:
+                params = (int(data["num_perm"]), int(data["bands"]), int(data["shingle_size"]))
+                if params != (self.num_perm, self.bands, self.shingle_size):
+                    self.logger.warning("Deduplication parameters changed, starting with an empty index")
+                    return
+                ids = [raw.decode('ascii') for raw in data["ids"]]
+                signatures = data["signatures"]
+                numbers = data["numbers"]
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f"Could not read deduplication index, starting empty: {str(e)}")
+            return
+
+        for chunk_id, signature, number in zip(ids, signatures, numbers.tolist()):
+            self._insert(chunk_id, signature, number)
+        self.logger.info(f"Loaded deduplication index with {len(ids)} chunks")
+
+    def save(self):
+        """Write the index atomically."""
+        if self.path is None:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        ids = list(self._signatures)
+        signatures = (np.stack([self._signatures[chunk_id] for chunk_id in ids])
+                      if ids else np.zeros((0, self.num_perm), dtype=np.uint32))
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                ids=np.array([chunk_id.encode('ascii') for chunk_id in ids], dtype='S32'),
+                signatures=signatures,
+                numbers=np.array([self._numbers[chunk_id] for chunk_id in ids], dtype=np.uint32),
+                num_perm=self.num_perm,
+                bands=self.bands,
+                shingle_size=self.shingle_size
+            )
+        os.replace(tmp_path, self.path)
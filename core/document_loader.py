@@ -1,38 +1,84 @@
 # document_loader.py
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import itertools
 import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from langchain.docstore.document import Document
-from langchain_community.document_loaders import PyPDFDirectoryLoader
+from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
 import os
+from core.chunk_store import ChunkStore
+from core.dedup import ChunkDeduplicator
+from core.ingestion_manifest import IngestionManifest, assign_chunk_ids
+from core.lexical_index import LexicalIndex
+from core.pdf_worker import parse_pdf_pages
+
+# PDFs above this size are split into page ranges so one large file can use several workers
+LARGE_PDF_BYTES = 5 * 1024 * 1024
+
+
+def read_document_info(source: str) -> Dict[str, str]:
+    """
+    Document-level metadata of a PDF: `doc_id` (the file name without extension)
+    and `pub_date` (its creation date as YYYY-MM-DD, "" if unknown).
+    """
+    pub_date = ""
+    try:
+        created = PdfReader(source).metadata.creation_date
+        if created is not None:
+            pub_date = created.date().isoformat()
+    except Exception:
+        # Missing or malformed metadata only leaves the date unknown
+        pass
+    return {"doc_id": Path(source).stem, "pub_date": pub_date}
 
 
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 300, chunk_overlap: int = 50):
-        """Initialize document processor with chunking parameters."""
+    def __init__(self, chunk_size: int = 300, chunk_overlap: int = 50,
+                 load_workers: int = 1, pages_per_task: int = 50,
+                 chunk_store: Optional[ChunkStore] = None, text_splitter=None,
+                 deduplicator: Optional[ChunkDeduplicator] = None,
+                 lexical_index: Optional[LexicalIndex] = None,
+                 start_method: str = "spawn"):
+        """
+        Initialize document processor with chunking parameters.
+
+        Args:
+            chunk_size: Maximum chunk size in characters
+            chunk_overlap: Overlap between consecutive chunks in characters
+            load_workers: Processes used to parse PDFs; 1 loads serially, 0 uses every core
+            pages_per_task: Pages per task when a large PDF is split across workers
+            chunk_store: Columnar store the produced chunks are appended to, if any
+            text_splitter: Splitter with a `split_documents` method, e.g. from
+                `core.chunkers.create_text_splitter`; overrides chunk_size/chunk_overlap
+            deduplicator: Near-duplicate index; duplicate chunks are dropped before embedding
+            lexical_index: BM25 inverted index the produced chunks are added to, if any
+            start_method: multiprocessing start method of the parsing pool; "spawn" is safe
+                from threaded servers, where a forked worker can inherit a held lock
+        """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.load_workers = load_workers if load_workers > 0 else (os.cpu_count() or 1)
+        self.pages_per_task = pages_per_task
+        self.mp_context = multiprocessing.get_context(start_method)
+        self.load_errors: Dict[str, str] = {}
+        self.chunk_store = chunk_store
+        self.deduplicator = deduplicator
+        self.lexical_index = lexical_index
+        self._document_info: Dict[str, Dict[str, str]] = {}
+        self.text_splitter = text_splitter or RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
         self.logger = logging.getLogger(__name__)
         logging.basicConfig(level=logging.INFO)
 
-    def write_chunks_to_file(self, chunks: List[Document], output_file: str = "debug_chunks.txt"):
-        """Write all document chunks to a file for debugging."""
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for i, chunk in enumerate(chunks):
-                f.write(f"\n\n=== CHUNK {i} ===\n")
-                f.write(f"Source: {chunk.metadata.get('source', 'unknown')}\n")
-                f.write(f"Page: {chunk.metadata.get('page', 'unknown')}\n")
-                f.write(f"Content:\n{chunk.page_content}\n")
-                f.write(f"Document ID: {chunk.metadata.get('doc_id', 'N/A')}\n")
-                f.write(f"Publication Date: {chunk.metadata.get('pub_date', 'N/A')}\n")
-
-    def load_documents(self, pdf_directory: Path) -> List[Document]:
-        """Load PDF documents from the specified directory."""
+    def load_documents(self, pdf_directory: Path, pdf_files: Optional[List[Path]] = None) -> List[Document]:
+        """Load PDF documents from the specified directory, or only the given files in it."""
         try:
             # Convert to absolute path and verify existence
             pdf_directory = pdf_directory.resolve()
@@ -42,15 +88,17 @@ class DocumentProcessor:
                 raise ValueError(f"PDF directory does not exist: {pdf_directory}")
 
             # List all PDF files in directory
-            pdf_files = list(pdf_directory.glob("*.pdf"))
-            self.logger.info(f"Found PDF files: {[f.name for f in pdf_files]}")
+            load_all = pdf_files is None
+            if load_all:
+                pdf_files = sorted(pdf_directory.glob("*.pdf"))
+                self.logger.info(f"Found PDF files: {[f.name for f in pdf_files]}")
 
-            if not pdf_files:
-                raise ValueError(f"No PDF files found in directory: {pdf_directory}")
+                if not pdf_files:
+                    raise ValueError(f"No PDF files found in directory: {pdf_directory}")
 
-            # Load documents
-            loader = PyPDFDirectoryLoader(str(pdf_directory))
-            documents = loader.load()
+            # Load documents; with one worker the same tasks are parsed in this process,
+            # so a file that fails to parse is skipped and recorded either way
+            documents = self.load_documents_parallel(pdf_files)
 
             self.logger.info(f"Loaded {len(documents)} document pages")
             if not documents:
@@ -62,13 +110,154 @@ class DocumentProcessor:
             self.logger.error(f"Error loading documents: {str(e)}")
             raise
 
+    def _plan_load_tasks(self, pdf_files: List[Path]) -> List[Tuple[str, int, Optional[int]]]:
+        """Turn files into (source, start page, end page) tasks, splitting large PDFs into page ranges."""
+        tasks = []
+        for pdf_file in pdf_files:
+            source = str(pdf_file)
+            if pdf_file.stat().st_size < LARGE_PDF_BYTES:
+                tasks.append((source, 0, None))
+                continue
+
+            try:
+                page_count = len(PdfReader(source).pages)
+            except Exception:
+                # Let the worker report the parse error
+                tasks.append((source, 0, None))
+                continue
+
+            for start in range(0, page_count, self.pages_per_task):
+                tasks.append((source, start, min(start + self.pages_per_task, page_count)))
+        return tasks
+
+    def load_documents_parallel(self, pdf_files: List[Path]) -> List[Document]:
+        """
+        Parse PDFs across a process pool.
+
+        Pages are returned in file order, then page order, regardless of which
+        worker finished first. Files that fail to parse are logged, recorded
+        in `load_errors` and left out, without stopping the rest of the load.
+
+        Args:
+            pdf_files: PDF files to load
+
+        Returns:
+            List[Document]: One document per page with `source` and `page` metadata
+        """
+        documents = list(self.iter_documents_parallel(pdf_files))
+        if self.load_errors:
+            self.logger.warning(f"Skipped {len(self.load_errors)} of {len(pdf_files)} PDFs that failed to parse")
+        return documents
+
+    def iter_documents_parallel(self, pdf_files: List[Path]) -> Iterator[Document]:
+        """Lazily parse PDFs across a process pool, keeping at most two tasks per worker in flight."""
+        self.load_errors = {}
+        tasks = self._plan_load_tasks(pdf_files)
+        workers = min(self.load_workers, len(tasks))
+        self.logger.info(f"Parsing {len(pdf_files)} PDFs as {len(tasks)} tasks on {workers} processes")
+
+        if workers <= 1:
+            yield from self._collect_pages(tasks, (parse_pdf_pages(*task) for task in tasks))
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=self.mp_context) as executor:
+            yield from self._collect_pages(tasks, self._bounded_map(executor, tasks, 2 * workers))
+
+    @staticmethod
+    def _bounded_map(executor: ProcessPoolExecutor, tasks: List[Tuple[str, int, Optional[int]]],
+                     max_in_flight: int) -> Iterator[Tuple[List[Tuple[int, str]], Optional[str]]]:
+        """Yield task results in submission order with a bounded number of pending futures."""
+        pending = deque()
+        task_iter = iter(tasks)
+        for task in itertools.islice(task_iter, max_in_flight):
+            pending.append(executor.submit(parse_pdf_pages, *task))
+
+        while pending:
+            future = pending.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                # Worker crashed, e.g. BrokenProcessPool
+                result = ([], f"{type(e).__name__}: {str(e)}")
+            for task in itertools.islice(task_iter, 1):
+                pending.append(executor.submit(parse_pdf_pages, *task))
+            yield result
+
+    def _collect_pages(self, tasks: List[Tuple[str, int, Optional[int]]],
+                       results: Iterable[Tuple[List[Tuple[int, str]], Optional[str]]]) -> Iterator[Document]:
+        """Regroup per-task results into whole files and yield their pages, skipping files with errors."""
+        current_source = None
+        current_pages: List[Tuple[int, str]] = []
+
+        def flush():
+            if current_source is None:
+                return
+            if current_source in self.load_errors:
+                self.logger.error(f"Failed to parse {current_source}: {self.load_errors[current_source]}")
+                return
+            for page, text in sorted(current_pages):
+                yield Document(page_content=text, metadata={"source": current_source, "page": page})
+
+        for (source, _, _), (task_pages, error) in zip(tasks, results):
+            if source != current_source:
+                yield from flush()
+                current_source, current_pages = source, []
+            if error is not None:
+                self.load_errors.setdefault(source, error)
+            else:
+                current_pages.extend(task_pages)
+        yield from flush()
+
+    def iter_documents(self, pdf_directory: Path, pdf_files: Optional[List[Path]] = None) -> Iterator[Document]:
+        """
+        Lazily load PDF pages, one file at a time.
+
+        As in `load_documents`, a file that fails to parse is recorded in
+        `load_errors` and skipped instead of aborting the load, so a long
+        streaming ingest is not lost to one broken file.
+        """
+        if pdf_files is None:
+            pdf_files = sorted(pdf_directory.resolve().glob("*.pdf"))
+
+        if self.load_workers > 1:
+            yield from self.iter_documents_parallel(pdf_files)
+            return
+
+        self.load_errors = {}
+        for pdf_file in pdf_files:
+            try:
+                pages = PyPDFLoader(str(pdf_file)).load()
+            except Exception as e:
+                self.load_errors[str(pdf_file)] = f"{type(e).__name__}: {str(e)}"
+                self.logger.error(f"Failed to parse {pdf_file}: {str(e)}")
+                continue
+            yield from pages
+
+    def document_info(self, source: str) -> Dict[str, str]:
+        """Return the `doc_id` and `pub_date` of a source, read once per file."""
+        info = self._document_info.get(source)
+        if info is None:
+            info = self._document_info[source] = read_document_info(source)
+        return info
+
+    def _add_document_info(self, document: Document) -> Document:
+        document.metadata.update(self.document_info(document.metadata.get('source', '')))
+        return document
+
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Split pages into chunks as they arrive, one page at a time."""
+        for document in documents:
+            yield from self.text_splitter.split_documents([self._add_document_info(document)])
+
     def split_documents(self, documents: List[Document]) -> List[Document]:
         """Split documents into chunks."""
         if not documents:
             raise ValueError("No documents provided for splitting")
 
         try:
-            split_docs = self.text_splitter.split_documents(documents)
+            split_docs = self.text_splitter.split_documents(
+                [self._add_document_info(document) for document in documents]
+            )
             self.logger.info(f"Split into {len(split_docs)} chunks")
 
             if not split_docs:
@@ -80,25 +269,78 @@ class DocumentProcessor:
             self.logger.error(f"Error splitting documents: {str(e)}")
             raise
 
-    def process_documents(self, pdf_directory: Path) -> List[Document]:
-        """Load and process documents in one go."""
+    def _remove_stale(self, manifest: IngestionManifest):
+        """Remove chunks of modified or deleted files from the chunk store, dedup and lexical indexes."""
+        stale_ids = manifest.stale_chunk_ids()
+        if self.chunk_store is not None:
+            self.chunk_store.delete(stale_ids)
+        if self.deduplicator is not None:
+            self.deduplicator.remove(stale_ids)
+        if self.lexical_index is not None:
+            self.lexical_index.remove(stale_ids)
+
+    def process_documents(self, pdf_directory: Path,
+                          manifest: Optional[IngestionManifest] = None) -> List[Document]:
+        """
+        Load and process documents in one go.
+
+        When a manifest is given only new or changed PDFs are loaded and split,
+        and an empty list is returned if nothing changed. The manifest keeps
+        the staged changes until the vector store commits them.
+        """
         try:
             self.logger.info(f"Starting document processing from: {pdf_directory}")
 
+            pdf_files = None
+            if manifest is not None:
+                resolved_dir = pdf_directory.resolve()
+                if not resolved_dir.exists():
+                    raise ValueError(f"PDF directory does not exist: {resolved_dir}")
+
+                all_files = sorted(resolved_dir.glob("*.pdf"))
+                if not all_files:
+                    raise ValueError(f"No PDF files found in directory: {resolved_dir}")
+
+                pdf_files = manifest.scan(all_files)
+                if not pdf_files:
+                    self._remove_stale(manifest)
+                    self.logger.info("No new or changed PDFs, skipping load and split")
+                    return []
+
             # Load documents
-            documents = self.load_documents(pdf_directory)
+            self.load_errors = {}
+            documents = self.load_documents(pdf_directory, pdf_files)
             self.logger.info(f"Loaded {len(documents)} documents")
 
+            if manifest is not None:
+                # Retry files that failed to parse on the next run; their previous
+                # version stays in every index until then
+                for source in self.load_errors:
+                    manifest.discard(source)
+                self._remove_stale(manifest)
+
             # Split into chunks
             split_docs = self.split_documents(documents)
             self.logger.info(f"Split into {len(split_docs)} chunks")
 
-            # Write chunks for debugging
-            self.write_chunks_to_file(split_docs)
+            if manifest is not None:
+                manifest.record_chunks(split_docs)
+            else:
+                assign_chunk_ids(split_docs)
 
             if not split_docs:
                 raise ValueError("No documents produced after processing")
 
+            if self.deduplicator is not None:
+                split_docs, duplicates = self.deduplicator.deduplicate(split_docs)
+                if manifest is not None:
+                    manifest.record_duplicates(duplicates)
+
+            if self.chunk_store is not None:
+                self.chunk_store.append(split_docs)
+            if self.lexical_index is not None:
+                self.lexical_index.add(split_docs)
+
             return split_docs
 
         except Exception as e:
@@ -0,0 +1,121 @@
+# core/embedding_batcher.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """
+    LangChain embeddings wrapper batching concurrent query embeddings.
+
+    `embed_query` calls from concurrent sessions are queued; a dispatcher
+    thread takes the first waiting query, gathers more for at most
+    `max_wait_ms` or until `max_batch_size` are waiting, and embeds them
+    with one `batch_fn` call, routing each vector back to its caller.
+    Identical texts in a batch are embedded once. While `max_in_flight`
+    batches are running, new queries keep queueing and form the next batch,
+    so the batch size grows with load and a lone query waits at most
+    `max_wait_ms` extra. Document embedding is passed through unchanged.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0, max_in_flight: int = 2):
+        """
+        Initialize the batcher.
+
+        Args:
+            embeddings: Embeddings used for documents, and for queries if no batch_fn is given
+            batch_fn: Function embedding a list of queries in one request; defaults to
+                `embeddings.embed_documents`, for models that embed queries like documents
+            max_batch_size: Queries sent together at most
+            max_wait_ms: Longest time the first query of a batch waits for company
+            max_in_flight: Batches embedded at once
+        """
+        self.embeddings = embeddings
+        self.batch_fn = batch_fn or embeddings.embed_documents
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._dispatcher: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats_counters: Dict[str, float] = {"queries": 0, "batches": 0, "errors": 0, "batch_seconds": 0.0}
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._ensure_dispatcher()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is not None:
+            return
+        with self._start_lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="embed-batcher", daemon=True)
+                self._dispatcher.start()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        """Block for the first query, then gather more until the batch is full or the wait is over."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self):
+        while True:
+            # Queries keep queueing while every slot is busy, so the next batch is fuller
+            self._slots.acquire()
+            batch = self._collect()
+            threading.Thread(target=self._run_batch, args=(batch, time.monotonic()),
+                             name="embed-batch", daemon=True).start()
+
+    def _run_batch(self, batch: List[Tuple[str, Future]], dispatched: float):
+        try:
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = self.batch_fn(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"Got {len(vectors)} embeddings for {len(texts)} texts")
+            except Exception as e:
+                self.logger.error(f"Error embedding a batch of {len(texts)} queries: {str(e)}")
+                with self._stats_lock:
+                    self.stats_counters["errors"] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+            by_text = dict(zip(texts, vectors))
+            for text, future in batch:
+                future.set_result(list(by_text[text]))
+            with self._stats_lock:
+                self.stats_counters["queries"] += len(batch)
+                self.stats_counters["batches"] += 1
+                self.stats_counters["batch_seconds"] += time.monotonic() - dispatched
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, float]:
+        """Return query and batch counts, the mean batch size and the mean time a batch takes."""
+        with self._stats_lock:
+            stats = dict(self.stats_counters)
+        batch_seconds = stats.pop("batch_seconds")
+        stats["mean_batch_size"] = stats["queries"] / stats["batches"] if stats["batches"] else 0.0
+        stats["mean_batch_ms"] = 1000.0 * batch_seconds / stats["batches"] if stats["batches"] else 0.0
+        return stats
@@ -0,0 +1,294 @@
+# core/embedding_cache.py
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keys: NFC unicode form and collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Persistent SQLite cache of embedding vectors.
+
+    Entries are keyed by a hash of the model name, the embedding kind
+    (document or query) and the normalized text, and stored as float32
+    blobs. When the stored vectors exceed `max_bytes`, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite database file, created if missing
+            max_bytes: Maximum total size of stored vectors before eviction
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, kind: str, text: str) -> str:
+        """Build the cache key for a text embedded by a model."""
+        key = f"{model}\x00{kind}\x00{normalize_text(text)}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Look up vectors by key, returning None for misses."""
+        if not keys:
+            return []
+
+        found: Dict[str, bytes] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            results = []
+            for key in keys:
+                blob = found.get(key)
+                if blob is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    results.append(np.frombuffer(blob, dtype=np.float32).tolist())
+        return results
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        """Store vectors, evicting least recently used entries if the cache grows too large."""
+        if not keys:
+            return
+
+        now = time.time()
+        rows = {}
+        for key, vector in zip(keys, vectors):
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows[key] = (key, blob, len(blob), now)
+
+        with self._lock:
+            # Size of entries being overwritten, so the running total stays exact
+            replaced = 0
+            row_keys = list(rows)
+            for i in range(0, len(row_keys), 500):
+                batch = row_keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                list(rows.values())
+            )
+            self._total_bytes += sum(row[2] for row in rows.values()) - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is at 90% of its size limit."""
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+
+            evicted = []
+            for key, size in rows:
+                evicted.append((key,))
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+            self.evictions += len(evicted)
+
+        self.logger.info(f"Evicted embeddings, cache now holds {self._total_bytes / 1e6:.1f} MB")
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current cache size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "size_bytes": self._total_bytes
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain embeddings wrapper that serves repeated texts from an EmbeddingCache.
+
+    Only cache misses are sent to the wrapped embeddings, in one call per
+    request, so it can be passed anywhere an `Embeddings` is expected,
+    including as the embedding function of a Chroma vector store.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_with_cache(self, texts: List[str], kind: str,
+                         embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        Embed texts, calling `embed_fn` only for the distinct texts missing from the cache.
+
+        Args:
+            texts: Texts to embed
+            kind: "document" or "query"; models may embed the two differently
+            embed_fn: Function embedding a list of texts, used for cache misses
+
+        Returns:
+            List[List[float]]: One embedding per text, in input order
+        """
+        keys = [self.cache.make_key(self.model_name, kind, text) for text in texts]
+        results = self.cache.get_many(keys)
+
+        missing = {}
+        for i, (key, vector) in enumerate(zip(keys, results)):
+            if vector is None:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            miss_keys = list(missing)
+            miss_texts = [texts[missing[key][0]] for key in miss_keys]
+            vectors = embed_fn(miss_texts)
+            self.cache.put_many(miss_keys, vectors)
+            for key, vector in zip(miss_keys, vectors):
+                for i in missing[key]:
+                    results[i] = list(vector)
+
+        return results
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_with_cache(texts, "document", self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_with_cache(
+            [text], "query", lambda texts: [self.embeddings.embed_query(texts[0])]
+        )[0]
+
+
+class QueryEmbeddingLRU(Embeddings):
+    """
+    LangChain embeddings wrapper keeping recent query vectors in process memory.
+
+    Queries are keyed by model and normalized text and served without a
+    round trip to SQLite or Ollama while they stay among the `max_entries`
+    most recently used, which covers Streamlit reruns and repeated chat
+    questions. Document embedding is passed through unchanged.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, max_entries: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            embeddings: Embeddings computing the vectors on a miss
+            model_name: Embedding model name, part of the cache key
+            max_entries: Number of query vectors kept before the least recently used is evicted
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = EmbeddingCache.make_key(self.model_name, "query", text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector.tolist()
+            self.misses += 1
+
+        # Embed outside the lock so concurrent sessions do not wait on each other's misses
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        vector.flags.writeable = False
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return vector.tolist()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the number of cached queries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
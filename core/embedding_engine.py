@@ -0,0 +1,193 @@
+# core/embedding_engine.py
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class EmbeddingEngine:
+    """
+    Concurrent embedding engine with adaptive batch sizes.
+
+    Keeps up to `max_concurrency` batches in flight against the embedding
+    backend. Batch size grows additively while batches finish under the
+    target latency and halves when they are slow, fail or time out. Failed
+    batches are retried with exponential backoff; there are no fixed sleeps
+    on the success path.
+    """
+
+    def __init__(self,
+                 embed_fn: Callable[[List[str]], List[List[float]]],
+                 max_concurrency: int = 4,
+                 initial_batch_size: int = 16,
+                 min_batch_size: int = 1,
+                 max_batch_size: int = 256,
+                 target_latency_s: float = 2.0,
+                 request_timeout_s: Optional[float] = 120.0,
+                 max_retries: int = 5,
+                 backoff_base_s: float = 0.5,
+                 backoff_max_s: float = 30.0):
+        """
+        Initialize the engine.
+
+        Args:
+            embed_fn: Function embedding a list of texts, e.g. `OllamaEmbeddings.embed_documents`
+            max_concurrency: Maximum number of batches in flight
+            initial_batch_size: Batch size used for the first requests
+            min_batch_size: Lower bound for adaptive batch size
+            max_batch_size: Upper bound for adaptive batch size
+            target_latency_s: Batches slower than this shrink the batch size
+            request_timeout_s: Batches running longer than this are abandoned and retried
+            max_retries: Attempts per batch before giving up
+            backoff_base_s: First retry delay, doubled on every consecutive failure
+            backoff_max_s: Upper bound for the retry delay
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self.embed_fn = embed_fn
+        self.max_concurrency = max_concurrency
+        self.min_batch_size = max(1, min_batch_size)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size)
+        self.batch_size = min(max(initial_batch_size, self.min_batch_size), self.max_batch_size)
+        self.target_latency_s = target_latency_s
+        self.request_timeout_s = request_timeout_s
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+
+        # Abandoned (timed out) calls keep their thread, so leave headroom in the pool
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="embed")
+        self._consecutive_failures = 0
+        self.stats: Dict[str, float] = {
+            "texts": 0,
+            "batches": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "embed_seconds": 0.0
+        }
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+    def _on_success(self, size: int, latency: float):
+        """Grow the batch size while batches stay under the target latency, shrink it when slow."""
+        self._consecutive_failures = 0
+        if latency > self.target_latency_s:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        elif size >= self.batch_size:
+            self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 4))
+
+    def _on_failure(self) -> float:
+        """Halve the batch size and return how long to wait before the next request."""
+        self._consecutive_failures += 1
+        self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        delay = min(self.backoff_max_s, self.backoff_base_s * (2 ** (self._consecutive_failures - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts concurrently.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List[List[float]]: One embedding per text, in input order
+
+        Raises:
+            RuntimeError: If a batch still fails after `max_retries` attempts
+        """
+        if not texts:
+            return []
+
+        start_time = time.perf_counter()
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        # Work items are (start index, end index, attempt)
+        retry_queue: List[Tuple[int, int, int]] = []
+        next_index = 0
+        in_flight: Dict[Future, Tuple[int, int, int, float]] = {}
+        resume_at = 0.0
+
+        while next_index < len(texts) or retry_queue or in_flight:
+            now = time.perf_counter()
+
+            # Fill free slots unless we are backing off after an error
+            while len(in_flight) < self.max_concurrency and now >= resume_at:
+                if retry_queue:
+                    start, end, attempt = retry_queue.pop(0)
+                elif next_index < len(texts):
+                    start, end, attempt = next_index, min(next_index + self.batch_size, len(texts)), 0
+                    next_index = end
+                else:
+                    break
+                future = self._executor.submit(self.embed_fn, texts[start:end])
+                in_flight[future] = (start, end, attempt, time.perf_counter())
+
+            if not in_flight:
+                # Only backoff is pending
+                time.sleep(max(0.0, resume_at - time.perf_counter()))
+                continue
+
+            wait_timeout = 0.05
+            if resume_at > now:
+                wait_timeout = min(wait_timeout, resume_at - now)
+            done, _ = wait(list(in_flight), timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+            now = time.perf_counter()
+            failed: List[Tuple[int, int, int]] = []
+            for future in done:
+                start, end, attempt, submitted = in_flight.pop(future)
+                latency = now - submitted
+                try:
+                    vectors = future.result()
+                    if len(vectors) != end - start:
+                        raise ValueError(f"Expected {end - start} embeddings, got {len(vectors)}")
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    self.logger.warning(f"Embedding batch of {end - start} failed: {str(e)}")
+                    failed.append((start, end, attempt + 1))
+                    continue
+
+                results[start:end] = vectors
+                self.stats["batches"] += 1
+                self.stats["texts"] += end - start
+                self._on_success(end - start, latency)
+
+            if self.request_timeout_s is not None:
+                for future, (start, end, attempt, submitted) in list(in_flight.items()):
+                    if now - submitted > self.request_timeout_s:
+                        # Cannot interrupt the call, abandon it and retry the texts
+                        in_flight.pop(future)
+                        future.cancel()
+                        self.stats["timeouts"] += 1
+                        self.logger.warning(f"Embedding batch of {end - start} timed out")
+                        failed.append((start, end, attempt + 1))
+
+            for start, end, attempt in failed:
+                if attempt > self.max_retries:
+                    for future in in_flight:
+                        future.cancel()
+                    raise RuntimeError(f"Embedding batch [{start}:{end}] failed after {self.max_retries} retries")
+                self.stats["retries"] += 1
+                resume_at = max(resume_at, now + self._on_failure())
+                # Split failed batches so one bad text or an oversized request is isolated
+                if end - start > self.batch_size:
+                    middle = start + (end - start) // 2
+                    retry_queue.extend([(start, middle, attempt), (middle, end, attempt)])
+                else:
+                    retry_queue.append((start, end, attempt))
+
+        self.stats["embed_seconds"] += time.perf_counter() - start_time
+        return results
+
+    def get_stats(self) -> Dict[str, float]:
+        """Return engine counters, including current batch size and throughput."""
+        stats = dict(self.stats)
+        stats["batch_size"] = self.batch_size
+        stats["texts_per_second"] = stats["texts"] / stats["embed_seconds"] if stats["embed_seconds"] else 0.0
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
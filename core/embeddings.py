@@ -1,89 +1,247 @@
 # core/embeddings.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
 from langchain_community.vectorstores import Chroma  # Updated import
-from langchain_community.embeddings import OllamaEmbeddings  # Updated import
 from langchain.docstore.document import Document
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import time
 import logging
 from core.chroma_validator import ChromaValidator
+from core.chunk_store import ChunkStore
+from core.embedding_batcher import MicroBatchEmbeddings
+from core.embedding_cache import EmbeddingCache, CachedEmbeddings, QueryEmbeddingLRU
+from core.embedding_engine import EmbeddingEngine
+from core.dedup import ChunkDeduplicator
+from core.vector_index import VectorIndex, QuantizedVectorIndex, perturbed_probes
+from core.lexical_index import LexicalIndex
+from core.ollama_http import OllamaHTTPClient, PooledOllamaEmbeddings
+from core.metadata_index import MetadataIndex
+from core.retrieval_cache import RetrievalCache
+from core.retrievers import CachedRetriever, ChromaBackend, HybridRetriever, VectorBackend, VectorBackendRetriever
+from core.ingestion_manifest import IngestionManifest, assign_chunk_ids
+
+COLLECTION_NAME = "medical_docs"
 
 
 class EmbeddingsManager:
-    def __init__(self, model_name: str = "nomic-embed-text"):
-        """Initialize embeddings manager with Ollama model."""
-        self.embeddings = OllamaEmbeddings(
+    def __init__(self, model_name: str = "nomic-embed-text", cache_path: Optional[str] = None,
+                 cache_max_bytes: int = 1024 * 1024 * 1024,
+                 engine_options: Optional[Dict[str, Any]] = None,
+                 query_cache_size: int = 1024,
+                 base_url: str = "http://localhost:11434",
+                 http_client: Optional[OllamaHTTPClient] = None,
+                 batching_options: Optional[Dict[str, Any]] = None,
+                 keep_alive: Optional[Union[int, str]] = None):
+        """
+        Initialize embeddings manager with Ollama model.
+
+        Args:
+            model_name: Ollama embedding model name
+            cache_path: SQLite file for the persistent embedding cache; no cache if None
+            cache_max_bytes: Size limit of the embedding cache before LRU eviction
+            engine_options: Keyword arguments for the EmbeddingEngine (concurrency, batch sizes, retries)
+            query_cache_size: Query vectors kept in the in-process LRU cache; 0 disables it
+            base_url: URL of the Ollama API endpoint
+            http_client: Shared pooled HTTP client for Ollama requests; None uses a
+                plain request per call
+            batching_options: Keyword arguments for MicroBatchEmbeddings (batch size, wait,
+                batches in flight); concurrent query embeddings are not batched if None
+            keep_alive: How long Ollama keeps the model loaded after a request, e.g. "30m";
+                None uses the server's default
+        """
+        self.model_name = model_name
+        self.cache: Optional[EmbeddingCache] = None
+        self.http_client = http_client
+        self.base_embeddings = PooledOllamaEmbeddings(
             model=model_name,
-            base_url="http://localhost:11434"
+            base_url=base_url,
+            http_client=http_client,
+            keep_alive=keep_alive
         )
+        self.embeddings = self.base_embeddings
+        # Behind the caches, so only queries that miss them wait for a batch
+        self.batcher: Optional[MicroBatchEmbeddings] = None
+        if batching_options is not None:
+            self.batcher = MicroBatchEmbeddings(
+                self.base_embeddings,
+                batch_fn=self.base_embeddings.embed_queries,
+                **batching_options
+            )
+            self.embeddings = self.batcher
+        self.cached_embeddings: Optional[CachedEmbeddings] = None
+        if cache_path:
+            self.cache = EmbeddingCache(cache_path, max_bytes=cache_max_bytes)
+            self.cached_embeddings = CachedEmbeddings(self.embeddings, self.cache, model_name)
+            self.embeddings = self.cached_embeddings
+        # In front of everything else, so the retriever's vector store and
+        # get_query_embedding share the same recent queries
+        self.query_cache: Optional[QueryEmbeddingLRU] = None
+        if query_cache_size > 0:
+            self.query_cache = QueryEmbeddingLRU(self.embeddings, model_name, max_entries=query_cache_size)
+            self.embeddings = self.query_cache
+        self.engine = EmbeddingEngine(self.base_embeddings.embed_documents, **(engine_options or {}))
         self.validator = ChromaValidator()
+        # Increases whenever the collection changes; retrieval caches key on it
+        self.index_generation = 0
         self.logger = logging.getLogger(__name__)
         logging.basicConfig(level=logging.INFO)
 
-    def get_retriever(self, vectorstore: Chroma, k: int = 4):
+    def get_retriever(self, vectorstore: Chroma, k: int = 4,
+                      backend: Optional[VectorBackend] = None, chunk_store: Optional[ChunkStore] = None,
+                      lexical_index: Optional[LexicalIndex] = None,
+                      hybrid_options: Optional[Dict[str, Any]] = None,
+                      metadata_index: Optional[MetadataIndex] = None,
+                      filters: Optional[Dict[str, Any]] = None,
+                      retrieval_cache: Optional[RetrievalCache] = None):
         """
         Get retriever from vector store.
 
         Args:
             vectorstore: Chroma vector store instance
             k: Number of documents to retrieve
+            backend: Optional search backend (see `core.retrievers`); Chroma's own
+                retriever is used when None
+            chunk_store: Chunk store the backend's results are read from, required with a
+                backend or a lexical index
+            lexical_index: Optional BM25 index; when given, lexical and vector results are
+                fused by a HybridRetriever
+            hybrid_options: HybridRetriever settings (candidates, rrf_k, fast path limits)
+            metadata_index: Optional metadata index aligned with the backend's rows; enables
+                filtering and `with_filters` on the returned retriever
+            filters: Default metadata filters of the retriever, e.g. {"doc_id": "guideline"}
+            retrieval_cache: Optional cache of retrieval results; repeated queries are
+                served from it until the index generation changes
 
         Returns:
             BaseRetriever: Configured retriever
         """
         try:
-            return vectorstore.as_retriever(
-                search_kwargs={"k": k}
-            )
+            if (backend is not None or lexical_index is not None or metadata_index is not None) \
+                    and chunk_store is None:
+                raise ValueError("A chunk store is required to retrieve from a search backend or lexical index")
+            if filters and metadata_index is None:
+                raise ValueError("Filtering needs a metadata index")
+            if metadata_index is not None and backend is None:
+                # Chroma's own retriever cannot take candidate rows
+                backend = ChromaBackend(vectorstore._collection, ids=metadata_index.chunk_ids)
+
+            hybrid_options = hybrid_options or {}
+            # The vector side of a hybrid search supplies a deeper candidate list
+            vector_k = max(k, hybrid_options.get("candidates", 30)) if lexical_index is not None else k
+            if backend is not None:
+                retriever = VectorBackendRetriever(
+                    backend=backend,
+                    embed_query=self.get_query_embedding,
+                    chunk_store=chunk_store,
+                    k=vector_k,
+                    metadata_index=metadata_index,
+                    filters=filters or None
+                )
+            else:
+                retriever = vectorstore.as_retriever(
+                    search_kwargs={"k": vector_k}
+                )
+
+            if lexical_index is not None:
+                retriever = HybridRetriever(
+                    lexical_index=lexical_index,
+                    vector_retriever=retriever,
+                    chunk_store=chunk_store,
+                    k=k,
+                    metadata_index=metadata_index,
+                    filters=filters or None,
+                    **hybrid_options
+                )
+
+            if retrieval_cache is None:
+                return retriever
+            return CachedRetriever(retriever=retriever, cache=retrieval_cache)
         except Exception as e:
             self.logger.error(f"Error creating retriever: {str(e)}")
             raise
 
-    def find_similar_vectors(self, query_vector: np.ndarray, document_vectors: np.ndarray, k: int = 5) -> np.ndarray:
+    def create_vector_index(self, embeddings_data: dict, precision: str = "float32",
+                            rescore_factor: int = 4, full_precision_path: Optional[str] = None,
+                            recall_queries: int = 200, recall_k: int = 15) -> VectorIndex:
         """
-        Find the k most similar vectors to a query vector using cosine similarity.
+        Build a search index over the output of `get_all_embeddings`.
 
         Args:
-            query_vector: The query embedding vector to compare against
-            document_vectors: Matrix of document embedding vectors to search through
-            k: Number of similar vectors to return (default: 5)
+            embeddings_data: Dictionary with "ids" and "embeddings"
+            precision: "float32" for an exact index, "float16" or "int8" for a
+                quantized index with exact rescoring
+            rescore_factor: Candidates rescored at full precision per requested result
+            full_precision_path: File the full-precision vectors of a quantized index
+                are memory-mapped from
+            recall_queries: Probe queries, perturbed copies of sampled document vectors, used
+                to measure the recall of a quantized index against exact search; 0 skips it
+            recall_k: Result count the recall is measured at
 
         Returns:
-            np.ndarray: Indices of the k most similar vectors
+            VectorIndex: Index aligned with embeddings_data["ids"]
         """
         try:
-            self.logger.info(f"Finding {k} most similar vectors")
-
-            # Ensure vectors are 2D arrays
-            if len(query_vector.shape) == 1:
-                query_vector = query_vector.reshape(1, -1)
-            if len(document_vectors.shape) == 1:
-                document_vectors = document_vectors.reshape(1, -1)
-
-            # Normalize vectors
-            query_norm = np.linalg.norm(query_vector, axis=1, keepdims=True)
-            doc_norm = np.linalg.norm(document_vectors, axis=1, keepdims=True)
-
-            # Avoid division by zero
-            query_norm = np.where(query_norm == 0, 1e-10, query_norm)
-            doc_norm = np.where(doc_norm == 0, 1e-10, doc_norm)
-
-            query_vector_normalized = query_vector / query_norm
-            document_vectors_normalized = document_vectors / doc_norm
-
-            # Calculate cosine similarities
-            similarities = np.dot(query_vector_normalized, document_vectors_normalized.T).flatten()
+            if precision == "float32":
+                index = VectorIndex(embeddings_data["embeddings"], ids=embeddings_data["ids"])
+            else:
+                index = QuantizedVectorIndex(
+                    embeddings_data["embeddings"],
+                    ids=embeddings_data["ids"],
+                    precision=precision,
+                    rescore_factor=rescore_factor,
+                    full_precision_path=full_precision_path
+                )
+                if recall_queries and len(index):
+                    # Noisy copies of stored vectors; the stored vectors themselves
+                    # would find their own row and overstate recall
+                    index.measure_recall(perturbed_probes(index.vectors, recall_queries), k=recall_k,
+                                         probes="perturbed document vectors")
+
+            self.logger.info(f"Built {precision} vector index over {len(index)} vectors "
+                             f"({index.nbytes / 2 ** 20:.1f} MiB in memory)")
+            return index
+        except Exception as e:
+            self.logger.error(f"Error building vector index: {str(e)}")
+            raise
 
-            # Get indices of top k similar vectors
-            top_k_indices = np.argsort(similarities)[-k:][::-1]
+    def search_similar(self, query_vectors: np.ndarray, index: VectorIndex,
+                       k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar vectors for a batch of queries.
 
-            return top_k_indices
+        Args:
+            query_vectors: Query embeddings, shape (n_queries, dimensions)
+            index: Vector index to search
+            k: Number of similar vectors per query
 
+        Returns:
+            Tuple of (indices, scores), each of shape (n_queries, k), best match first
+        """
+        try:
+            self.logger.info(f"Finding {k} most similar vectors for {len(np.atleast_2d(query_vectors))} queries")
+            return index.search(query_vectors, k)
         except Exception as e:
             self.logger.error(f"Error finding similar vectors: {str(e)}")
             raise
 
+    def find_similar_vectors(self, query_vector: np.ndarray,
+                             document_vectors: Union[np.ndarray, VectorIndex], k: int = 5) -> np.ndarray:
+        """
+        Find the k most similar vectors to a query vector using cosine similarity.
+
+        Args:
+            query_vector: The query embedding vector to compare against
+            document_vectors: Matrix of document embedding vectors to search through, or a
+                prebuilt VectorIndex, which avoids re-normalizing the matrix on every call
+            k: Number of similar vectors to return (default: 5)
+
+        Returns:
+            np.ndarray: Indices of the k most similar vectors
+        """
+        index = document_vectors if isinstance(document_vectors, VectorIndex) else VectorIndex(document_vectors)
+        indices, _ = self.search_similar(query_vector, index, k)
+        return indices[0]
+
     def get_query_embedding(self, query: str) -> np.ndarray:
         """
         Get embedding for a search query.
@@ -100,15 +258,17 @@ class EmbeddingsManager:
         except Exception as e:
             self.logger.error(f"Error getting query embedding: {str(e)}")
             raise
-    def get_all_embeddings(self, vectorstore: Chroma) -> dict:
+    def get_all_embeddings(self, vectorstore: Chroma, include_documents: bool = True) -> dict:
         """
         Get all embeddings and their metadata from the vector store.
 
         Args:
             vectorstore: Chroma vector store instance
+            include_documents: Also load every document text; leave False when texts
+                are read by ID from a chunk store instead
 
         Returns:
-            dict: Dictionary containing embeddings, documents, and metadata
+            dict: Dictionary containing ids, embeddings, documents (None if not included), and metadata
         """
         try:
             self.logger.info("Retrieving all embeddings from vector store")
@@ -117,16 +277,16 @@ class EmbeddingsManager:
             collection = vectorstore._collection
 
             # Get all embeddings
-            result = collection.get(
-                include=['embeddings', 'documents', 'metadatas']
-            )
+            include = ['embeddings', 'metadatas'] + (['documents'] if include_documents else [])
+            result = collection.get(include=include)
 
             if not result or 'embeddings' not in result:
                 raise ValueError("No embeddings found in vector store")
 
             return {
+                'ids': result['ids'],
                 'embeddings': result['embeddings'],
-                'documents': result['documents'],
+                'documents': result['documents'] if include_documents else None,
                 'metadata': result['metadatas']
             }
 
@@ -134,64 +294,189 @@ class EmbeddingsManager:
             self.logger.error(f"Error retrieving embeddings: {str(e)}")
             raise
 
-    def create_vectorstore(self, documents: List[Document], persist_dir: str) -> Chroma:
-        """Create a vector store from the provided documents."""
-        if not documents:
-            raise ValueError("No documents provided for creating vector store")
+    def cache_stats(self) -> Dict[str, float]:
+        """Return embedding cache hit/miss counters, or an empty dict when caching is disabled."""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def connection_stats(self) -> Dict[str, float]:
+        """Return the shared HTTP client's connection metrics, or an empty dict without one."""
+        return self.http_client.connection_stats() if self.http_client is not None else {}
 
+    def warm_up(self) -> float:
+        """
+        Load the embedding model into Ollama's memory, refreshing its keep-alive.
+
+        Returns:
+            float: Seconds the load took
+        """
+        start = time.perf_counter()
         try:
-            self.logger.info(f"Creating vectorstore for {len(documents)} documents")
+            self.base_embeddings.preload()
+        except Exception as e:
+            self.logger.error(f"Error warming up embedding model {self.model_name}: {str(e)}")
+            raise
+        return time.perf_counter() - start
 
-            # Initialize Chroma client
-            client = self.validator.init_client(persist_dir)
+    def batching_stats(self) -> Dict[str, float]:
+        """Return query micro-batching counters, or an empty dict when batching is disabled."""
+        return self.batcher.stats() if self.batcher is not None else {}
 
-            # Pre-compute embeddings in batches
-            self.logger.info("Pre-computing embeddings...")
-            texts = [doc.page_content for doc in documents]
-            metadata = [doc.metadata for doc in documents]
+    def query_cache_stats(self) -> Dict[str, float]:
+        """Return query LRU cache hit/miss counters, or an empty dict when it is disabled."""
+        return self.query_cache.stats() if self.query_cache is not None else {}
 
-            # Process in smaller batches to prevent memory issues
-            batch_size = 10
-            all_embeddings = []
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed document texts in batches, skipping texts already in the embedding cache.
 
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                self.logger.info(f"Processing batch {i // batch_size + 1}")
-                batch_embeddings = self.embeddings.embed_documents(batch_texts)
-                all_embeddings.extend(batch_embeddings)
-                time.sleep(0.5)  # Prevent overwhelming the embedding service
+        Args:
+            texts: Texts to embed
 
-            # Create or get collection
-            collection = self.validator.validate_or_create_collection(client, "medical_docs")
-
-            # Add documents in batches
-            success = self.validator.add_documents_to_collection(
-                collection=collection,
-                documents=texts,
-                embeddings=all_embeddings,
-                metadatas=metadata
-            )
+        Returns:
+            List[List[float]]: One embedding per text, in input order
+        """
+        if self.cache is None:
+            return self._embed_batches(texts)
+
+        embeddings = self.cached_embeddings.embed_with_cache(texts, "document", self._embed_batches)
+        stats = self.cache.stats()
+        self.logger.info(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
+        return embeddings
+
+    def _embed_batches(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the embedding model through the concurrent engine."""
+        embeddings = self.engine.embed(texts)
+        stats = self.engine.get_stats()
+        self.logger.info(
+            f"Embedded {len(texts)} texts, batch size now {stats['batch_size']}, "
+            f"{stats['texts_per_second']:.1f} texts/s overall"
+        )
+        return embeddings
+
+    def bump_index_generation(self) -> int:
+        """Mark the collection as changed, invalidating cached retrieval results."""
+        self.index_generation += 1
+        return self.index_generation
+
+    def open_vectorstore(self, client, persist_dir: str) -> Chroma:
+        """Wrap the medical_docs collection of an initialized client in a Chroma vector store."""
+        return Chroma(
+            client=client,
+            collection_name=COLLECTION_NAME,
+            embedding_function=self.embeddings,
+            persist_directory=persist_dir
+        )
+
+    def create_vectorstore(self, documents: List[Document], persist_dir: str,
+                           manifest: Optional[IngestionManifest] = None,
+                           deduplicator: Optional[ChunkDeduplicator] = None,
+                           lexical_index: Optional[LexicalIndex] = None,
+                           chunk_store: Optional[ChunkStore] = None) -> Chroma:
+        """
+        Create a vector store from the provided documents.
+
+        With a manifest, the collection is updated incrementally: chunks of
+        modified or deleted files are removed, only the given (new or changed)
+        documents are embedded, and the manifest is committed afterwards.
+        With a deduplicator, the duplicates it dropped are recorded on their
+        canonical chunks' metadata and its index is saved with the manifest,
+        as is the lexical index. If the collection disagrees with the manifest,
+        all of them, and the chunk store, are reset for a clean rebuild.
+        Without a manifest, the given documents are the whole corpus: stored
+        chunks not among them are deleted from the collection and chunk store.
+        """
+        if not documents and manifest is None:
+            raise ValueError("No documents provided for creating vector store")
+
+        try:
+            self.logger.info(f"Creating vectorstore for {len(documents)} documents")
 
-            if not success:
-                raise ValueError("Failed to add documents to collection")
+            # Initialize Chroma client
+            client = self.validator.init_client(persist_dir)
 
-            # Allow collection to settle
-            time.sleep(1)
+            # Create or get collection
+            collection = self.validator.validate_or_create_collection(client, COLLECTION_NAME)
+
+            changed = 0
+            if manifest is not None:
+                changed += self.validator.delete_from_collection(collection, manifest.stale_chunk_ids())
+
+            unlinked = manifest.stale_duplicate_links() if manifest is not None else None
+
+            if documents:
+                if manifest is None:
+                    assign_chunk_ids(documents)
+
+                # Chunk IDs are content-derived, so stored ones need no re-embedding
+                ids = [doc.metadata["chunk_id"] for doc in documents]
+                existing = self.validator.existing_ids(collection, ids)
+                new_docs = [doc for doc in documents if doc.metadata["chunk_id"] not in existing]
+                self.logger.info(f"{len(existing)} documents already stored, embedding {len(new_docs)}")
+
+            if documents and new_docs:
+                # Pre-compute embeddings in batches
+                self.logger.info("Pre-computing embeddings...")
+                texts = [doc.page_content for doc in new_docs]
+                metadata = [doc.metadata for doc in new_docs]
+                ids = [doc.metadata["chunk_id"] for doc in new_docs]
+
+                all_embeddings = self.embed_documents(texts)
+
+                # Upsert documents in batches
+                success = self.validator.add_documents_to_collection(
+                    collection=collection,
+                    documents=texts,
+                    embeddings=all_embeddings,
+                    metadatas=metadata,
+                    ids=ids
+                )
+
+                if not success:
+                    raise ValueError("Failed to add documents to collection")
+                changed += len(new_docs)
+
+            if manifest is None:
+                # Chunks of files deleted or rewritten since an earlier full ingest
+                written = set(doc.metadata["chunk_id"] for doc in documents)
+                obsolete = self.validator.remove_obsolete(collection, written)
+                if chunk_store is not None:
+                    chunk_store.delete(obsolete)
+                changed += len(obsolete)
+
+            if deduplicator is not None:
+                changed += deduplicator.sync_links(collection, self.validator, unlinked)
+            if changed:
+                self.bump_index_generation()
 
             # Verify the collection has the expected count
-            count = collection.count()
-            if count != len(documents):
-                raise ValueError(f"Document count mismatch. Expected: {len(documents)}, Got: {count}")
+            if manifest is not None:
+                manifest.commit()
+                expected = manifest.chunk_count()
+                count = collection.count()
+                if deduplicator is not None:
+                    deduplicator.save()
+                if lexical_index is not None:
+                    lexical_index.save()
+            else:
+                expected = len(written)
+                count = collection.count()
+            if count != expected:
+                if manifest is not None:
+                    # Collection and manifest disagree, force a clean rebuild on the next run
+                    client.delete_collection(COLLECTION_NAME)
+                    manifest.reset()
+                    if deduplicator is not None:
+                        deduplicator.reset()
+                    if lexical_index is not None:
+                        lexical_index.reset()
+                    if chunk_store is not None:
+                        chunk_store.reset()
+                raise ValueError(f"Document count mismatch. Expected: {expected}, Got: {count}")
 
             # Create vector store instance
-            vectorstore = Chroma(
-                client=client,
-                collection_name="medical_docs",
-                embedding_function=self.embeddings,
-                persist_directory=persist_dir
-            )
+            vectorstore = self.open_vectorstore(client, persist_dir)
 
-            self.logger.info(f"Successfully created vector store with {count} documents")
+            self.logger.info(f"Successfully created vector store with {collection.count()} documents")
             return vectorstore
 
         except Exception as e:
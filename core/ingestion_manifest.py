@@ -0,0 +1,303 @@
+# core/ingestion_manifest.py
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain.docstore.document import Document
+
+MANIFEST_VERSION = 1
+MANIFEST_FILENAME = "ingestion_manifest.json"
+
+
+def hash_file(path: Path, block_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """Return the SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_chunk_id(source: str, page: Any, ordinal: int, text: str) -> str:
+    """
+    Build a deterministic chunk ID from its location and content.
+
+    Args:
+        source: Source file of the chunk
+        page: Page number the chunk was taken from
+        ordinal: Position of the chunk within its page
+        text: Chunk text
+
+    Returns:
+        str: Stable ID, identical across runs for identical input
+    """
+    key = f"{source}\x00{page}\x00{ordinal}\x00{hash_text(text)}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def assign_chunk_ids(chunks: List[Document], ordinals: Optional[Dict[tuple, int]] = None) -> List[str]:
+    """
+    Set deterministic `chunk_id` and `chunk_hash` metadata on chunks.
+
+    Args:
+        chunks: Chunks in document order
+        ordinals: Running per-(source, page) chunk counters; pass the same dict
+            when assigning IDs to consecutive windows of one stream
+
+    Returns:
+        List[str]: The assigned IDs, in input order
+    """
+    ordinals = {} if ordinals is None else ordinals
+    ids = []
+    for chunk in chunks:
+        source = chunk.metadata.get('source', 'unknown')
+        page = chunk.metadata.get('page', 0)
+        ordinal = ordinals.get((source, page), 0)
+        ordinals[(source, page)] = ordinal + 1
+
+        chunk.metadata['chunk_hash'] = hash_text(chunk.page_content)
+        chunk.metadata['chunk_id'] = make_chunk_id(source, page, ordinal, chunk.page_content)
+        ids.append(chunk.metadata['chunk_id'])
+    return ids
+
+
+class IngestionManifest:
+    """
+    Record of which PDFs have been ingested into the vector store.
+
+    Each entry stores the file's content hash, its size and mtime (used as a
+    fast path so unchanged files are never re-hashed), and the IDs and hashes
+    of the chunks it produced. Changes are staged by `scan` and
+    `record_chunks` and only written by `commit`, once the vector store has
+    been updated successfully.
+    """
+
+    def __init__(self, manifest_path: Path, fingerprint: str = ""):
+        """
+        Open a manifest.
+
+        Args:
+            manifest_path: JSON file the manifest is stored in
+            fingerprint: Summary of the settings that shape chunks (e.g. the
+                chunking config); when it differs from the stored one, every
+                file is re-chunked on the next scan
+        """
+        self.manifest_path = Path(manifest_path)
+        self.fingerprint = fingerprint
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.changed_sources: List[str] = []
+        self.removed_sources: List[str] = []
+        self._ordinals: Dict[tuple, int] = {}
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+        self.load()
+
+    def load(self):
+        """Load the manifest from disk, starting empty if it is missing or unreadable."""
+        if not self.manifest_path.exists():
+            self.files = {}
+            return
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                self.logger.warning("Ingestion manifest version changed, starting a full ingest")
+                self.files = {}
+                return
+            self.files = data.get("files", {})
+            if data.get("fingerprint", self.fingerprint) != self.fingerprint and self.files:
+                self.logger.info("Chunking settings changed, re-chunking every file")
+                # Keep the chunk lists so the old chunks are removed as stale
+                for entry in self.files.values():
+                    entry["hash"] = None
+                    entry["size"] = -1
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read ingestion manifest, starting a full ingest: {str(e)}")
+            self.files = {}
+
+    def save(self):
+        """Write the manifest atomically."""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "fingerprint": self.fingerprint, "files": self.files}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def reset(self):
+        """Forget every ingested file, forcing the next scan to treat all files as new."""
+        self.files = {}
+        self.pending = {}
+        self.changed_sources = []
+        self.removed_sources = []
+        if self.manifest_path.exists():
+            self.manifest_path.unlink()
+
+    def scan(self, pdf_files: List[Path]) -> List[Path]:
+        """
+        Compare files on disk against the manifest.
+
+        Args:
+            pdf_files: All PDF files currently in the corpus
+
+        Returns:
+            List[Path]: Files that are new, whose content changed, or that must be
+                re-ingested because their duplicates' canonical chunks are stale
+        """
+        self.pending = {}
+        self.changed_sources = []
+        self._ordinals = {}
+        changed_files = []
+        current_sources = set()
+
+        for pdf_file in pdf_files:
+            source = str(pdf_file)
+            current_sources.add(source)
+            stat = pdf_file.stat()
+            entry = self.files.get(source)
+
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                continue
+
+            file_hash = hash_file(pdf_file)
+            if entry and entry["hash"] == file_hash:
+                # Touched but not modified, only refresh the stat fast path
+                entry["size"] = stat.st_size
+                entry["mtime_ns"] = stat.st_mtime_ns
+                continue
+
+            self.pending[source] = {
+                "hash": file_hash,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "chunks": {},
+                "duplicates": {}
+            }
+            if entry:
+                self.changed_sources.append(source)
+            changed_files.append(pdf_file)
+
+        self.removed_sources = [source for source in self.files if source not in current_sources]
+        changed_files.extend(self._orphaned_duplicate_files())
+
+        self.logger.info(
+            f"Manifest scan: {len(changed_files)} new or changed, "
+            f"{len(self.removed_sources)} removed, "
+            f"{len(pdf_files) - len(changed_files)} unchanged"
+        )
+        return changed_files
+
+    def _orphaned_duplicate_files(self) -> List[Path]:
+        """
+        Stage unchanged files whose dropped duplicates point at chunks about to be deleted.
+
+        Those files are re-ingested so their text gets a new canonical chunk;
+        this repeats until no stored duplicate points at a stale chunk.
+        """
+        files = []
+        stale = set(self.stale_chunk_ids())
+        while True:
+            orphaned = [
+                source for source, entry in self.files.items()
+                if source not in self.pending and source not in self.removed_sources
+                and any(canonical in stale for canonical in entry.get("duplicates", {}).values())
+            ]
+            if not orphaned:
+                return files
+            for source in orphaned:
+                entry = self.files[source]
+                self.pending[source] = {
+                    "hash": entry["hash"],
+                    "size": entry["size"],
+                    "mtime_ns": entry["mtime_ns"],
+                    "chunks": {},
+                    "duplicates": {}
+                }
+                self.changed_sources.append(source)
+                stale.update(entry["chunks"])
+                files.append(Path(source))
+            self.logger.info(f"Re-ingesting {len(orphaned)} files whose duplicate chunks lost their canonical copy")
+
+    def record_chunks(self, chunks: List[Document]):
+        """
+        Assign deterministic IDs to chunks of pending files and stage them.
+
+        Sets `chunk_id` and `chunk_hash` in each chunk's metadata. May be
+        called repeatedly with consecutive windows of chunks after one `scan`.
+        """
+        assign_chunk_ids(chunks, self._ordinals)
+        for chunk in chunks:
+            source = chunk.metadata.get('source', 'unknown')
+            if source in self.pending:
+                self.pending[source]["chunks"][chunk.metadata['chunk_id']] = chunk.metadata['chunk_hash']
+
+    def record_duplicates(self, duplicates: List[Document]):
+        """
+        Mark recorded chunks as dropped near-duplicates of their `duplicate_of` chunk.
+
+        They stay out of `chunk_count`, since they are not stored.
+        """
+        for chunk in duplicates:
+            entry = self.pending.get(chunk.metadata.get('source', 'unknown'))
+            if entry is not None:
+                entry["chunks"].pop(chunk.metadata['chunk_id'], None)
+                entry["duplicates"][chunk.metadata['chunk_id']] = chunk.metadata['duplicate_of']
+
+    def discard(self, source: str, keep_previous: bool = True):
+        """
+        Drop a staged file, e.g. one that failed to parse, so it is retried on the next scan.
+
+        Args:
+            source: Source path of the file
+            keep_previous: Keep the previously ingested version's entry; pass False
+                when its chunks have already been removed from the store
+        """
+        self.pending.pop(source, None)
+        if source in self.changed_sources:
+            self.changed_sources.remove(source)
+            if not keep_previous:
+                self.files.pop(source, None)
+
+    def stale_chunk_ids(self) -> List[str]:
+        """Return IDs of stored chunks belonging to modified or deleted files."""
+        stale = []
+        for source in self.changed_sources + self.removed_sources:
+            stale.extend(self.files.get(source, {}).get("chunks", {}).keys())
+        return stale
+
+    def stale_duplicate_links(self) -> Dict[str, set]:
+        """Return surviving canonical chunk IDs mapped to modified or deleted sources that duplicated them."""
+        stale = set(self.stale_chunk_ids())
+        links: Dict[str, set] = {}
+        for source in self.changed_sources + self.removed_sources:
+            for canonical in self.files.get(source, {}).get("duplicates", {}).values():
+                if canonical not in stale:
+                    links.setdefault(canonical, set()).add(source)
+        return links
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.pending or self.removed_sources)
+
+    def chunk_count(self) -> int:
+        """Number of chunks recorded for committed files."""
+        return sum(len(entry["chunks"]) for entry in self.files.values())
+
+    def commit(self):
+        """Apply staged changes and persist the manifest."""
+        for source in self.removed_sources:
+            self.files.pop(source, None)
+        self.files.update(self.pending)
+        self.pending = {}
+        self.changed_sources = []
+        self.removed_sources = []
+        self.save()
@@ -0,0 +1,234 @@
+# core/ingestion_pipeline.py
+import itertools
+import logging
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from langchain.docstore.document import Document
+from langchain_community.vectorstores import Chroma
+
+from core.document_loader import DocumentProcessor
+from core.embeddings import EmbeddingsManager, COLLECTION_NAME
+from core.ingestion_manifest import IngestionManifest, assign_chunk_ids
+
+
+class IngestionPipeline:
+    """
+    Streaming load -> split -> embed -> upsert pipeline.
+
+    Pages are pulled lazily from the loader, split one page at a time and
+    grouped into fixed-size windows of chunks. Each window is embedded and
+    written to Chroma before the next one is built, so peak memory depends
+    on `window_size` rather than on the size of the corpus.
+    """
+
+    def __init__(self,
+                 processor: DocumentProcessor,
+                 embeddings_manager: EmbeddingsManager,
+                 window_size: int = 256,
+                 progress_callback: Optional[Callable[[Dict[str, float]], None]] = None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            processor: Document processor used to load and split pages
+            embeddings_manager: Embeddings manager used to embed chunks and open the store
+            window_size: Number of chunks embedded and upserted together
+            progress_callback: Called after every window with the current progress counters
+        """
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+
+        self.processor = processor
+        self.embeddings_manager = embeddings_manager
+        self.validator = embeddings_manager.validator
+        self.window_size = window_size
+        self.progress_callback = progress_callback
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+    @staticmethod
+    def _windows(chunks: Iterable[Document], size: int) -> Iterator[List[Document]]:
+        """Group a chunk stream into lists of at most `size` chunks."""
+        iterator = iter(chunks)
+        while True:
+            window = list(itertools.islice(iterator, size))
+            if not window:
+                return
+            yield window
+
+    def _report(self, progress: Dict[str, float]):
+        """Log progress and forward it to the callback."""
+        elapsed = progress["elapsed"]
+        rate = progress["chunks"] / elapsed if elapsed > 0 else 0.0
+        self.logger.info(
+            f"Ingested {progress['chunks']} chunks ({progress['skipped']} already stored, "
+            f"{progress['duplicates']} near-duplicates dropped) from "
+            f"{progress['files_done']}/{progress['files_total']} files in {elapsed:.1f}s ({rate:.1f} chunks/s)"
+        )
+        if self.progress_callback is not None:
+            self.progress_callback(dict(progress))
+
+    def run(self, pdf_directory: Path, persist_dir: str,
+            manifest: Optional[IngestionManifest] = None) -> Chroma:
+        """
+        Stream the PDFs in a directory into the vector store.
+
+        Args:
+            pdf_directory: Directory containing the PDFs
+            persist_dir: Chroma persistence directory
+            manifest: Optional ingestion manifest; when given, only new or changed
+                files are processed and chunks of modified or deleted files are removed
+
+        Returns:
+            Chroma: Vector store over the updated collection
+        """
+        try:
+            start = time.perf_counter()
+            pdf_directory = pdf_directory.resolve()
+            if not pdf_directory.exists():
+                raise ValueError(f"PDF directory does not exist: {pdf_directory}")
+
+            all_files = sorted(pdf_directory.glob("*.pdf"))
+            if not all_files:
+                raise ValueError(f"No PDF files found in directory: {pdf_directory}")
+
+            pdf_files = manifest.scan(all_files) if manifest is not None else all_files
+
+            deduplicator = self.processor.deduplicator
+            lexical_index = self.processor.lexical_index
+            client = self.validator.init_client(persist_dir)
+            collection = self.validator.validate_or_create_collection(client, COLLECTION_NAME)
+            unlinked = None
+            removed = 0
+
+            if manifest is not None:
+                stale_ids = manifest.stale_chunk_ids()
+                removed = self.validator.delete_from_collection(collection, stale_ids)
+                if self.processor.chunk_store is not None:
+                    self.processor.chunk_store.delete(stale_ids)
+                if deduplicator is not None:
+                    deduplicator.remove(stale_ids)
+                if lexical_index is not None:
+                    lexical_index.remove(stale_ids)
+                unlinked = manifest.stale_duplicate_links()
+
+            progress = {
+                "files_total": len(pdf_files),
+                "files_done": 0,
+                "pages": 0,
+                "chunks": 0,
+                "skipped": 0,
+                "duplicates": 0,
+                "elapsed": 0.0
+            }
+            seen_sources = set()
+
+            def counted_pages(pages: Iterable[Document]) -> Iterator[Document]:
+                for page in pages:
+                    progress["pages"] += 1
+                    seen_sources.add(page.metadata.get('source'))
+                    yield page
+
+            pages = counted_pages(self.processor.iter_documents(pdf_directory, pdf_files))
+            chunks = self.processor.iter_chunks(pages)
+
+            inserted = 0
+            ordinals = {}
+            written = set()
+            for window in self._windows(chunks, self.window_size):
+                if manifest is not None:
+                    manifest.record_chunks(window)
+                else:
+                    assign_chunk_ids(window, ordinals)
+                progress["chunks"] += len(window)
+
+                if deduplicator is not None:
+                    window, duplicates = deduplicator.deduplicate(window)
+                    if manifest is not None:
+                        manifest.record_duplicates(duplicates)
+                    progress["duplicates"] += len(duplicates)
+
+                # Chunk IDs are content-derived, so stored ones need no re-embedding
+                existing = self.validator.existing_ids(collection, [chunk.metadata["chunk_id"] for chunk in window])
+                new_chunks = [chunk for chunk in window if chunk.metadata["chunk_id"] not in existing]
+
+                if new_chunks:
+                    texts = [chunk.page_content for chunk in new_chunks]
+                    embeddings = self.embeddings_manager.embed_documents(texts)
+                    success = self.validator.add_documents_to_collection(
+                        collection=collection,
+                        documents=texts,
+                        embeddings=embeddings,
+                        metadatas=[chunk.metadata for chunk in new_chunks],
+                        ids=[chunk.metadata["chunk_id"] for chunk in new_chunks]
+                    )
+                    if not success:
+                        raise ValueError("Failed to add documents to collection")
+                    inserted += len(new_chunks)
+
+                if self.processor.chunk_store is not None:
+                    self.processor.chunk_store.append(window)
+                written.update(chunk.metadata["chunk_id"] for chunk in window)
+                if lexical_index is not None:
+                    lexical_index.add(window)
+
+                progress["skipped"] += len(window) - len(new_chunks)
+                # The source of the last page may still be in progress
+                progress["files_done"] = max(len(seen_sources) - 1, 0)
+                progress["elapsed"] = time.perf_counter() - start
+                self._report(progress)
+
+            progress["files_done"] = len(pdf_files)
+            progress["elapsed"] = time.perf_counter() - start
+            self._report(progress)
+
+            if self.processor.load_errors:
+                self.logger.warning(f"Skipped {len(self.processor.load_errors)} PDFs that failed to parse")
+
+            if manifest is None:
+                # Without a manifest the run covers the whole corpus; drop chunks of deleted or rewritten files
+                obsolete = self.validator.remove_obsolete(collection, written)
+                if self.processor.chunk_store is not None:
+                    self.processor.chunk_store.delete(obsolete)
+                removed = len(obsolete)
+
+            relinked = 0
+            if deduplicator is not None:
+                relinked = deduplicator.sync_links(collection, self.validator, unlinked)
+            if removed or inserted or relinked:
+                self.embeddings_manager.bump_index_generation()
+
+            count = collection.count()
+            if manifest is not None:
+                # Retry files that failed to parse on the next run
+                for source in self.processor.load_errors:
+                    manifest.discard(source, keep_previous=False)
+                manifest.commit()
+                expected = manifest.chunk_count()
+                if deduplicator is not None:
+                    deduplicator.save()
+                if lexical_index is not None:
+                    lexical_index.save()
+            else:
+                expected = len(written)
+
+            if count != expected:
+                if manifest is not None:
+                    # Collection and manifest disagree, force a clean rebuild on the next run
+                    client.delete_collection(COLLECTION_NAME)
+                    manifest.reset()
+                    if deduplicator is not None:
+                        deduplicator.reset()
+                    if lexical_index is not None:
+                        lexical_index.reset()
+                    if self.processor.chunk_store is not None:
+                        self.processor.chunk_store.reset()
+                raise ValueError(f"Document count mismatch. Expected: {expected}, Got: {count}")
+
+            return self.embeddings_manager.open_vectorstore(client, persist_dir)
+
+        except Exception as e:
+            self.logger.error(f"Error in ingestion pipeline: {str(e)}")
+            raise
@@ -0,0 +1,251 @@
+# core/lexical_index.py
+import logging
+import math
+import os
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+# Words, numbers and codes such as "e11.9" or "beta-blocker"; a trailing period is not part of a term
+TERM_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been before being between both but by can could did do does
+during each for from had has have he her his how if in into is it its may more most no not of on or other
+our should so such than that the their them then there these they this those through to under up was we
+were what when where which while who will with within would you your
+""".split())
+
+# Tombstoned rows above this share of the index trigger a compaction
+COMPACT_RATIO = 0.2
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text, without stopwords."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return [term for term in TERM_PATTERN.findall(text) if term not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Compact BM25 inverted index over chunk texts.
+
+    Every term maps to a postings list of (row, term frequency) pairs held
+    in typed arrays (4 + 2 bytes per posting). Chunks are added during
+    ingestion and removed by ID when their file changes; removed rows are
+    tombstoned and the postings are compacted once tombstones pile up. The
+    index can be saved next to the vector store so incremental runs only
+    index new chunks.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        """
+        Initialize the index.
+
+        Args:
+            path: File the index is saved to and loaded from; None keeps it in memory
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_ids: List[Optional[str]] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._lengths = array('I')
+        self._total_length = 0
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._row_by_id
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by postings and document lengths, excluding dictionary overhead."""
+        postings = sum(rows.itemsize * len(rows) + tfs.itemsize * len(tfs) for rows, tfs in self._postings.values())
+        return postings + self._lengths.itemsize * len(self._lengths)
+
+    def document_frequency(self, term: str) -> int:
+        """Number of indexed chunks containing a term, tombstoned rows included until compaction."""
+        postings = self._postings.get(term)
+        return len(postings[0]) if postings is not None else 0
+
+    def _add_row(self, chunk_id: str, text: str):
+        row = len(self._doc_ids)
+        counts = Counter(tokenize(text))
+        for term, count in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array('i'), array('H'))
+            postings[0].append(row)
+            postings[1].append(min(count, 65535))
+        length = sum(counts.values())
+        self._doc_ids.append(chunk_id)
+        self._row_by_id[chunk_id] = row
+        self._lengths.append(length)
+        self._total_length += length
+
+    def add(self, chunks: List[Document]) -> int:
+        """
+        Index chunks carrying `chunk_id` metadata; already indexed IDs are skipped.
+
+        Returns:
+            int: Number of chunks added
+        """
+        added = 0
+        for chunk in chunks:
+            chunk_id = chunk.metadata["chunk_id"]
+            if chunk_id in self._row_by_id:
+                continue
+            self._add_row(chunk_id, chunk.page_content)
+            added += 1
+        return added
+
+    def remove(self, chunk_ids: List[str]):
+        """Drop chunks from the index, e.g. when they are deleted from the vector store."""
+        for chunk_id in chunk_ids:
+            row = self._row_by_id.pop(chunk_id, None)
+            if row is None:
+                continue
+            self._doc_ids[row] = None
+            self._total_length -= self._lengths[row]
+
+        if len(self._doc_ids) - len(self._row_by_id) > COMPACT_RATIO * len(self._doc_ids):
+            self._compact()
+
+    def _compact(self):
+        """Rewrite postings without tombstoned rows."""
+        live = np.array([chunk_id is not None for chunk_id in self._doc_ids], dtype=bool)
+        new_rows = np.cumsum(live) - 1
+        postings = {}
+        for term, (rows, tfs) in self._postings.items():
+            rows = np.frombuffer(rows, dtype=np.int32)
+            keep = live[rows]
+            if keep.any():
+                postings[term] = (array('i', new_rows[rows[keep]].astype(np.int32).tobytes()),
+                                  array('H', np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes()))
+        self._postings = postings
+        self._doc_ids = [chunk_id for chunk_id in self._doc_ids if chunk_id is not None]
+        self._row_by_id = {chunk_id: row for row, chunk_id in enumerate(self._doc_ids)}
+        self._lengths = array('I', np.frombuffer(self._lengths, dtype=np.uint32)[live].tobytes())
+
+    def search(self, query: str, k: int = 5, allowed: Optional[Set[str]] = None) -> Tuple[List[str], List[float]]:
+        """
+        Rank chunks by BM25 against a query.
+
+        Args:
+            query: Query text
+            k: Number of results
+            allowed: Optional chunk IDs the results are restricted to
+
+        Returns:
+            Tuple of (chunk IDs, scores), best first; chunks sharing no term with the query are left out
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self._postings]
+        if not terms or not self._row_by_id:
+            return [], []
+
+        count = len(self._row_by_id)
+        average_length = self._total_length / count if count else 0.0
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+        norms = self.k1 * (1.0 - self.b + self.b * lengths / max(average_length, 1e-9))
+        scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+        for term in terms:
+            rows, tfs = self._postings[term]
+            rows = np.frombuffer(rows, dtype=np.int32)
+            tfs = np.frombuffer(tfs, dtype=np.uint16).astype(np.float32)
+            frequency = len(rows)
+            idf = math.log(1.0 + (count - frequency + 0.5) / (frequency + 0.5))
+            scores[rows] += idf * tfs * (self.k1 + 1.0) / (tfs + norms[rows])
+
+        if len(self._row_by_id) < len(self._doc_ids):
+            scores[[row for row, chunk_id in enumerate(self._doc_ids) if chunk_id is None]] = 0.0
+        if allowed is not None:
+            mask = np.zeros(len(scores), dtype=bool)
+            mask[[self._row_by_id[chunk_id] for chunk_id in allowed if chunk_id in self._row_by_id]] = True
+            scores[~mask] = 0.0
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = matched[np.argsort(-scores[matched], kind='stable')]
+        return [self._doc_ids[row] for row in order.tolist()], scores[order].tolist()
+
+    def reset(self):
+        """Forget every chunk and delete the saved index."""
+        self._postings = {}
+        self._doc_ids = []
+        self._row_by_id = {}
+        self._lengths = array('I')
+        self._total_length = 0
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+    def load(self):
+        """Load the saved index, starting empty if it is missing or unreadable."""
+        if self.path is None or not self.path.exists():
+            return
+
+        try:
+            with np.load(self.path) as data:
+                terms = data["terms"].tobytes().decode('utf-8').split("\n") if data["terms"].size else []
+                offsets = data["offsets"]
+                rows = data["rows"]
+                tfs = data["tfs"]
+                doc_ids = [raw.decode('ascii') for raw in data["ids"]]
+                lengths = data["lengths"]
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f"Could not read lexical index, starting empty: {str(e)}")
+            return
+
+        self._postings = {
+            term: (array('i', rows[offsets[i]:offsets[i + 1]].tobytes()),
+                   array('H', tfs[offsets[i]:offsets[i + 1]].tobytes()))
+            for i, term in enumerate(terms)
+        }
+        self._doc_ids = doc_ids
+        self._row_by_id = {chunk_id: row for row, chunk_id in enumerate(doc_ids)}
+        self._lengths = array('I', lengths.astype(np.uint32).tobytes())
+        self._total_length = int(lengths.sum())
+        self.logger.info(f"Loaded lexical index with {len(doc_ids)} chunks and {len(terms)} terms")
+
+    def save(self):
+        """Compact the index and write it atomically as flat postings arrays."""
+        if self.path is None:
+            return
+
+        if len(self._row_by_id) < len(self._doc_ids):
+            self._compact()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[term][0]) for term in terms])
+        rows = np.concatenate([np.frombuffer(self._postings[term][0], dtype=np.int32) for term in terms]) \
+            if terms else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate([np.frombuffer(self._postings[term][1], dtype=np.uint16) for term in terms]) \
+            if terms else np.zeros(0, dtype=np.uint16)
+
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                terms=np.frombuffer("\n".join(terms).encode('utf-8'), dtype=np.uint8),
+                offsets=offsets,
+                rows=rows,
+                tfs=tfs,
+                ids=np.array([chunk_id.encode('ascii') for chunk_id in self._doc_ids], dtype='S32'),
+                lengths=np.frombuffer(self._lengths, dtype=np.uint32)
+            )
+        os.replace(tmp_path, self.path)
@@ -1,9 +1,12 @@
 # llm.py
-from typing import Optional
-from langchain_community.llms import Ollama
+import logging
+import time
+from typing import Dict, Optional, Union
 from langchain.callbacks.manager import CallbackManager
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 
+from core.ollama_http import OllamaHTTPClient, PooledOllama
+
 
 class LLMManager:
     """
@@ -18,7 +21,10 @@ class LLMManager:
             temperature: float = 0.3,
             max_tokens: int = 2048,
             top_p: float = 1.0,
-            base_url: str = "http://localhost:11434"
+            base_url: str = "http://localhost:11434",
+            stream_to_stdout: bool = False,
+            http_client: Optional[OllamaHTTPClient] = None,
+            keep_alive: Optional[Union[int, str]] = None
     ):
         """
         Initialize the LLM manager with Ollama-specific parameters.
@@ -29,34 +35,68 @@ class LLMManager:
             max_tokens: Maximum number of tokens to generate
             top_p: Cumulative probability for top-p sampling
             base_url: URL of the Ollama API endpoint
+            stream_to_stdout: Also echo generated tokens to the server's stdout; the chat
+                streams them through `ChainManager.stream_response` either way
+            http_client: Shared pooled HTTP client for Ollama requests; None uses a
+                plain request per call
+            keep_alive: How long Ollama keeps the model loaded after a request, e.g. "30m";
+                None uses the server's default
         """
         self.model_name = model_name
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.top_p = top_p
         self.base_url = base_url
-        self._llm: Optional[Ollama] = None
+        self.stream_to_stdout = stream_to_stdout
+        self.http_client = http_client
+        self.keep_alive = keep_alive
+        self._llm: Optional[PooledOllama] = None
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
 
     @property
-    def llm(self) -> Ollama:
+    def llm(self) -> PooledOllama:
         """
         Lazy load the Ollama model.
         Returns:
-            Ollama: Initialized Ollama model instance
+            PooledOllama: Initialized Ollama model instance
         """
         if self._llm is None:
-            callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
+            handlers = [StreamingStdOutCallbackHandler()] if self.stream_to_stdout else []
+            callback_manager = CallbackManager(handlers)
 
-            self._llm = Ollama(
+            self._llm = PooledOllama(
                 model=self.model_name,
                 temperature=self.temperature,
                 num_ctx=self.max_tokens,
                 top_p=self.top_p,
                 base_url=self.base_url,
-                callbacks=callback_manager
+                callbacks=callback_manager,
+                http_client=self.http_client,
+                keep_alive=self.keep_alive
             )
         return self._llm
 
+    def warm_up(self) -> float:
+        """
+        Load the model into Ollama's memory without generating, so the first question
+        does not pay for the load. Also refreshes the model's keep-alive.
+
+        Returns:
+            float: Seconds the load took
+        """
+        start = time.perf_counter()
+        try:
+            self.llm.preload()
+        except Exception as e:
+            self.logger.error(f"Error warming up model {self.model_name}: {str(e)}")
+            raise
+        return time.perf_counter() - start
+
+    def connection_stats(self) -> Dict[str, float]:
+        """Return the shared HTTP client's connection metrics, or an empty dict without one."""
+        return self.http_client.connection_stats() if self.http_client is not None else {}
+
     def reset_model(self):
         """
         Reset the model instance.
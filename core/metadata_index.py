@@ -0,0 +1,172 @@
+# core/metadata_index.py
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from core.chunk_store import ChunkStore
+
+# Fields matched by value and fields matched by range
+EQUALITY_FIELDS = ("source", "doc_id")
+RANGE_FIELDS = ("page", "pub_date")
+RANGE_OPERATORS = ("gte", "gt", "lte", "lt")
+
+
+def _parse_date(value: Any) -> int:
+    """Days since the epoch of an ISO date, a year ("2021") or a month ("2021-06")."""
+    return int(np.datetime64(str(value), 'D').astype(np.int64))
+
+
+class MetadataIndex:
+    """
+    Pre-filter index over chunk metadata, aligned with the rows of a vector index.
+
+    Equality fields (`source`, `doc_id`) keep one sorted posting list of rows
+    per value; range fields (`page`, `pub_date`) keep their rows sorted by
+    value, so a range is two binary searches. `select` turns a filter into
+    the sorted rows that match it, and the search backends only score those
+    rows instead of the whole corpus.
+
+    Filters map a field to a value, a list of values (any of them), or for
+    range fields a dict of "gte"/"gt"/"lte"/"lt" bounds, e.g.
+    {"doc_id": ["who_diabetes_2023"], "pub_date": {"gte": "2020-01-01"}}.
+    All fields must match. A canonical chunk also matches the `source` and
+    `doc_id` of the near-duplicates dropped in its favour, so scoping to a
+    document does not lose text it shares with another one.
+    """
+
+    def __init__(self, chunk_ids: List[str], sources: List[str], pages: np.ndarray,
+                 document_info: Callable[[str], Dict[str, str]],
+                 duplicate_sources: Optional[List[List[str]]] = None):
+        """
+        Build the index.
+
+        Args:
+            chunk_ids: Chunk IDs in vector index row order
+            sources: Source file of every chunk
+            pages: Page number of every chunk
+            document_info: Returns the `doc_id` and `pub_date` of a source
+            duplicate_sources: Optional sources of every chunk's dropped near-duplicates
+        """
+        self.chunk_ids = list(chunk_ids)
+        duplicate_sources = duplicate_sources or [[] for _ in sources]
+        rows = [row for row, extra in enumerate(duplicate_sources) for _ in range(1 + len(extra))]
+        all_sources = [source for own, extra in zip(sources, duplicate_sources) for source in [own, *extra]]
+        info = {source: document_info(source) for source in set(all_sources)}
+
+        self._postings: Dict[str, Dict[str, np.ndarray]] = {
+            "source": self._build_postings(all_sources, rows),
+            "doc_id": self._build_postings([info[source]["doc_id"] for source in all_sources], rows)
+        }
+
+        dates = np.array([_parse_date(info[source]["pub_date"]) if info[source]["pub_date"] else -1
+                          for source in sources], dtype=np.int64)
+        self._ranges: Dict[str, tuple] = {
+            "page": self._build_range(np.asarray(pages, dtype=np.int64), np.ones(len(sources), dtype=bool)),
+            "pub_date": self._build_range(dates, dates >= 0)
+        }
+
+    @classmethod
+    def from_chunk_store(cls, chunk_ids: List[str], chunk_store: ChunkStore,
+                         document_info: Callable[[str], Dict[str, str]],
+                         metadatas: Optional[List[Dict[str, Any]]] = None) -> "MetadataIndex":
+        """
+        Build the index from the location columns of the chunk store.
+
+        Args:
+            chunk_ids: Chunk IDs in vector index row order
+            chunk_store: Chunk store holding the chunks
+            document_info: Returns the `doc_id` and `pub_date` of a source
+            metadatas: Optional vector store metadata aligned with chunk_ids, read
+                for the `duplicate_sources` of canonical chunks
+        """
+        sources, pages = chunk_store.get_locations(chunk_ids)
+        duplicate_sources = None
+        if metadatas is not None:
+            duplicate_sources = [
+                sorted({link[0] for link in json.loads((metadata or {}).get("duplicate_sources") or "[]")})
+                for metadata in metadatas
+            ]
+        return cls(chunk_ids, sources, pages, document_info, duplicate_sources)
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    @staticmethod
+    def _build_postings(values: List[str], rows: List[int]) -> Dict[str, np.ndarray]:
+        """Sorted, distinct rows per value from aligned (value, row) pairs."""
+        distinct, codes = np.unique(np.array(values, dtype=object).astype(str), return_inverse=True)
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.lexsort((rows, codes))
+        bounds = np.searchsorted(codes[order], np.arange(len(distinct) + 1))
+        return {value: np.unique(rows[order[bounds[i]:bounds[i + 1]]]) for i, value in enumerate(distinct.tolist())}
+
+    @staticmethod
+    def _build_range(values: np.ndarray, known: np.ndarray) -> tuple:
+        rows = np.flatnonzero(known)
+        order = rows[np.argsort(values[rows], kind='stable')]
+        return values[order], order
+
+    def values(self, field: str) -> List[str]:
+        """Distinct values of an equality field, e.g. to offer them in the UI."""
+        return sorted(self._postings[field])
+
+    def _match_equality(self, field: str, value: Any) -> np.ndarray:
+        postings = self._postings[field]
+        wanted = value if isinstance(value, (list, tuple, set)) else [value]
+        matches = [postings[str(item)] for item in wanted if str(item) in postings]
+        return np.unique(np.concatenate(matches)) if matches else np.zeros(0, dtype=np.int64)
+
+    def _match_range(self, field: str, condition: Any) -> np.ndarray:
+        sorted_values, order = self._ranges[field]
+        parse = _parse_date if field == "pub_date" else int
+        if isinstance(condition, (list, tuple, set)):
+            return np.unique(np.concatenate([self._match_range(field, item) for item in condition] or
+                                            [np.zeros(0, dtype=np.int64)]))
+        if not isinstance(condition, dict):
+            condition = {"gte": condition, "lte": condition}
+        unknown = set(condition) - set(RANGE_OPERATORS)
+        if unknown:
+            raise ValueError(f"Unknown range operators {sorted(unknown)} for {field}, expected {RANGE_OPERATORS}")
+
+        low, high = 0, len(sorted_values)
+        if "gte" in condition:
+            low = max(low, np.searchsorted(sorted_values, parse(condition["gte"]), side='left'))
+        if "gt" in condition:
+            low = max(low, np.searchsorted(sorted_values, parse(condition["gt"]), side='right'))
+        if "lte" in condition:
+            high = min(high, np.searchsorted(sorted_values, parse(condition["lte"]), side='right'))
+        if "lt" in condition:
+            high = min(high, np.searchsorted(sorted_values, parse(condition["lt"]), side='left'))
+        return np.sort(order[low:high]) if low < high else np.zeros(0, dtype=np.int64)
+
+    def select(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Resolve a filter to the matching rows.
+
+        Args:
+            filters: Field conditions, all of which must match
+
+        Returns:
+            Optional[np.ndarray]: Sorted matching rows, or None when there is no filter
+        """
+        if not filters:
+            return None
+
+        rows = None
+        for field, condition in filters.items():
+            if field in EQUALITY_FIELDS:
+                matches = self._match_equality(field, condition)
+            elif field in RANGE_FIELDS:
+                matches = self._match_range(field, condition)
+            else:
+                raise ValueError(f"Unknown filter field {field}, expected one of {EQUALITY_FIELDS + RANGE_FIELDS}")
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+            if not len(rows):
+                break
+        return rows.astype(np.int64)
+
+    def select_ids(self, filters: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+        """Resolve a filter to the IDs of the matching chunks, or None when there is no filter."""
+        rows = self.select(filters)
+        return None if rows is None else [self.chunk_ids[row] for row in rows.tolist()]
@@ -0,0 +1,104 @@
+# core/model_warmup.py
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class ModelKeepAlive:
+    """
+    Preloads Ollama models at startup and keeps them resident.
+
+    Ollama loads a model on its first request and unloads it once it has
+    been idle for its keep-alive duration, so without this the first
+    question after startup or after an idle spell pays the model load on
+    top of generation. `warm_up` sends each model a request that only
+    loads it and logs how long that took, apart from query latency. The
+    heartbeat thread repeats those requests at a fixed interval, shorter
+    than the keep-alive, so models stay loaded between questions and are
+    reloaded in the background if Ollama dropped them anyway.
+    """
+
+    def __init__(self, warmers: Dict[str, Callable[[], None]], heartbeat_seconds: float = 240.0):
+        """
+        Initialize the keep-alive.
+
+        Args:
+            warmers: Function loading each model, by model name, e.g. `LLMManager.warm_up`
+            heartbeat_seconds: Interval between heartbeat requests; 0 disables the heartbeat
+        """
+        self.warmers = warmers
+        self.heartbeat_seconds = heartbeat_seconds
+        self.warmup_seconds: Dict[str, float] = {}
+        self.heartbeats = 0
+        self.heartbeat_errors = 0
+        self.last_heartbeat_seconds: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+    def _load(self, name: str) -> Optional[float]:
+        """Run one model's warmer; return its duration, or None if it failed."""
+        start = time.perf_counter()
+        try:
+            self.warmers[name]()
+        except Exception as e:
+            self.logger.error(f"Error loading model {name}: {str(e)}")
+            return None
+        return time.perf_counter() - start
+
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Load every model once.
+
+        A model that fails to load is logged and skipped rather than raised, so
+        startup continues and the first query reports the actual problem.
+
+        Returns:
+            Dict[str, float]: Load time in seconds of each model that loaded
+        """
+        for name in self.warmers:
+            elapsed = self._load(name)
+            if elapsed is not None:
+                with self._lock:
+                    self.warmup_seconds[name] = elapsed
+                self.logger.info(f"Warm-up of model {name} took {elapsed:.2f}s")
+        return dict(self.warmup_seconds)
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            for name in self.warmers:
+                elapsed = self._load(name)
+                with self._lock:
+                    self.heartbeats += 1
+                    if elapsed is None:
+                        self.heartbeat_errors += 1
+                    else:
+                        self.last_heartbeat_seconds[name] = elapsed
+
+    def start(self):
+        """Start the heartbeat thread, unless it is disabled or already running."""
+        if self.heartbeat_seconds <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name="model-keepalive", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the heartbeat thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def stats(self) -> Dict[str, object]:
+        """Return warm-up times, heartbeat counts and the last heartbeat time of each model."""
+        with self._lock:
+            return {
+                "warmup_seconds": dict(self.warmup_seconds),
+                "heartbeats": self.heartbeats,
+                "heartbeat_errors": self.heartbeat_errors,
+                "last_heartbeat_seconds": dict(self.last_heartbeat_seconds)
+            }
@@ -0,0 +1,434 @@
+# core/ollama_http.py
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+import requests
+from langchain_community.embeddings import OllamaEmbeddings
+from langchain_community.llms import Ollama
+from langchain_community.llms.ollama import OllamaEndpointNotFoundError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Statuses Ollama answers while loading a model or overloaded; safe to retry
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def _import_aiohttp():
+    """Import aiohttp on first async use, so the synchronous client works without it."""
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise ImportError("Async requests to Ollama need the aiohttp package") from e
+    return aiohttp
+
+
+class OllamaHTTPClient:
+    """
+    Shared HTTP session for all traffic to the Ollama server.
+
+    One `requests.Session` with a pooled, keep-alive `HTTPAdapter` serves
+    every synchronous call, so embedding batches and generations reuse warm
+    TCP connections instead of opening one per request. Connection failures
+    and the retryable statuses above are retried a bounded number of times
+    with exponential backoff; a read that already started is never retried,
+    so a generation is not run twice. Every call gets a connect timeout and
+    a read timeout for its kind (embedding or generation). Async callers get
+    an aiohttp session per event loop with the same pool size and policies.
+    """
+
+    def __init__(self, pool_size: int = 16, connect_timeout: float = 3.0,
+                 embed_timeout: float = 60.0, generate_timeout: float = 300.0,
+                 max_retries: int = 2, backoff_factor: float = 0.5, keepalive_seconds: float = 60.0):
+        """
+        Initialize the client.
+
+        Args:
+            pool_size: Connections kept open to the server, and the most used at once
+            connect_timeout: Seconds to establish a connection
+            embed_timeout: Seconds to wait for an embedding response
+            generate_timeout: Seconds to wait for the next chunk of a generation
+            max_retries: Retries of a failed connection or retryable status per call
+            backoff_factor: First retry delay in seconds, doubled on every retry
+            keepalive_seconds: Idle time after which async connections are closed
+        """
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.embed_timeout = embed_timeout
+        self.generate_timeout = generate_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.keepalive_seconds = keepalive_seconds
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False
+        )
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+
+        self._async_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = \
+            weakref.WeakKeyDictionary()
+        self._stats = {"requests": 0, "async_requests": 0, "errors": 0, "retries": 0,
+                       "async_connections_opened": 0, "seconds": 0.0}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def post(self, url: str, payload: Dict[str, Any], timeout: float, stream: bool = False,
+             headers: Optional[Dict[str, str]] = None, auth=None) -> requests.Response:
+        """
+        POST JSON through the pooled session.
+
+        Args:
+            url: Endpoint URL
+            payload: JSON body
+            timeout: Read timeout in seconds; the connect timeout is added by the client
+            stream: Return before the body is read, e.g. for streamed generations
+            headers: Extra headers
+            auth: Optional requests auth
+
+        Returns:
+            requests.Response: Response of the last attempt
+        """
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                url,
+                json=payload,
+                headers={"Content-Type": "application/json", **(headers or {})},
+                auth=auth,
+                stream=stream,
+                timeout=(self.connect_timeout, timeout)
+            )
+        except requests.exceptions.RequestException:
+            self._count(requests=1, errors=1, seconds=time.perf_counter() - start)
+            raise
+
+        history = response.raw.retries.history if getattr(response.raw, "retries", None) else ()
+        self._count(requests=1, retries=len(history), errors=int(response.status_code != 200),
+                    seconds=time.perf_counter() - start)
+        return response
+
+    def async_session(self) -> "aiohttp.ClientSession":
+        """Pooled aiohttp session of the running event loop; aiohttp sessions cannot be shared between loops."""
+        aiohttp = _import_aiohttp()
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            async def on_connection_created(session, context, params):
+                self._count(async_connections_opened=1)
+
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(on_connection_created)
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_seconds)
+            session = aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+            self._async_sessions[loop] = session
+        return session
+
+    async def apost(self, url: str, payload: Dict[str, Any], timeout: float,
+                    headers: Optional[Dict[str, str]] = None, auth=None) -> "aiohttp.ClientResponse":
+        """
+        Async POST with the same retry policy as `post`; the caller reads and releases the response.
+
+        Returns:
+            aiohttp.ClientResponse: Response of the last attempt, body unread
+        """
+        aiohttp = _import_aiohttp()
+        session = self.async_session()
+        client_timeout = aiohttp.ClientTimeout(connect=self.connect_timeout, sock_read=timeout)
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                response = await session.post(
+                    url,
+                    json=payload,
+                    headers={"Content-Type": "application/json", **(headers or {})},
+                    auth=auth,
+                    timeout=client_timeout
+                )
+            except aiohttp.ClientConnectionError:
+                self._count(requests=1, async_requests=1, errors=1, seconds=time.perf_counter() - start)
+                if attempt == self.max_retries:
+                    raise
+            else:
+                self._count(requests=1, async_requests=1, errors=int(response.status != 200),
+                            seconds=time.perf_counter() - start)
+                if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                response.release()
+            self._count(retries=1)
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    def connection_stats(self) -> Dict[str, float]:
+        """
+        Return request, error and retry counters, connections opened, and the share of
+        requests served on a kept-alive connection.
+        """
+        opened = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+        with self._lock:
+            stats = dict(self._stats)
+        stats["connections_opened"] = opened + stats["async_connections_opened"]
+        requests_made = stats["requests"]
+        stats["reuse_rate"] = max(0.0, 1.0 - stats["connections_opened"] / requests_made) if requests_made else 0.0
+        stats["mean_latency_ms"] = 1000.0 * stats["seconds"] / requests_made if requests_made else 0.0
+        return stats
+
+    async def aclose(self):
+        """Close the async session of the running event loop, e.g. before a short-lived loop ends."""
+        session = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    def close(self):
+        """Close the pooled connections of the synchronous session."""
+        self.session.close()
+
+
+_shared_clients: Dict[str, OllamaHTTPClient] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def shared_http_client(options: Optional[Dict[str, Any]] = None) -> OllamaHTTPClient:
+    """Return the process-wide client for these options (the `ollama_http` settings section)."""
+    key = json.dumps(options or {}, sort_keys=True)
+    with _shared_clients_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            client = _shared_clients[key] = OllamaHTTPClient(**(options or {}))
+        return client
+
+
+class PooledOllamaEmbeddings(OllamaEmbeddings):
+    """OllamaEmbeddings sending its requests through a shared OllamaHTTPClient."""
+
+    http_client: Any = None
+    keep_alive: Optional[Union[int, str]] = None
+    """How long Ollama keeps the model loaded after a request, e.g. "30m"; -1 keeps it loaded"""
+
+    @property
+    def _default_params(self) -> Dict[str, Any]:
+        params = super()._default_params
+        if self.keep_alive is not None:
+            params["keep_alive"] = self.keep_alive
+        return params
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> requests.Response:
+        url = f"{self.base_url}{path}"
+        if self.http_client is None:
+            return requests.post(url, json=payload,
+                                 headers={"Content-Type": "application/json", **(self.headers or {})})
+        return self.http_client.post(url, payload, timeout=self.http_client.embed_timeout, headers=self.headers)
+
+    def preload(self):
+        """Load the model into Ollama's memory without embedding anything, refreshing its keep-alive."""
+        payload = {**self._default_params, "input": []}
+        try:
+            res = self._post("/api/embed", payload)
+            if res.status_code == 404:
+                res = self._post("/api/embeddings", {**self._default_params, "prompt": ""})
+        except requests.exceptions.RequestException as e:
+            raise ValueError(f"Error raised by inference endpoint: {e}")
+        if res.status_code != 200:
+            raise ValueError(f"Error raised by inference API HTTP code: {res.status_code}, {res.text}")
+
+    def _process_emb_response(self, input: str) -> List[float]:
+        if self.http_client is None:
+            return super()._process_emb_response(input)
+        try:
+            res = self.http_client.post(
+                f"{self.base_url}/api/embeddings",
+                {"model": self.model, "prompt": input, **self._default_params},
+                timeout=self.http_client.embed_timeout,
+                headers=self.headers
+            )
+        except requests.exceptions.RequestException as e:
+            raise ValueError(f"Error raised by inference endpoint: {e}")
+
+        if res.status_code != 200:
+            raise ValueError(f"Error raised by inference API HTTP code: {res.status_code}, {res.text}")
+        try:
+            return res.json()["embedding"]
+        except requests.exceptions.JSONDecodeError as e:
+            raise ValueError(f"Error raised by inference API: {e}.\nResponse: {res.text}")
+
+    def _embed_batch(self, inputs: List[str]) -> Optional[List[List[float]]]:
+        """
+        Embed several texts with one request to the batch endpoint.
+
+        Returns:
+            Optional[List[List[float]]]: One embedding per text, or None if the
+            server has no `/api/embed` (404)
+        """
+        try:
+            res = self.http_client.post(
+                f"{self.base_url}/api/embed",
+                {**self._default_params, "input": inputs},
+                timeout=self.http_client.embed_timeout,
+                headers=self.headers
+            )
+        except requests.exceptions.RequestException as e:
+            raise ValueError(f"Error raised by inference endpoint: {e}")
+
+        if res.status_code == 404:
+            return None
+        if res.status_code != 200:
+            raise ValueError(f"Error raised by inference API HTTP code: {res.status_code}, {res.text}")
+        try:
+            return res.json()["embeddings"]
+        except requests.exceptions.JSONDecodeError as e:
+            raise ValueError(f"Error raised by inference API: {e}.\nResponse: {res.text}")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed documents with one request to the batch endpoint.
+
+        The upstream class sends one request per text, so callers batching
+        documents, like the EmbeddingEngine, would only group sequential
+        requests. The embed instruction is prepended as upstream does. Servers
+        without the endpoint (404) get one request per text.
+
+        Args:
+            texts: Document texts
+
+        Returns:
+            List[List[float]]: One embedding per text, in input order
+        """
+        if self.http_client is None or not texts:
+            return super().embed_documents(texts)
+        embeddings = self._embed_batch([f"{self.embed_instruction}{text}" for text in texts])
+        return embeddings if embeddings is not None else super().embed_documents(texts)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries with one request to the batch endpoint.
+
+        `embed_query` sends one request per text; `/api/embed` takes them all
+        at once. The query instruction is prepended as `embed_query` does, so
+        the vectors match. Servers without the endpoint (404) get one request
+        per text.
+
+        Args:
+            texts: Query texts
+
+        Returns:
+            List[List[float]]: One embedding per text, in input order
+        """
+        embeddings = None
+        if self.http_client is not None and texts:
+            embeddings = self._embed_batch([f"{self.query_instruction}{text}" for text in texts])
+        return embeddings if embeddings is not None else [self.embed_query(text) for text in texts]
+
+
+class PooledOllama(Ollama):
+    """Ollama LLM streaming its generations through a shared OllamaHTTPClient."""
+
+    http_client: Any = None
+
+    def _request_payload(self, payload: Any, stop: Optional[List[str]], **kwargs: Any) -> Dict[str, Any]:
+        """Request body of a generation, assembled as the upstream client does."""
+        if self.stop is not None and stop is not None:
+            raise ValueError("`stop` found in both the input and default params.")
+        elif self.stop is not None:
+            stop = self.stop
+
+        params = self._default_params
+        for key in self._default_params:
+            if key in kwargs:
+                params[key] = kwargs[key]
+        if "options" in kwargs:
+            params["options"] = kwargs["options"]
+        else:
+            params["options"] = {
+                **params["options"],
+                "stop": stop,
+                **{k: v for k, v in kwargs.items() if k not in self._default_params},
+            }
+
+        if payload.get("messages"):
+            return {"messages": payload.get("messages", []), **params}
+        return {"prompt": payload.get("prompt"), "images": payload.get("images", []), **params}
+
+    def preload(self):
+        """Load the model into Ollama's memory without generating, refreshing its keep-alive."""
+        url = f"{self.base_url}/api/generate"
+        payload = {"model": self.model, "prompt": "", "stream": False}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        headers = self.headers if isinstance(self.headers, dict) else None
+        if self.http_client is None:
+            response = requests.post(url, json=payload, headers=headers, auth=self.auth, timeout=self.timeout)
+        else:
+            response = self.http_client.post(url, payload, timeout=self.timeout or self.http_client.generate_timeout,
+                                             headers=headers, auth=self.auth)
+        self._check_status(response.status_code, response.text)
+
+    def _check_status(self, status: int, detail: str):
+        if status == 404:
+            raise OllamaEndpointNotFoundError(
+                "Ollama call failed with status code 404. Maybe your model is not found "
+                f"and you should pull the model with `ollama pull {self.model}`."
+            )
+        if status != 200:
+            raise ValueError(f"Ollama call failed with status code {status}. Details: {detail}")
+
+    def _create_stream(self, api_url: str, payload: Any, stop: Optional[List[str]] = None,
+                       **kwargs: Any) -> Iterator[str]:
+        if self.http_client is None:
+            return super()._create_stream(api_url, payload, stop, **kwargs)
+        response = self.http_client.post(
+            api_url,
+            self._request_payload(payload, stop, **kwargs),
+            timeout=self.timeout or self.http_client.generate_timeout,
+            stream=True,
+            headers=self.headers if isinstance(self.headers, dict) else None,
+            auth=self.auth
+        )
+        response.encoding = "utf-8"
+        if response.status_code != 200:
+            self._check_status(response.status_code, response.text)
+        return response.iter_lines(decode_unicode=True)
+
+    async def _acreate_stream(self, api_url: str, payload: Any, stop: Optional[List[str]] = None,
+                              **kwargs: Any) -> AsyncIterator[str]:
+        if self.http_client is None:
+            async for line in super()._acreate_stream(api_url, payload, stop, **kwargs):
+                yield line
+            return
+        response = await self.http_client.apost(
+            api_url,
+            self._request_payload(payload, stop, **kwargs),
+            timeout=self.timeout or self.http_client.generate_timeout,
+            headers=self.headers if isinstance(self.headers, dict) else None,
+            auth=self.auth
+        )
+        async with response:
+            if response.status != 200:
+                self._check_status(response.status, await response.text())
+            async for line in response.content:
+                yield line.decode("utf-8")
@@ -0,0 +1,21 @@
+# core/pdf_worker.py
+from typing import List, Optional, Tuple
+
+from pypdf import PdfReader
+
+
+def parse_pdf_pages(source: str, start: int, end: Optional[int]) -> Tuple[List[Tuple[int, str]], Optional[str]]:
+    """
+    Extract the text of pages [start, end) of a PDF in a worker process.
+
+    Only pypdf is imported, so spawned parsing workers start quickly.
+
+    Returns:
+        Tuple of (page number, text) pairs and an error message, which is None on success
+    """
+    try:
+        reader = PdfReader(source)
+        end = len(reader.pages) if end is None else end
+        return [(page, reader.pages[page].extract_text()) for page in range(start, end)], None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {str(e)}"
@@ -0,0 +1,143 @@
+# core/response_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from core.retrieval_cache import normalize_query
+from core.vector_index import VectorIndex
+
+
+class SemanticResponseCache:
+    """
+    In-process cache of generated answers, looked up by query meaning.
+
+    Each entry holds the normalized query embedding, the answer and the
+    version of the index it was answered against. A new query is served
+    from the cache when its embedding has a cosine similarity of at least
+    `similarity_threshold` to a cached query of the same index version, so
+    "Side effects of metformin" and "metformin side effects?" share one
+    generation. Entries expire after `ttl_seconds` and the least recently
+    used entry is evicted beyond `max_entries`.
+
+    Embeddings of different medical questions can be this close too, e.g.
+    a negated question or another dose, and would then get each other's
+    answer. With `require_same_text` a hit also needs the same normalized
+    query text (case, Unicode form and whitespace aside), which keeps only
+    trivially different repeats.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.98, max_entries: int = 256,
+                 ttl_seconds: float = 3600.0, require_same_text: bool = True):
+        """
+        Initialize the cache.
+
+        Args:
+            similarity_threshold: Minimum cosine similarity of a cached query to count as a hit
+            max_entries: Answers kept before the least recently used is evicted
+            ttl_seconds: Age after which an answer is no longer served; 0 never expires
+            require_same_text: Only serve answers to queries with the same normalized text
+        """
+        self.similarity_threshold = similarity_threshold
+        self.require_same_text = require_same_text
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # key -> (query vector, answer, index version, creation time, normalized query text)
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, str, float, Optional[str]]]" = OrderedDict()
+        self._next_key = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float):
+        if not self.ttl_seconds:
+            return
+        expired = [key for key, entry in self._entries.items() if now - entry[3] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self.expirations += len(expired)
+            self._matrix = None
+
+    def _stacked(self) -> Tuple[np.ndarray, list]:
+        """Cached queries as one matrix, rebuilt only after the entries changed."""
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys])
+        return self._matrix, self._matrix_keys
+
+    def get(self, query_vector, index_version: str, query_text: Optional[str] = None) -> Optional[str]:
+        """
+        Return the answer to the most similar cached query, if it is similar enough.
+
+        Args:
+            query_vector: Embedding of the new query
+            index_version: Version of the index the answer must have been produced against
+            query_text: Text of the new query, compared when `require_same_text` is set
+
+        Returns:
+            Optional[str]: Cached answer, or None on a miss
+        """
+        query = VectorIndex.prepare_queries(query_vector)[0]
+        text = normalize_query(query_text) if query_text is not None else None
+        with self._lock:
+            self._expire(time.time())
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            matrix, keys = self._stacked()
+            similarities = matrix @ query
+            for row in np.argsort(-similarities).tolist():
+                if similarities[row] < self.similarity_threshold:
+                    break
+                key = keys[row]
+                _, answer, version, _, cached_text = self._entries[key]
+                if self.require_same_text and (text is None or cached_text != text):
+                    continue
+                if version == index_version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return answer
+
+            self.misses += 1
+            return None
+
+    def put(self, query_vector, answer: str, index_version: str, query_text: Optional[str] = None):
+        """Store an answer for a query embedding, evicting the least recently used entry when full."""
+        query = VectorIndex.prepare_queries(query_vector)[0]
+        text = normalize_query(query_text) if query_text is not None else None
+        with self._lock:
+            self._entries[self._next_key] = (query, answer, index_version, time.time(), text)
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters, evictions, expirations and the number of cached answers."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries)
+            }
@@ -0,0 +1,118 @@
+# core/retrieval_cache.py
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Query text with Unicode forms, case and whitespace normalized, so trivial variants share a key."""
+    return WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", query).casefold()).strip()
+
+
+class RetrievalCache:
+    """
+    In-process LRU cache of retrieval results.
+
+    Entries are keyed on the normalized query, k, the metadata filters and
+    the index generation the results were retrieved at. The generation is
+    read from a callable on every lookup; when it moves on (the collection
+    was rebuilt or incrementally updated) every entry is dropped, so results
+    of an older collection are never served. A hit is a dictionary lookup
+    and costs microseconds, against an embedding call plus a vector search
+    on a miss.
+    """
+
+    def __init__(self, generation: Callable[[], int], max_entries: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            generation: Returns the current index generation
+            max_entries: Results kept before the least recently used is evicted
+        """
+        self.generation = generation
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Tuple, List[Document]]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(query: str, k: int, filters: Optional[Dict[str, Any]]) -> Tuple[str, int, str]:
+        return normalize_query(query), k, json.dumps(filters or None, sort_keys=True, default=str)
+
+    def _check_generation(self) -> int:
+        generation = self.generation()
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._generation = generation
+        return generation
+
+    def get(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None) -> Optional[List[Document]]:
+        """Return the cached results of a retrieval at the current generation, or None on a miss."""
+        key = self.make_key(query, k, filters)
+        with self._lock:
+            generation = self._check_generation()
+            documents = self._entries.get(key + (generation,))
+            if documents is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key + (generation,))
+            self.hits += 1
+        # Callers get their own list and metadata, so edits never leak into the cache
+        return [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in documents]
+
+    def put(self, query: str, k: int, filters: Optional[Dict[str, Any]], documents: List[Document],
+            generation: int):
+        """
+        Store retrieval results.
+
+        Args:
+            query: Query text
+            k: Number of results requested
+            filters: Metadata filters of the retrieval
+            documents: Retrieved documents
+            generation: Generation read before retrieving; results are dropped if it has moved on
+        """
+        key = self.make_key(query, k, filters) + (generation,)
+        stored = [Document(page_content=doc.page_content, metadata=dict(doc.metadata)) for doc in documents]
+        with self._lock:
+            if self._check_generation() != generation:
+                return
+            self._entries[key] = stored
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters, evictions, generation invalidations and the number of cached results."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries)
+            }
@@ -0,0 +1,792 @@
+# core/retrievers.py
+import atexit
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.pydantic_v1 import Field
+from langchain_core.retrievers import BaseRetriever
+
+from core.lexical_index import tokenize
+from core.shard_worker import serve_shard
+from core.vector_index import VectorIndex
+
+BACKEND_TYPES = ("chroma", "memory", "faiss", "sharded")
+FAISS_INDEX_TYPES = ("flat", "ivf", "hnsw")
+# Largest candidate set ChromaBackend sends as a `$in` filter; larger sets are post-filtered
+CHROMA_MAX_FILTER_IDS = 1000
+
+
+class VectorBackend(ABC):
+    """
+    Nearest-neighbour search over the chunk embeddings.
+
+    Backends return chunk IDs with cosine similarity scores, best first, so
+    they can be swapped behind `VectorBackendRetriever` and compared on the
+    same corpus.
+    """
+
+    name = "backend"
+
+    @abstractmethod
+    def search(self, query_vectors: np.ndarray, k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[List[List[str]], List[List[float]]]:
+        """
+        Find the k nearest chunks for every query.
+
+        Args:
+            query_vectors: Query embeddings, shape (n_queries, dimensions)
+            k: Number of results per query
+            rows: Optional candidate rows of the vector index (see MetadataIndex);
+                only these chunks are searched
+
+        Returns:
+            Tuple of (chunk IDs, scores) per query, best match first
+        """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @property
+    def nbytes(self) -> Optional[int]:
+        """Bytes of index data held in this process, None if unknown."""
+        return None
+
+
+class ChromaBackend(VectorBackend):
+    """
+    Search the persistent Chroma collection (HNSW, cosine space).
+
+    Candidate rows are passed to Chroma as a `chunk_id` metadata filter,
+    which needs the chunk IDs in vector index row order. Candidate sets
+    larger than CHROMA_MAX_FILTER_IDS would make that filter unbounded, so
+    for them an over-fetched unfiltered top-k is filtered here instead,
+    widened until every query has k candidates or the collection is exhausted.
+    """
+
+    name = "chroma"
+
+    def __init__(self, collection, ids: Optional[List[str]] = None):
+        self.collection = collection
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return self.collection.count()
+
+    def search(self, query_vectors: np.ndarray, k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[List[List[str]], List[List[float]]]:
+        query_vectors = np.atleast_2d(query_vectors)
+        where = None
+        if rows is not None:
+            if self.ids is None:
+                raise ValueError("ChromaBackend needs chunk IDs to search candidate rows")
+            if not len(rows):
+                return [[] for _ in query_vectors], [[] for _ in query_vectors]
+            k = min(k, len(rows))
+            if len(rows) > CHROMA_MAX_FILTER_IDS:
+                return self._search_post_filtered(query_vectors, k, {self.ids[row] for row in rows.tolist()})
+            where = {"chunk_id": {"$in": [self.ids[row] for row in rows.tolist()]}}
+        return self._query(query_vectors, k, where)
+
+    def _query(self, query_vectors: np.ndarray, k: int,
+               where: Optional[Dict[str, Any]] = None) -> Tuple[List[List[str]], List[List[float]]]:
+        result = self.collection.query(
+            query_embeddings=query_vectors.tolist(),
+            n_results=k,
+            where=where,
+            include=['distances']
+        )
+        # The collection uses cosine distance, 1 - cosine similarity
+        scores = [[1.0 - distance for distance in distances] for distances in result['distances']]
+        return result['ids'], scores
+
+    def _search_post_filtered(self, query_vectors: np.ndarray, k: int,
+                              allowed: set) -> Tuple[List[List[str]], List[List[float]]]:
+        """Top-k among `allowed` IDs from an unfiltered query, over-fetched in proportion to the filter."""
+        total = len(self)
+        fetch = min(total, 2 * k * max(1, -(-total // len(allowed))))
+        while True:
+            ids, scores = self._query(query_vectors, fetch)
+            kept = [[(chunk_id, score) for chunk_id, score in zip(query_ids, query_scores) if chunk_id in allowed][:k]
+                    for query_ids, query_scores in zip(ids, scores)]
+            if fetch >= total or all(len(pairs) >= k for pairs in kept):
+                break
+            fetch = min(total, fetch * 2)
+        return ([[chunk_id for chunk_id, _ in pairs] for pairs in kept],
+                [[score for _, score in pairs] for pairs in kept])
+
+
+class MemoryBackend(VectorBackend):
+    """Exact (or quantized and rescored) search over the in-process VectorIndex."""
+
+    name = "memory"
+
+    def __init__(self, index: VectorIndex):
+        if index.ids is None:
+            raise ValueError("MemoryBackend needs a VectorIndex built with IDs")
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def nbytes(self) -> Optional[int]:
+        return self.index.nbytes
+
+    def search(self, query_vectors: np.ndarray, k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[List[List[str]], List[List[float]]]:
+        indices, scores = self.index.search(query_vectors, k, rows=rows)
+        ids = self.index.ids
+        return [[ids[i] for i in row] for row in indices.tolist()], scores.tolist()
+
+
+class FaissBackend(VectorBackend):
+    """
+    FAISS index over normalized vectors, searched by inner product (cosine).
+
+    Supports exact `flat` search, `ivf` (inverted lists over k-means cells,
+    `nprobe` cells visited per query) and `hnsw` graphs. Indexes are saved
+    next to the vector store together with a fingerprint of the chunk IDs
+    they were built from, and are only reloaded while the corpus matches.
+    """
+
+    name = "faiss"
+
+    def __init__(self, index_type: str = "hnsw", nlist: int = 1024, nprobe: int = 16,
+                 hnsw_m: int = 32, ef_construction: int = 200, ef_search: int = 64):
+        """
+        Configure the backend; call `build` or `load` before searching.
+
+        Args:
+            index_type: "flat", "ivf" or "hnsw"
+            nlist: IVF cells; capped so every cell gets enough training points
+            nprobe: IVF cells searched per query
+            hnsw_m: HNSW neighbours per node
+            ef_construction: HNSW candidate list size while building
+            ef_search: HNSW candidate list size while searching
+        """
+        if index_type not in FAISS_INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type {index_type}, expected one of {FAISS_INDEX_TYPES}")
+        try:
+            import faiss
+        except ImportError as e:
+            raise ImportError("The FAISS backend needs the faiss-cpu package: pip install faiss-cpu") from e
+
+        self.faiss = faiss
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = None
+        self.ids: List[str] = []
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> Optional[int]:
+        if self.index is None:
+            return 0
+        return int(self.faiss.serialize_index(self.index).nbytes)
+
+    @staticmethod
+    def fingerprint(ids: List[str]) -> str:
+        """Hash of the ordered chunk IDs an index was built from."""
+        return hashlib.sha256("\n".join(ids).encode('utf-8')).hexdigest()
+
+    def _configure(self):
+        if self.index_type == "ivf":
+            self.index.nprobe = self.nprobe
+        elif self.index_type == "hnsw":
+            self.index.hnsw.efSearch = self.ef_search
+
+    def build(self, vectors: np.ndarray, ids: List[str]):
+        """Build the index from normalized vectors aligned with `ids`."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        dimensions = vectors.shape[1]
+        faiss = self.faiss
+        start = time.perf_counter()
+
+        if self.index_type == "flat":
+            self.index = faiss.IndexFlatIP(dimensions)
+        elif self.index_type == "ivf":
+            # FAISS wants roughly 39 training points per cell
+            nlist = max(1, min(self.nlist, len(vectors) // 39))
+            quantizer = faiss.IndexFlatIP(dimensions)
+            self.index = faiss.IndexIVFFlat(quantizer, dimensions, nlist, faiss.METRIC_INNER_PRODUCT)
+            self.index.train(vectors)
+        else:
+            self.index = faiss.IndexHNSWFlat(dimensions, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = self.ef_construction
+
+        self.index.add(vectors)
+        self.ids = list(ids)
+        self._configure()
+        self.logger.info(f"Built FAISS {self.index_type} index over {len(ids)} vectors "
+                         f"in {time.perf_counter() - start:.1f}s")
+
+    def save(self, path: str):
+        """Write the index and its ID list atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        self.faiss.write_index(self.index, str(tmp_path))
+        os.replace(tmp_path, path)
+
+        meta_path = path.with_suffix(".json")
+        with open(meta_path.with_suffix(".json.tmp"), 'w', encoding='utf-8') as f:
+            json.dump({"index_type": self.index_type, "fingerprint": self.fingerprint(self.ids), "ids": self.ids}, f)
+        os.replace(meta_path.with_suffix(".json.tmp"), meta_path)
+
+    def load(self, path: str, expected_ids: Optional[List[str]] = None) -> bool:
+        """
+        Load a saved index.
+
+        Args:
+            path: Index file written by `save`
+            expected_ids: Current chunk IDs; the index is rejected if it was built from others
+
+        Returns:
+            bool: True if the index was loaded
+        """
+        path = Path(path)
+        meta_path = path.with_suffix(".json")
+        if not path.exists() or not meta_path.exists():
+            return False
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("index_type") != self.index_type:
+                return False
+            if expected_ids is not None and meta.get("fingerprint") != self.fingerprint(expected_ids):
+                self.logger.info("Saved FAISS index is out of date with the corpus")
+                return False
+            self.index = self.faiss.read_index(str(path))
+            self.ids = meta["ids"]
+            self._configure()
+            return True
+        except (OSError, ValueError, RuntimeError) as e:
+            self.logger.warning(f"Could not load FAISS index, rebuilding: {str(e)}")
+            return False
+
+    def _search_parameters(self, rows: np.ndarray):
+        """Search parameters restricting the search to candidate rows."""
+        faiss = self.faiss
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(rows, dtype=np.int64))
+        if self.index_type == "ivf":
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        return faiss.SearchParameters(sel=selector)
+
+    def search(self, query_vectors: np.ndarray, k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[List[List[str]], List[List[float]]]:
+        queries = VectorIndex.prepare_queries(query_vectors)
+        if rows is None:
+            scores, indices = self.index.search(queries, min(k, len(self.ids)))
+        elif not len(rows):
+            return [[] for _ in queries], [[] for _ in queries]
+        else:
+            scores, indices = self.index.search(queries, min(k, len(rows)), params=self._search_parameters(rows))
+        ids, kept_scores = [], []
+        for row_indices, row_scores in zip(indices.tolist(), scores.tolist()):
+            # FAISS pads missing results with -1
+            kept = [(self.ids[i], score) for i, score in zip(row_indices, row_scores) if i >= 0]
+            ids.append([chunk_id for chunk_id, _ in kept])
+            kept_scores.append([score for _, score in kept])
+        return ids, kept_scores
+
+
+class ShardedBackend(VectorBackend):
+    """
+    Exact search over a corpus partitioned across local worker processes.
+
+    The vector matrix is split into `shards` contiguous row ranges; every
+    range is written to a .npy file and served by its own process, so the
+    corpus no longer has to fit one process's heap and the matrix products
+    of a query run in parallel without the GIL. A query is scattered to
+    every shard, and the per-shard top-k lists (already sorted) are merged
+    with a heap. Each connection has a reader thread routing replies to
+    the waiting query by request ID, so queries from concurrent sessions
+    are in flight on the shards together. A shard that errors, dies or
+    misses the deadline is left out of that query's results and restarted
+    in the background; results are partial until it is back, and a query
+    fails only when no shard answers.
+    """
+
+    name = "sharded"
+
+    def __init__(self, vectors: np.ndarray, ids: List[str], directory: str, shards: int = 4,
+                 timeout: float = 2.0, startup_timeout: float = 60.0, start_method: str = "spawn"):
+        """
+        Write the shards and start their workers.
+
+        Args:
+            vectors: Normalized document vectors, shape (n_documents, dimensions)
+            ids: Chunk IDs aligned with the rows of `vectors`
+            directory: Directory the shard files are written to
+            shards: Number of worker processes, capped at the number of documents
+            timeout: Seconds a query waits for the shards before answering without the late ones
+            startup_timeout: Seconds a worker may take to load its shard
+            start_method: multiprocessing start method; "spawn" is safe from threaded servers
+        """
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} IDs for {len(vectors)} vectors")
+
+        self.ids = list(ids)
+        self.directory = Path(directory)
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.context = multiprocessing.get_context(start_method)
+        self.stats = {"queries": 0, "partial": 0, "timeouts": 0, "errors": 0, "restarts": 0}
+        self._requests = itertools.count()
+        # Serializes sends and worker restarts; replies are gathered without it
+        self._lock = threading.Lock()
+        # (shard, request ID) -> (connection sent on, future resolved by its reader thread)
+        self._pending: Dict[Tuple[int, int], Tuple[Any, Future]] = {}
+        self._pending_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self.logger = logging.getLogger(__name__)
+        logging.basicConfig(level=logging.INFO)
+
+        count = max(1, min(shards, len(self.ids)))
+        self.bounds = np.linspace(0, len(self.ids), count + 1).astype(np.int64)
+        self._shards: List[Dict[str, Any]] = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for shard in range(count if len(self.ids) else 0):
+            path = self.directory / f"shard_{shard}.npy"
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(vectors[self.bounds[shard]:self.bounds[shard + 1]], dtype=np.float32))
+            os.replace(tmp_path, path)
+            self._shards.append({"path": str(path), "process": None, "conn": None, "up": False})
+
+        for shard in range(len(self._shards)):
+            self._start(shard)
+        for shard in range(len(self._shards)):
+            self._wait_ready(shard)
+        atexit.register(self.close)
+        self.logger.info(f"Started {len(self._shards)} index shards over {len(self.ids)} chunks")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> Optional[int]:
+        # The vectors live in the worker processes
+        return 0
+
+    @property
+    def shards_up(self) -> int:
+        return sum(shard["up"] for shard in self._shards)
+
+    def _start(self, shard: int):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=serve_shard, args=(child_conn, self._shards[shard]["path"]),
+            name=f"index-shard-{shard}", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self._shards[shard].update(process=process, conn=parent_conn, up=False)
+
+    def _wait_ready(self, shard: int) -> bool:
+        state = self._shards[shard]
+        try:
+            if state["conn"].poll(self.startup_timeout):
+                message = state["conn"].recv()
+                if message[0] == "ready":
+                    threading.Thread(target=self._read_replies, args=(shard, state["conn"]),
+                                     name=f"index-shard-{shard}-reader", daemon=True).start()
+                    state["up"] = True
+                    return True
+        except (EOFError, OSError):
+            pass
+        if not self._closed:
+            self.logger.error(f"Index shard {shard} failed to start")
+        return False
+
+    def _read_replies(self, shard: int, conn):
+        """Resolve the futures of a shard's queries as replies arrive, until its connection closes."""
+        while True:
+            try:
+                request_id, indices, scores, error = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._pending_lock:
+                pending = self._pending.pop((shard, request_id), None)
+            # Replies to queries that already timed out are dropped
+            if pending is not None:
+                pending[1].set_result((indices, scores, error))
+
+        # Queries sent on a restarted worker's new connection are not this reader's to fail
+        with self._pending_lock:
+            lost = [key for key, (sent_on, _) in self._pending.items() if sent_on is conn]
+            futures = [self._pending.pop(key)[1] for key in lost]
+        for future in futures:
+            future.set_exception(EOFError(f"Index shard {shard} closed its connection"))
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _stop(self, shard: int):
+        state = self._shards[shard]
+        state["up"] = False
+        if state["conn"] is not None:
+            state["conn"].close()
+        process = state["process"]
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(timeout=1.0)
+            if process.is_alive():
+                # A hung or stopped worker does not act on SIGTERM
+                process.kill()
+                process.join()
+
+    def _restart(self, shard: int):
+        """Replace a failed worker in the background; queries skip the shard until it is ready."""
+        with self._lock:
+            # Concurrent queries can see the same failure; only the first restarts the worker
+            if not self._shards[shard]["up"]:
+                return
+            self._shards[shard]["up"] = False
+
+        def restart():
+            with self._lock:
+                if self._closed:
+                    return
+                self._stop(shard)
+                self._start(shard)
+                self._count("restarts")
+            if self._wait_ready(shard):
+                self.logger.info(f"Index shard {shard} restarted")
+
+        threading.Thread(target=restart, name=f"restart-index-shard-{shard}", daemon=True).start()
+
+    def search(self, query_vectors: np.ndarray, k: int,
+               rows: Optional[np.ndarray] = None) -> Tuple[List[List[str]], List[List[float]]]:
+        queries = VectorIndex.prepare_queries(query_vectors)
+        if not self._shards:
+            return [[] for _ in queries], [[] for _ in queries]
+
+        self._count("queries")
+        request_id = next(self._requests)
+
+        # Scatter: candidate rows are split by shard and made shard-local
+        targeted, sent, failed = 0, {}, []
+        with self._lock:
+            for shard, state in enumerate(self._shards):
+                start, end = self.bounds[shard], self.bounds[shard + 1]
+                local_rows = None
+                if rows is not None:
+                    local_rows = rows[np.searchsorted(rows, start):np.searchsorted(rows, end)] - start
+                    if not len(local_rows):
+                        continue
+                targeted += 1
+                if not state["up"]:
+                    continue
+                future = Future()
+                with self._pending_lock:
+                    self._pending[(shard, request_id)] = (state["conn"], future)
+                try:
+                    state["conn"].send(("search", request_id, queries, k, local_rows))
+                    sent[shard] = future
+                except (OSError, ValueError):
+                    with self._pending_lock:
+                        self._pending.pop((shard, request_id), None)
+                    self._count("errors")
+                    failed.append(shard)
+
+        # Gather until the deadline, while other queries are sent and answered
+        wait(list(sent.values()), timeout=self.timeout)
+        results = []
+        for shard, future in sent.items():
+            if not future.done():
+                with self._pending_lock:
+                    self._pending.pop((shard, request_id), None)
+                self._count("timeouts")
+                failed.append(shard)
+                continue
+            try:
+                indices, scores, error = future.result()
+            except EOFError:
+                self._count("errors")
+                failed.append(shard)
+                continue
+            if error is not None:
+                self.logger.warning(f"Index shard {shard} failed a query: {error}")
+                self._count("errors")
+            else:
+                results.append((self.bounds[shard] + indices, scores))
+
+        for shard in failed:
+            self._restart(shard)
+
+        if targeted and not results:
+            raise RuntimeError(f"No index shard answered ({targeted} queried, {len(failed)} failed or timed out)")
+        if len(results) < targeted:
+            self._count("partial")
+            self.logger.warning(f"Answered from {len(results)} of {targeted} index shards")
+
+        # Gather: every shard list is sorted best first, so a heap merge yields the global top k
+        ids, merged_scores = [], []
+        for query in range(len(queries)):
+            streams = [zip(scores[query].tolist(), indices[query].tolist()) for indices, scores in results]
+            best = list(itertools.islice(heapq.merge(*streams, key=lambda pair: -pair[0]), k))
+            ids.append([self.ids[row] for _, row in best])
+            merged_scores.append([score for score, _ in best])
+        return ids, merged_scores
+
+    def close(self):
+        """Stop every worker."""
+        with self._lock:
+            self._closed = True
+        for shard, state in enumerate(self._shards):
+            if state["up"] and state["conn"] is not None:
+                try:
+                    state["conn"].send(None)
+                except (OSError, ValueError):
+                    pass
+            self._stop(shard)
+
+
+class VectorBackendRetriever(BaseRetriever):
+    """
+    LangChain retriever embedding the query and searching a VectorBackend.
+
+    Chunk texts and locations are read by ID from the chunk store; each
+    returned Document carries `chunk_id`, `source`, `page` and `score` metadata.
+    With a metadata index, `filters` restrict the search to matching chunks.
+    """
+
+    backend: Any
+    embed_query: Callable[[str], np.ndarray]
+    chunk_store: Any
+    k: int = 4
+    metadata_index: Any = None
+    filters: Optional[Dict[str, Any]] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def with_filters(self, filters: Optional[Dict[str, Any]]) -> "VectorBackendRetriever":
+        """Return a copy of this retriever scoped by metadata filters."""
+        if filters and self.metadata_index is None:
+            raise ValueError("Filtering needs a retriever built with a metadata index")
+        return self.copy(update={"filters": filters or None})
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        rows = self.metadata_index.select(self.filters) if self.filters else None
+        if rows is not None and not len(rows):
+            return []
+        query_vectors = np.atleast_2d(np.asarray(self.embed_query(query), dtype=np.float32))
+        ids, scores = self.backend.search(query_vectors, self.k, rows=rows)
+        return documents_from_store(self.chunk_store, ids[0], scores[0])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing BM25 and vector search with reciprocal rank fusion.
+
+    Both searches return `candidates` chunks and every chunk scores
+    sum(1 / (rrf_k + rank)) over the lists it appears in, so exact term
+    matches the embedding misses can still rank first. Short queries made
+    only of rare indexed terms (a drug name, a guideline code) take a
+    lexical-only fast path that never calls the embedding model.
+    """
+
+    lexical_index: Any
+    vector_retriever: BaseRetriever
+    chunk_store: Any
+    k: int = 4
+    metadata_index: Any = None
+    filters: Optional[Dict[str, Any]] = None
+    candidates: int = 30
+    rrf_k: int = 60
+    fast_path_max_terms: int = 3
+    fast_path_max_df: float = 0.01
+    stats: Dict[str, int] = {}
+    # Sessions share the retriever and its filtered copies, which share `stats`
+    stats_lock: Any = Field(default_factory=threading.Lock)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def with_filters(self, filters: Optional[Dict[str, Any]]) -> "HybridRetriever":
+        """Return a copy of this retriever with both searches scoped by metadata filters."""
+        if filters and self.metadata_index is None:
+            raise ValueError("Filtering needs a retriever built with a metadata index")
+        return self.copy(update={
+            "filters": filters or None,
+            "vector_retriever": self.vector_retriever.with_filters(filters)
+        })
+
+    def is_exact_lookup(self, query: str) -> bool:
+        """True if every query term is indexed and rare enough to identify its chunks on its own."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or len(terms) > self.fast_path_max_terms:
+            return False
+        limit = max(1, self.fast_path_max_df * len(self.lexical_index))
+        return all(0 < self.lexical_index.document_frequency(term) <= limit for term in terms)
+
+    def _count(self, path: str):
+        with self.stats_lock:
+            self.stats[path] = self.stats.get(path, 0) + 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return how many queries took the lexical-only and the hybrid path."""
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        allowed = None
+        if self.filters:
+            allowed = set(self.metadata_index.select_ids(self.filters))
+            if not allowed:
+                return []
+
+        if self.is_exact_lookup(query):
+            self._count("lexical_only")
+            ids, scores = self.lexical_index.search(query, self.k, allowed=allowed)
+            return documents_from_store(self.chunk_store, ids, scores)
+
+        self._count("hybrid")
+        lexical_ids, _ = self.lexical_index.search(query, self.candidates, allowed=allowed)
+        vector_documents = self.vector_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+
+        fused: Dict[str, float] = {}
+        for ranking in (lexical_ids, [document.metadata.get("chunk_id") for document in vector_documents]):
+            for rank, chunk_id in enumerate(ranking):
+                if chunk_id is not None:
+                    fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        best = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return documents_from_store(self.chunk_store, best, [fused[chunk_id] for chunk_id in best])
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever serving repeated queries from a RetrievalCache.
+
+    Wraps any retriever; results are cached under the wrapped retriever's
+    k and filters, so scoped and unscoped retrievals never share entries.
+    """
+
+    retriever: BaseRetriever
+    cache: Any
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @property
+    def k(self) -> Optional[int]:
+        k = getattr(self.retriever, "k", None)
+        if k is None:
+            k = getattr(self.retriever, "search_kwargs", {}).get("k")
+        return k
+
+    def with_filters(self, filters: Optional[Dict[str, Any]]) -> "CachedRetriever":
+        """Return a copy of this retriever with the wrapped retriever scoped by metadata filters."""
+        if not hasattr(self.retriever, "with_filters"):
+            raise ValueError("The retriever does not support metadata filters")
+        return self.copy(update={"retriever": self.retriever.with_filters(filters)})
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        filters = getattr(self.retriever, "filters", None)
+        documents = self.cache.get(query, self.k, filters)
+        if documents is not None:
+            return documents
+
+        # Read before retrieving, so results racing an ingest are not stored under the new generation
+        generation = self.cache.generation()
+        documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        self.cache.put(query, self.k, filters, documents, generation)
+        return documents
+
+
+def documents_from_store(chunk_store, ids: List[str], scores: List[float]) -> List[Document]:
+    """Build Documents for chunk IDs from the chunk store, skipping IDs it does not hold."""
+    documents = []
+    for chunk_id, chunk, score in zip(ids, chunk_store.get_many(ids), scores):
+        if chunk is None:
+            continue
+        documents.append(Document(
+            page_content=chunk["text"],
+            metadata={"chunk_id": chunk_id, "source": chunk["source"], "page": chunk["page"], "score": score}
+        ))
+    return documents
+
+
+def create_vector_backend(backend_settings: Dict[str, Any], vectorstore, vector_index: VectorIndex,
+                          persist_dir: str) -> VectorBackend:
+    """
+    Build the retrieval backend selected in settings.
+
+    Args:
+        backend_settings: The `retrieval_backend` settings section
+        vectorstore: Chroma vector store of the corpus
+        vector_index: In-process index aligned with the corpus chunk IDs
+        persist_dir: Vector store directory, where FAISS indexes and index shards are saved
+
+    Returns:
+        VectorBackend: Ready-to-search backend
+    """
+    backend_type = backend_settings.get("type", "chroma")
+    if backend_type == "chroma":
+        return ChromaBackend(vectorstore._collection, ids=vector_index.ids)
+    if backend_type == "memory":
+        return MemoryBackend(vector_index)
+    if backend_type == "faiss":
+        options = backend_settings.get("faiss", {})
+        # Raises ImportError without faiss-cpu rather than quietly searching another backend
+        backend = FaissBackend(
+            index_type=options.get("index_type", "hnsw"),
+            nlist=options.get("nlist", 1024),
+            nprobe=options.get("nprobe", 16),
+            hnsw_m=options.get("hnsw_m", 32),
+            ef_construction=options.get("ef_construction", 200),
+            ef_search=options.get("ef_search", 64)
+        )
+        path = Path(persist_dir) / f"faiss_{backend.index_type}.index"
+        if not backend.load(str(path), expected_ids=vector_index.ids):
+            backend.build(vector_index.get_vectors(), vector_index.ids)
+            backend.save(str(path))
+        return backend
+    if backend_type == "sharded":
+        options = backend_settings.get("sharded", {})
+        return ShardedBackend(
+            vector_index.get_vectors(),
+            vector_index.ids,
+            directory=str(Path(persist_dir) / "shards"),
+            shards=options.get("shards", 4),
+            timeout=options.get("timeout_seconds", 2.0),
+            startup_timeout=options.get("startup_timeout_seconds", 60.0),
+            start_method=options.get("start_method", "spawn")
+        )
+    raise ValueError(f"Unknown retrieval backend {backend_type}, expected one of {BACKEND_TYPES}")
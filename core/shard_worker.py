@@ -0,0 +1,38 @@
+# core/shard_worker.py
+import numpy as np
+
+from core.vector_index import VectorIndex
+
+
+def serve_shard(conn, path: str, query_block_size: int = 64):
+    """
+    Worker process loop holding one shard of the vector index.
+
+    Loads the shard's vectors from a .npy file, reports ("ready", rows) and
+    then answers ("search", request_id, queries, k, rows) messages with
+    (request_id, local row indices, scores, error) until it receives None.
+    Only numpy and the vector index are imported, so spawned workers start
+    quickly.
+
+    Args:
+        conn: Pipe connection to the parent process
+        path: .npy file with the shard's normalized vectors
+        query_block_size: Queries scored together per matrix product
+    """
+    index = VectorIndex(np.load(path), query_block_size=query_block_size)
+    conn.send(("ready", len(index)))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+
+        _, request_id, queries, k, rows = message
+        try:
+            indices, scores = index.search(queries, k, rows=rows)
+            conn.send((request_id, indices, scores, None))
+        except Exception as e:
+            conn.send((request_id, None, None, str(e)))
+    conn.close()
@@ -4,10 +4,9 @@ import plotly.graph_objects as go
 import numpy as np
 from sklearn.decomposition import PCA
 
-from core.embeddings import EmbeddingsManager
 from src.constants import SETTINGS_PATH, CONFIG_PATH
 from src.utils import load_yaml_config, load_json_config, setup_environment
-from src.session_manager import initialize_components, get_embeddings_data
+from src.session_manager import initialize_components, get_embeddings_data, get_chunk_store, get_vector_index
 
 
 def create_vector_plot(embeddings_3d, hover_texts, colors, sizes, search_3d=None):
@@ -82,6 +81,16 @@ def create_vector_plot(embeddings_3d, hover_texts, colors, sizes, search_3d=None
     return fig
 
 
+def document_text(data: dict, index: int) -> str:
+    """Read a document's text by ID from the chunk store, falling back to in-memory documents."""
+    if data.get("documents") is not None:
+        return data["documents"][index]
+    chunk_store = get_chunk_store()
+    if chunk_store is None:
+        return ""
+    return chunk_store.get_text(data["ids"][index], default="")
+
+
 def main():
     st.set_page_config(layout="wide")
 
@@ -91,18 +100,12 @@ def main():
         config = load_json_config(CONFIG_PATH)
         setup_environment(config["api_keys"]["huggingface"])
 
-        # Check if embeddings already exist in session state
-        if "embeddings_data" not in st.session_state or st.session_state.embeddings_data is None:
-            # Only initialize components if we don't have embeddings data
-            _, embeddings_manager, _, _, _ = initialize_components(settings, config)
-        else:
-            # Just initialize embeddings_manager for search functionality
-            embeddings_manager = EmbeddingsManager(
-                model_name=settings["model"]["embeddings"]["name"]
-            )
+        # Attach to the shared index; a no-op once this session is initialized
+        _, embeddings_manager, _, _, _ = initialize_components(settings, config)
 
         # Get embeddings data from session state
         data = get_embeddings_data()
+        vector_index = get_vector_index()
         if data is None:
             st.error("No embeddings data found. Please return to the main page and try again.")
             return
@@ -110,6 +113,20 @@ def main():
         # Create sidebar
         st.sidebar.title("Search Controls")
         search_query = st.sidebar.text_input("Search in documents")
+        recall_report = getattr(vector_index, "recall_report", None)
+        if recall_report:
+            st.sidebar.caption(
+                f"{recall_report['precision']} index, {recall_report['compression']:.1f}x smaller than float32, "
+                f"recall@{recall_report['k']} {recall_report['recall']:.1%} "
+                f"on {recall_report['queries']} {recall_report.get('probes', 'queries')}"
+            )
+
+        # Embed and search once per rerun; the plot and the result list share the
+        # result, and reruns with the same query hit the query embedding cache
+        query_vector, similar_indices, scores = None, None, None
+        if search_query and vector_index is not None and len(vector_index):
+            query_vector = embeddings_manager.get_query_embedding(search_query)
+            similar_indices, scores = embeddings_manager.search_similar(query_vector, vector_index, k=5)
 
         # Main content
         st.title("Document Vector Space")
@@ -117,9 +134,9 @@ def main():
         col1, col2 = st.columns([7, 3])
 
         with col1:
-            if data["embeddings"] is not None:
-                # Convert embeddings to numpy array if needed
-                embeddings = np.array(data["embeddings"])
+            if vector_index is not None and len(vector_index):
+                # Normalized float32 vectors, read from the shared index
+                embeddings = vector_index.get_vectors()
 
                 # Perform PCA
                 pca = PCA(n_components=3)
@@ -127,8 +144,8 @@ def main():
 
                 # Create hover texts
                 hover_texts = [
-                    f"Document {i}\nSource: {m.get('source', 'unknown')}\nContent: {doc[:200]}..."
-                    for i, (m, doc) in enumerate(zip(data["metadata"], data["documents"]))
+                    f"Document {i}\nSource: {m.get('source', 'unknown')}\nContent: {document_text(data, i)[:200]}..."
+                    for i, m in enumerate(data["metadata"])
                 ]
 
                 # Initialize colors and sizes
@@ -136,37 +153,26 @@ def main():
                 sizes = [6] * len(embeddings_3d)
 
                 search_3d = None
-                if search_query:
-                    # Get query embedding and similar vectors
-                    query_vector = embeddings_manager.get_query_embedding(search_query)
-                    similar_indices = embeddings_manager.find_similar_vectors(
-                        query_vector, embeddings, k=5
-                    )
-
+                if query_vector is not None:
                     # Highlight similar vectors
-                    for idx in similar_indices:
+                    for idx in similar_indices[0]:
                         colors[idx] = 'rgba(255,50,50,0.8)'
                         sizes[idx] = 10
 
                     # Transform query vector
-                    search_3d = pca.transform(query_vector)
+                    search_3d = pca.transform(vector_index.prepare_queries(query_vector))
 
                 # Create and display plot
                 fig = create_vector_plot(embeddings_3d, hover_texts, colors, sizes, search_3d)
                 st.plotly_chart(fig, use_container_width=True)
 
         with col2:
-            if search_query:
+            if query_vector is not None:
                 # Display similar documents
-                query_vector = embeddings_manager.get_query_embedding(search_query)
-                similar_indices = embeddings_manager.find_similar_vectors(
-                    query_vector, embeddings, k=5
-                )
-
                 st.subheader("Similar Documents")
-                for idx in similar_indices:
-                    with st.expander(f"Document {idx}"):
-                        st.write(data["documents"][idx][:200] + "...")
+                for idx, score in zip(similar_indices[0], scores[0]):
+                    with st.expander(f"Document {idx} (similarity {score:.3f})"):
+                        st.write(document_text(data, idx)[:200] + "...")
             else:
                 st.info("Enter a search term to find similar documents")
 
@@ -1,25 +1,119 @@
 # src/session_manager.py
 import streamlit as st
-from typing import Optional, Tuple, Any
+from typing import Optional, Tuple, Any, Callable, Dict, List
 from pathlib import Path
 import tempfile
+import threading
+import hashlib
+import json
 import os
 import time
 
+from core.chunkers import create_text_splitter
 from core.document_loader import DocumentProcessor
 from core.embeddings import EmbeddingsManager
 from core.llm import LLMManager
 from core.chain import ChainManager
+from core.context_builder import ContextBuilder
+from core.chunk_store import ChunkStore
+from core.dedup import ChunkDeduplicator
+from core.ingestion_manifest import IngestionManifest, MANIFEST_FILENAME
+from core.ingestion_pipeline import IngestionPipeline
+from core.lexical_index import LexicalIndex
+from core.metadata_index import MetadataIndex
+from core.model_warmup import ModelKeepAlive
+from core.ollama_http import shared_http_client
+from core.response_cache import SemanticResponseCache
+from core.retrieval_cache import RetrievalCache
+from core.retrievers import create_vector_backend
+from core.vector_index import VectorIndex
 from langchain.vectorstores import Chroma
+from langchain.docstore.document import Document
 
 
-def get_persist_directory():
-    """Get or create a persistent directory for vector store."""
-    if 'persist_dir' not in st.session_state:
-        # Create a persistent directory in /tmp
-        persist_dir = tempfile.mkdtemp(prefix='vectorstore_')
-        st.session_state.persist_dir = persist_dir
-    return st.session_state.persist_dir
+CHUNK_STORE_DIRNAME = "chunks"
+DEDUP_INDEX_FILENAME = "dedup_index.npz"
+LEXICAL_INDEX_FILENAME = "lexical_index.npz"
+FULL_PRECISION_FILENAME = "vectors_float32.npy"
+
+# Process-wide registry of loaded indexes, shared by every browser session
+_shared_indexes: Dict[str, Dict[str, Any]] = {}
+_shared_indexes_lock = threading.RLock()
+# One lock per index key, held for that index's build only
+_shared_index_build_locks: Dict[str, threading.Lock] = {}
+
+# Process-wide model warm-up and heartbeat, one per set of Ollama models
+_model_keepalives: Dict[str, ModelKeepAlive] = {}
+_model_keepalives_lock = threading.Lock()
+
+
+def get_persist_directory(settings: dict) -> str:
+    """Get the configured vector store directory, shared by all sessions of the process."""
+    configured = settings.get("paths", {}).get("persist_directory")
+    if configured:
+        persist_dir = Path(configured).resolve()
+        persist_dir.mkdir(parents=True, exist_ok=True)
+        return str(persist_dir)
+
+    # No configured path: fall back to one temporary directory per process
+    with _shared_indexes_lock:
+        if "_tmp_persist_dir" not in _shared_indexes:
+            _shared_indexes["_tmp_persist_dir"] = {"path": tempfile.mkdtemp(prefix='vectorstore_')}
+        return _shared_indexes["_tmp_persist_dir"]["path"]
+
+
+def create_embeddings_manager(settings: dict) -> EmbeddingsManager:
+    """Create an embeddings manager, backed by the persistent embedding cache when configured."""
+    cache_settings = settings.get("embedding_cache", {})
+    batching_settings = dict(settings.get("embedding_batching", {}))
+    batching_enabled = batching_settings.pop("enabled", True)
+    return EmbeddingsManager(
+        model_name=settings["model"]["embeddings"]["name"],
+        cache_path=cache_settings.get("path") if cache_settings.get("enabled", True) else None,
+        cache_max_bytes=int(cache_settings.get("max_size_mb", 1024)) * 1024 * 1024,
+        engine_options=settings.get("embedding_engine"),
+        query_cache_size=cache_settings.get("query_lru_size", 1024),
+        base_url=settings["model"]["embeddings"].get("base_url", "http://localhost:11434"),
+        http_client=shared_http_client(settings.get("ollama_http")),
+        batching_options=batching_settings if batching_enabled else None,
+        keep_alive=settings.get("model_warmup", {}).get("keep_alive")
+    )
+
+
+def get_model_keepalive(settings: dict, embeddings_manager: EmbeddingsManager,
+                        llm_manager: LLMManager) -> Optional[ModelKeepAlive]:
+    """
+    Warm up the LLM and embedding model and start their heartbeat, once per process.
+
+    The first session pays the model load, logged as warm-up time; later sessions
+    reuse the keep-alive and its heartbeat, and do not wait for a warm-up in progress.
+
+    Returns:
+        Optional[ModelKeepAlive]: The shared keep-alive, or None when warm-up is disabled
+    """
+    warmup_settings = settings.get("model_warmup", {})
+    if not warmup_settings.get("enabled", True):
+        return None
+
+    key = json.dumps({"model": settings["model"], "model_warmup": warmup_settings}, sort_keys=True)
+    with _model_keepalives_lock:
+        keepalive = _model_keepalives.get(key)
+        created = keepalive is None
+        if created:
+            keepalive = ModelKeepAlive(
+                {
+                    llm_manager.model_name: llm_manager.warm_up,
+                    embeddings_manager.model_name: embeddings_manager.warm_up
+                },
+                heartbeat_seconds=warmup_settings.get("heartbeat_seconds", 240.0)
+            )
+            _model_keepalives[key] = keepalive
+
+    # Loading the models can take minutes; sessions of other models must not wait on the lock meanwhile
+    if created:
+        keepalive.warm_up()
+        keepalive.start()
+    return keepalive
 
 
 def init_session_state():
@@ -38,6 +132,254 @@ def init_session_state():
         st.session_state.vectorstore = None
     if "embeddings_data" not in st.session_state:
         st.session_state.embeddings_data = None
+    if "chunk_store" not in st.session_state:
+        st.session_state.chunk_store = None
+    if "vector_index" not in st.session_state:
+        st.session_state.vector_index = None
+    if "metadata_index" not in st.session_state:
+        st.session_state.metadata_index = None
+
+
+def _index_key(settings: dict) -> str:
+    """Key identifying an index by everything that changes its contents."""
+    return json.dumps({
+        "paths": settings.get("paths"),
+        "embeddings": settings["model"]["embeddings"],
+        "chunking": settings.get("chunking"),
+        "deduplication": settings.get("deduplication"),
+        "vector_index": settings.get("vector_index"),
+        "retrieval_backend": settings.get("retrieval_backend"),
+        "hybrid_search": settings.get("hybrid_search")
+    }, sort_keys=True)
+
+
+def _index_version(chunk_ids: List[str]) -> str:
+    """Content version of an index: a hash of the chunk IDs it holds."""
+    return hashlib.sha256("\n".join(sorted(chunk_ids)).encode('utf-8')).hexdigest()[:16]
+
+
+def build_shared_index(settings: dict,
+                       progress_callback: Optional[Callable[[dict], None]] = None) -> Dict[str, Any]:
+    """
+    Ingest the corpus into the persistent vector store and load it.
+
+    With incremental ingestion enabled, an unchanged corpus only costs a
+    manifest scan, so loading an existing index takes seconds.
+    """
+    # Get persistent directory
+    persist_dir = get_persist_directory(settings)
+
+    # Chunk texts live on disk next to the index and are read back by ID
+    chunk_store = ChunkStore(str(Path(persist_dir) / CHUNK_STORE_DIRNAME))
+
+    # Track ingested files so only new or changed PDFs are re-processed
+    incremental = settings.get("ingestion", {}).get("incremental", True)
+    manifest = None
+    if incremental:
+        manifest = IngestionManifest(
+            Path(persist_dir) / MANIFEST_FILENAME,
+            fingerprint=json.dumps({
+                "chunking": settings["chunking"],
+                "deduplication": settings.get("deduplication")
+            }, sort_keys=True)
+        )
+
+    # Drop near-duplicate chunks before they are embedded
+    deduplicator = None
+    dedup_settings = settings.get("deduplication", {})
+    if dedup_settings.get("enabled", False):
+        deduplicator = ChunkDeduplicator(
+            path=str(Path(persist_dir) / DEDUP_INDEX_FILENAME) if incremental else None,
+            threshold=dedup_settings.get("threshold", 0.9),
+            num_perm=dedup_settings.get("num_perm", 64),
+            bands=dedup_settings.get("bands", 16),
+            shingle_size=dedup_settings.get("shingle_size", 3),
+            numbers_must_match=dedup_settings.get("numbers_must_match", True)
+        )
+
+    # BM25 index for exact-term queries, built alongside the vector store
+    lexical_index = None
+    hybrid_settings = settings.get("hybrid_search", {})
+    if hybrid_settings.get("enabled", False):
+        lexical_index = LexicalIndex(
+            path=str(Path(persist_dir) / LEXICAL_INDEX_FILENAME) if incremental else None,
+            k1=hybrid_settings.get("k1", 1.2),
+            b=hybrid_settings.get("b", 0.75)
+        )
+
+    # Document processing
+    doc_processor = DocumentProcessor(
+        chunk_size=settings["chunking"]["chunk_size"],
+        chunk_overlap=settings["chunking"]["chunk_overlap"],
+        load_workers=settings.get("ingestion", {}).get("load_workers", 1),
+        pages_per_task=settings.get("ingestion", {}).get("pages_per_task", 50),
+        start_method=settings.get("ingestion", {}).get("start_method", "spawn"),
+        chunk_store=chunk_store,
+        text_splitter=create_text_splitter(settings["chunking"]),
+        deduplicator=deduplicator,
+        lexical_index=lexical_index
+    )
+
+    # Setup embeddings
+    embeddings_manager = create_embeddings_manager(settings)
+
+    pdf_path = Path(settings["paths"]["pdf_directory"])
+    if settings.get("ingestion", {}).get("streaming", False):
+        # Stream pages through split, embed and upsert in fixed-size windows
+        pipeline = IngestionPipeline(
+            processor=doc_processor,
+            embeddings_manager=embeddings_manager,
+            window_size=settings["ingestion"].get("window_size", 256),
+            progress_callback=progress_callback
+        )
+        vectorstore = pipeline.run(pdf_path, persist_dir, manifest=manifest)
+    else:
+        # Process documents
+        documents = doc_processor.process_documents(pdf_path, manifest=manifest)
+
+        # Create vectorstore with persistence
+        vectorstore = embeddings_manager.create_vectorstore(
+            documents=documents,
+            persist_dir=persist_dir,
+            manifest=manifest,
+            deduplicator=deduplicator,
+            lexical_index=lexical_index,
+            chunk_store=chunk_store
+        )
+
+    # Backfill chunks ingested before the chunk store existed
+    collection = vectorstore._collection
+    if len(chunk_store) < collection.count():
+        result = collection.get(include=['documents', 'metadatas'])
+        chunk_store.append([
+            Document(page_content=text, metadata={**(metadata or {}), "chunk_id": chunk_id})
+            for chunk_id, text, metadata in zip(result['ids'], result['documents'], result['metadatas'])
+        ])
+
+    # Index chunks stored before the lexical index was enabled
+    if lexical_index is not None and len(lexical_index) < len(chunk_store):
+        added = lexical_index.add([
+            Document(page_content=chunk["text"], metadata={"chunk_id": chunk["chunk_id"]})
+            for chunk in chunk_store.iter_chunks() if chunk["chunk_id"] not in lexical_index
+        ])
+        if added:
+            lexical_index.save()
+
+    # Get embeddings data with retry logic
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            embeddings_data = embeddings_manager.get_all_embeddings(vectorstore, include_documents=False)
+            break
+        except Exception:
+            if attempt < max_retries - 1:
+                time.sleep(2)
+                continue
+            raise
+
+    # Normalize (and optionally quantize) the document vectors once for every
+    # similarity search of the process
+    index_settings = settings.get("vector_index", {})
+    vector_index = embeddings_manager.create_vector_index(
+        embeddings_data,
+        precision=index_settings.get("precision", "float32"),
+        rescore_factor=index_settings.get("rescore_factor", 4),
+        full_precision_path=str(Path(persist_dir) / FULL_PRECISION_FILENAME),
+        recall_queries=index_settings.get("recall_sample_queries", 200),
+        recall_k=settings["retriever"]["search_k"]
+    )
+    # The index now serves the vectors; drop the float64 matrix from memory
+    embeddings_data["embeddings"] = None
+
+    # Source, document, page and publication date of every chunk, so scoped
+    # queries only score the chunks they can return
+    metadata_index = MetadataIndex.from_chunk_store(
+        vector_index.ids or [], chunk_store, doc_processor.document_info, embeddings_data.get("metadata")
+    )
+
+    # Search backend behind the chat retriever: Chroma, the in-memory index or FAISS
+    retrieval_backend = create_vector_backend(
+        settings.get("retrieval_backend", {}),
+        vectorstore,
+        vector_index,
+        persist_dir
+    )
+
+    # Answers are shared by every session while the corpus is unchanged
+    response_cache = None
+    response_cache_settings = settings.get("response_cache", {})
+    if response_cache_settings.get("enabled", False):
+        response_cache = SemanticResponseCache(
+            similarity_threshold=response_cache_settings.get("similarity_threshold", 0.98),
+            max_entries=response_cache_settings.get("max_entries", 256),
+            ttl_seconds=response_cache_settings.get("ttl_seconds", 3600),
+            require_same_text=response_cache_settings.get("require_same_text", True)
+        )
+
+    # Retrieval results of repeated queries, valid until the collection changes
+    retrieval_cache = None
+    retrieval_cache_settings = settings.get("retrieval_cache", {})
+    if retrieval_cache_settings.get("enabled", False):
+        retrieval_cache = RetrievalCache(
+            generation=lambda: embeddings_manager.index_generation,
+            max_entries=retrieval_cache_settings.get("max_entries", 1024)
+        )
+
+    # Post-retrieval stage shared by every chain; it holds no per-query state
+    context_builder = None
+    context_settings = settings.get("context", {})
+    if context_settings.get("enabled", False):
+        context_builder = ContextBuilder(
+            max_tokens=context_settings.get("max_tokens", 1200),
+            mmr_lambda=context_settings.get("mmr_lambda", 0.7),
+            merge_overlapping=context_settings.get("merge_overlapping", True),
+            vector_index=vector_index,
+            embed_query=embeddings_manager.get_query_embedding,
+            reranker_model=context_settings.get("reranker_model")
+        )
+
+    return {
+        "doc_processor": doc_processor,
+        "embeddings_manager": embeddings_manager,
+        "vectorstore": vectorstore,
+        "embeddings_data": embeddings_data,
+        "vector_index": vector_index,
+        "retrieval_backend": retrieval_backend,
+        "lexical_index": lexical_index,
+        "metadata_index": metadata_index,
+        "response_cache": response_cache,
+        "retrieval_cache": retrieval_cache,
+        "context_builder": context_builder,
+        "index_version": _index_version(vector_index.ids or []),
+        "chunk_store": chunk_store,
+        "persist_dir": persist_dir
+    }
+
+
+def get_shared_index(settings: dict,
+                     progress_callback: Optional[Callable[[dict], None]] = None) -> Dict[str, Any]:
+    """
+    Return the process-wide index for these settings, building it on first use.
+
+    Sessions arriving while the index is being built wait for that build
+    instead of starting their own; sessions of other indexes are not held up.
+    """
+    key = _index_key(settings)
+    index = _shared_indexes.get(key)
+    if index is not None:
+        return index
+
+    with _shared_indexes_lock:
+        build_lock = _shared_index_build_locks.setdefault(key, threading.Lock())
+
+    # Held across the build, which can be a full corpus ingest; the global lock only guards the registries
+    with build_lock:
+        index = _shared_indexes.get(key)
+        if index is None:
+            index = build_shared_index(settings, progress_callback)
+            with _shared_indexes_lock:
+                _shared_indexes[key] = index
+    return index
 
 
 def initialize_components(settings: dict, config: dict) -> Tuple[
@@ -47,52 +389,46 @@ def initialize_components(settings: dict, config: dict) -> Tuple[
 
     if not st.session_state.initialized:
         try:
-            # Document processing
-            st.session_state.doc_processor = DocumentProcessor(
-                chunk_size=settings["chunking"]["chunk_size"],
-                chunk_overlap=settings["chunking"]["chunk_overlap"]
-            )
+            progress_bar = None
+            if _index_key(settings) not in _shared_indexes:
+                progress_bar = st.progress(0.0, text="Loading document index...")
 
-            # Process documents
-            pdf_path = Path(settings["paths"]["pdf_directory"])
-            documents = st.session_state.doc_processor.process_documents(pdf_path)
+            def report_progress(progress: dict):
+                fraction = progress["files_done"] / progress["files_total"] if progress["files_total"] else 1.0
+                progress_bar.progress(
+                    min(fraction, 1.0),
+                    text=f"Ingested {progress['chunks']} chunks from "
+                         f"{progress['files_done']}/{progress['files_total']} files"
+                )
 
-            # Setup embeddings
-            st.session_state.embeddings_manager = EmbeddingsManager(
-                model_name=settings["model"]["embeddings"]["name"]
-            )
-
-            # Get persistent directory
-            persist_dir = get_persist_directory()
-
-            # Create vectorstore with persistence
-            st.session_state.vectorstore = st.session_state.embeddings_manager.create_vectorstore(
-                documents=documents,
-                persist_dir=persist_dir
-            )
+            # Attach to the shared index, building it only if no session has yet
+            index = get_shared_index(settings, report_progress if progress_bar is not None else None)
+            if progress_bar is not None:
+                progress_bar.empty()
 
-            # Add delay to ensure vectorstore is ready
-            time.sleep(2)
-
-            # Get embeddings data with retry logic
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    data = st.session_state.embeddings_manager.get_all_embeddings(
-                        st.session_state.vectorstore
-                    )
-                    st.session_state.embeddings_data = data
-                    break
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        time.sleep(2)
-                        continue
-                    raise
+            st.session_state.doc_processor = index["doc_processor"]
+            st.session_state.embeddings_manager = index["embeddings_manager"]
+            st.session_state.vectorstore = index["vectorstore"]
+            st.session_state.embeddings_data = index["embeddings_data"]
+            st.session_state.vector_index = index["vector_index"]
+            st.session_state.chunk_store = index["chunk_store"]
+            st.session_state.metadata_index = index["metadata_index"]
+            st.session_state.persist_dir = index["persist_dir"]
 
             # Setup retriever
             retriever = st.session_state.embeddings_manager.get_retriever(
                 st.session_state.vectorstore,
-                k=settings["retriever"]["search_k"]
+                k=settings["retriever"]["search_k"],
+                backend=index["retrieval_backend"],
+                chunk_store=index["chunk_store"],
+                lexical_index=index["lexical_index"],
+                metadata_index=index["metadata_index"],
+                retrieval_cache=index["retrieval_cache"],
+                hybrid_options={
+                    key: settings["hybrid_search"][key]
+                    for key in ("candidates", "rrf_k", "fast_path_max_terms", "fast_path_max_df")
+                    if key in settings.get("hybrid_search", {})
+                }
             )
 
             # Setup LLM
@@ -101,14 +437,26 @@ def initialize_components(settings: dict, config: dict) -> Tuple[
                 temperature=settings["model"]["llm"]["temperature"],
                 max_tokens=settings["model"]["llm"]["max_tokens"],
                 top_p=settings["model"]["llm"]["top_p"],
-                base_url=settings["model"]["llm"]["base_url"]
+                base_url=settings["model"]["llm"]["base_url"],
+                stream_to_stdout=settings["model"]["llm"].get("stream_to_stdout", False),
+                http_client=shared_http_client(settings.get("ollama_http")),
+                keep_alive=settings.get("model_warmup", {}).get("keep_alive")
+            )
+
+            # Load both models now rather than on the first question
+            st.session_state.model_keepalive = get_model_keepalive(
+                settings, st.session_state.embeddings_manager, st.session_state.llm_manager
             )
 
             # Setup chain
             st.session_state.chain_manager = ChainManager(
                 retriever=retriever,
                 llm=st.session_state.llm_manager.llm,
-                prompt_template=config["prompt_template"]
+                prompt_template=config["prompt_template"],
+                response_cache=index["response_cache"],
+                embed_query=st.session_state.embeddings_manager.get_query_embedding,
+                index_version=index["index_version"],
+                context_builder=index["context_builder"]
             )
 
             st.session_state.initialized = True
@@ -139,4 +487,19 @@ def get_components() -> Tuple[Optional[Any], ...]:
 
 def get_embeddings_data() -> Optional[dict]:
     """Get stored embeddings data from session state."""
-    return st.session_state.get("embeddings_data")
\ No newline at end of file
+    return st.session_state.get("embeddings_data")
+
+
+def get_chunk_store() -> Optional[ChunkStore]:
+    """Get the shared chunk store from session state."""
+    return st.session_state.get("chunk_store")
+
+
+def get_vector_index() -> Optional[VectorIndex]:
+    """Get the shared similarity search index from session state."""
+    return st.session_state.get("vector_index")
+
+
+def get_metadata_index() -> Optional[MetadataIndex]:
+    """Get the shared metadata filter index from session state."""
+    return st.session_state.get("metadata_index")
@@ -0,0 +1,46 @@
+# tests/test_context_builder.py
+from langchain.docstore.document import Document
+
+from core.context_builder import ContextBuilder
+
+
+def _chunk(chunk_id: str, text: str) -> Document:
+    return Document(page_content=text, metadata={"chunk_id": chunk_id, "source": "guide.pdf", "page": 1})
+
+
+def test_merge_keeps_chunk_ids_of_bridged_passages():
+    first = "Paracetamol is used for mild pain. "
+    second = "The usual adult dose is 500 mg to 1 g. "
+    third = "Do not exceed 4 g in 24 hours. "
+    fourth = "Seek advice if symptoms persist."
+    a = _chunk("a", first + second)
+    b = _chunk("b", second + third)
+    c = _chunk("c", third + fourth)
+
+    # c does not overlap a, so it starts its own passage until b bridges the two
+    passages = ContextBuilder().merge([a, c, b])
+
+    assert len(passages) == 1
+    assert passages[0].page_content == first + second + third + fourth
+    assert sorted(passages[0].metadata["chunk_ids"]) == ["a", "b", "c"]
+
+
+def test_merge_keeps_separate_passages_apart():
+    a = _chunk("a", "Ibuprofen should be taken with food to protect the stomach.")
+    b = _chunk("b", "Store all medicines out of the reach of children at all times.")
+
+    passages = ContextBuilder().merge([a, b])
+
+    assert [passage.metadata["chunk_ids"] for passage in passages] == [["a"], ["b"]]
+
+
+def test_build_truncates_top_passage_over_the_budget():
+    text = " ".join(f"word{i}" for i in range(200))
+    document = _chunk("a", text)
+
+    context, report = ContextBuilder(max_tokens=50).build("q", [document])
+
+    assert report["selected"] == 1
+    assert report["truncated"]
+    assert context == text[:len(context)]
+    assert ContextBuilder.count_tokens(context) == 50
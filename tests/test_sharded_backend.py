@@ -0,0 +1,59 @@
+# tests/test_sharded_backend.py
+import os
+import signal
+import time
+
+import numpy as np
+
+from core.retrievers import ShardedBackend
+from core.vector_index import VectorIndex
+
+
+def _wait_for(condition, timeout: float = 30.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_lost_shard_gives_partial_answer_and_restarts(tmp_path):
+    vectors = VectorIndex.prepare_queries(np.random.default_rng(0).normal(size=(8, 4)))
+    ids = [f"chunk{i}" for i in range(len(vectors))]
+    backend = ShardedBackend(vectors, ids, str(tmp_path), shards=2, timeout=1.0)
+    try:
+        found, _ = backend.search(vectors[:1], k=8)
+        assert sorted(found[0]) == sorted(ids)
+
+        # Kill the worker holding rows 4-7; the next query is answered by the other shard only
+        process = backend._shards[1]["process"]
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+        found, _ = backend.search(vectors[:1], k=8)
+        assert sorted(found[0]) == ids[:4]
+        assert backend.stats["partial"] == 1
+
+        assert _wait_for(lambda: backend.stats["restarts"] == 1 and backend.shards_up == 2)
+        found, _ = backend.search(vectors[:1], k=8)
+        assert sorted(found[0]) == sorted(ids)
+    finally:
+        backend.close()
+
+
+def test_stalled_shard_times_out_and_restarts(tmp_path):
+    vectors = VectorIndex.prepare_queries(np.random.default_rng(1).normal(size=(8, 4)))
+    ids = [f"chunk{i}" for i in range(len(vectors))]
+    backend = ShardedBackend(vectors, ids, str(tmp_path), shards=2, timeout=0.5)
+    try:
+        # A stopped worker never answers, so the query waits out the deadline
+        os.kill(backend._shards[0]["process"].pid, signal.SIGSTOP)
+        found, _ = backend.search(vectors[:1], k=8)
+        assert sorted(found[0]) == ids[4:]
+        assert backend.stats["timeouts"] == 1
+
+        assert _wait_for(lambda: backend.stats["restarts"] == 1 and backend.shards_up == 2)
+        found, _ = backend.search(vectors[:1], k=8)
+        assert sorted(found[0]) == sorted(ids)
+    finally:
+        backend.close()